@@ -49,13 +49,18 @@ try:
 except ImportError:
     GUIDES_ROOT_DIR = Path("guides")
 
+import gcp_clients
+
 # Import search functionality from vector_search
 try:
     from vector_search import search_guides as vector_search_guides, build_index_from_guides
+    from vector_search import get_resident_index, related_guides as vector_related_guides
 except ImportError:
     logger.warning("Could not import vector_search. Search functionality will be limited.")
     vector_search_guides = None
     build_index_from_guides = None
+    get_resident_index = None
+    vector_related_guides = None
 
 # Service information
 SERVICE_INFO = MCPServiceInfo(
@@ -240,17 +245,60 @@ async def search_guides(
     # Convert to expected return format
     formatted_results = []
     for result in results:
-        formatted_results.append({
+        formatted = {
             "title": result["title"],
             "division": result["division"],
             "file_path": result["file_path"],
             "score": result["score"],
             "content_preview": result["content_preview"]
-        })
+        }
+        # Best-matching section of the guide, when searching the passage index
+        if "section" in result:
+            formatted["section"] = result["section"]
+        formatted_results.append(formatted)
     
     return formatted_results
 
 
+@tool
+async def related_guides(guide_path: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    """
+    List the guides most similar to a given guide.
+    
+    Answered from neighbours precomputed by the indexing pipeline, so no
+    embedding call is made.
+    
+    Args:
+        guide_path: Path to the guide, e.g. 'se/login' or 'se/login/index.md'
+        top_k: Maximum number of related guides to return (default: 5)
+        
+    Returns:
+        A list of related guides with similarity scores
+    """
+    if vector_related_guides is None:
+        return []
+    
+    try:
+        results = vector_related_guides(guide_path, top_k=top_k)
+    except KeyError:
+        logger.warning(f"Guide not in index: {guide_path}")
+        return []
+    except Exception as e:
+        logger.error(f"Error getting related guides: {e}")
+        return []
+    
+    return [
+        {
+            "title": result["title"],
+            "division": result["division"],
+            "file_path": result["file_path"],
+            "score": result["score"],
+            "content_preview": result["content_preview"]
+        }
+        for result in results
+    ]
+
+
 @tool
 async def rebuild_semantic_index() -> Dict[str, Any]:
     """
@@ -320,13 +368,17 @@ async def get_guide_recommendations(
     # Format results
     formatted_results = []
     for result in results:
-        formatted_results.append({
+        formatted = {
             "title": result["title"],
             "division": result["division"],
             "file_path": result["file_path"],
             "score": result["score"],
             "content_preview": result["content_preview"]
-        })
+        }
+        # Best-matching section of the guide, when searching the passage index
+        if "section" in result:
+            formatted["section"] = result["section"]
+        formatted_results.append(formatted)
     
     # Return top 5 recommendations
     return formatted_results[:5]
@@ -401,7 +453,12 @@ def register_schemas() -> MCPSchemaRegistry:
                     "division": JsonSchemaProperty("string", "Division of the guide"),
                     "file_path": JsonSchemaProperty("string", "Path to the guide file"),
                     "score": JsonSchemaProperty("number", "Search relevance score"),
-                    "content_preview": JsonSchemaProperty("string", "Preview snippet from the guide content")
+                    "content_preview": JsonSchemaProperty("string", "Preview snippet from the guide content"),
+                    "section": JsonSchemaProperty(
+                        "object",
+                        "Best-matching section: heading, start/end byte offsets in the guide file, and text",
+                        required=False
+                    )
                 }
             )
         )
@@ -425,6 +482,14 @@ def register_schemas() -> MCPSchemaRegistry:
 
 async def main():
     """Main entry point for the MCP server."""
+    # Build shared clients and the resident index before serving tool calls
+    gcp_clients.warm_up()
+    if get_resident_index is not None:
+        try:
+            get_resident_index()
+        except Exception as e:
+            logger.warning(f"Could not preload search index: {e}")
+    
     # Register all schemas
     schema_registry = register_schemas()
     
@@ -485,6 +550,26 @@ async def main():
             ),
             output_schema=schema_registry.get_schema("SearchGuidesResult"),
         ),
+        MCPTool(
+            function=related_guides,
+            description="List the guides most similar to a given guide",
+            parameters=JsonSchema(
+                type="object",
+                properties={
+                    "guide_path": JsonSchemaProperty(
+                        "string",
+                        "Path to the guide, e.g. se/login or se/login/index.md",
+                        required=True
+                    ),
+                    "top_k": JsonSchemaProperty(
+                        "integer",
+                        "Maximum number of related guides to return",
+                        required=False
+                    )
+                }
+            ),
+            output_schema=schema_registry.get_schema("SearchGuidesResult"),
+        ),
         MCPTool(
             function=rebuild_semantic_index,
             description="Rebuild the semantic search index for guides",
@@ -7,10 +7,16 @@ Model Context Protocol (MCP) endpoint over HTTP.
 """
 
 import os
+import sys
+import copy
+import json
 import logging
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from pathlib import Path
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Tuple, Union
 import requests
 
 from flask import Flask, jsonify, request, Response, redirect, session, url_for
@@ -26,14 +32,99 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Google Cloud Project ID
-PROJECT_ID = os.environ.get("GOOGLE_CLOUD_PROJECT", "requirements-mcp-server")
-GCP_LOCATION = os.environ.get("GCP_LOCATION", "us-central1")
+# Shared modules (client registry, caches) live in scripts/
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+import gcp_clients
+from caching import SingleFlight, TTLCache
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from deadlines import Deadline, RemoteCallPool
+from lexical_index import LexicalIndexManager, reciprocal_rank_fusion
+from query_expansion import ExpansionAgreement, get_local_expander
 
 # --- Query Expansion Cache ---
-# Simple in-memory cache for expanded queries (TTL: 1 hour)
-_expansion_cache: Dict[str, tuple] = {}  # {query: (expanded_terms, timestamp)}
-CACHE_TTL_SECONDS = 3600  # 1 hour
+# Expanded terms per query; set EXPANSION_CACHE_PATH to share them between
+# the workers on an instance and keep them across restarts
+_expansion_cache = TTLCache(
+    max_entries=int(os.environ.get("EXPANSION_CACHE_SIZE", "1000")),
+    ttl_seconds=float(os.environ.get("EXPANSION_CACHE_TTL_SECONDS", "3600")),
+    persist_path=os.environ.get("EXPANSION_CACHE_PATH") or None,
+    name="query-expansions"
+)
+
+# --- Expansion Backend ---
+# "vertex" asks Gemini, falling back to the corpus-mined local engine when it
+# fails or is slow; "local" never leaves the process. Requests may choose.
+VERTEX_EXPANSION = "vertex"
+LOCAL_EXPANSION = "local"
+EXPANSION_BACKENDS = (VERTEX_EXPANSION, LOCAL_EXPANSION)
+EXPANSION_BACKEND = os.environ.get("EXPANSION_BACKEND", VERTEX_EXPANSION)
+# Every Vertex expansion is compared with the local one for the same query
+_expansion_agreement = ExpansionAgreement()
+# While Gemini keeps failing, expansion goes straight to the local engine
+_expansion_breaker = CircuitBreaker("vertex-expansion")
+
+# --- Expansion Modes ---
+# `expand` is True (text expansion), False (the query alone) or "prf": the
+# query is refined in embedding space by pseudo-relevance feedback, with no
+# expansion call and a single embedding
+PRF_EXPANSION = "prf"
+
+# --- In-flight Call Coalescing ---
+# Concurrent identical expansions and guide reads share one execution
+_expansion_flights = SingleFlight("query-expansion")
+_guide_file_flights = SingleFlight("guide-files")
+
+# --- Lexical Index ---
+# BM25 over the guide files, built once and rebuilt in the background on change
+LEXICAL_INDEX_REFRESH_SECONDS = float(os.environ.get("LEXICAL_INDEX_REFRESH_SECONDS", "60"))
+
+# --- Search Result Cache ---
+# Full do_search_guides responses, keyed on the request and the index
+# generations. Entries older than SEARCH_CACHE_FRESH_SECONDS are still served
+# for up to SEARCH_CACHE_STALE_SECONDS more while one background thread
+# recomputes them, so hot queries never wait on Vertex.
+SEARCH_CACHE_FRESH_SECONDS = float(os.environ.get("SEARCH_CACHE_FRESH_SECONDS", "300"))
+SEARCH_CACHE_STALE_SECONDS = float(os.environ.get("SEARCH_CACHE_STALE_SECONDS", "3600"))
+_search_cache = TTLCache(
+    max_entries=int(os.environ.get("SEARCH_CACHE_SIZE", "1024")),
+    ttl_seconds=SEARCH_CACHE_FRESH_SECONDS + SEARCH_CACHE_STALE_SECONDS,
+    name="search-results"
+)
+_search_refreshing: set = set()
+_search_refresh_lock = threading.Lock()
+# Updated from request and refresh threads; guarded by _search_refresh_lock
+_search_cache_counters = {"stale_hits": 0, "refreshes": 0, "refresh_failures": 0}
+
+# --- Request Deadlines ---
+# Every search runs under a deadline: SEARCH_DEADLINE_SECONDS unless the
+# caller asks for less (or more, up to SEARCH_MAX_DEADLINE_SECONDS) with the
+# X-Request-Timeout header or a "timeout" parameter. Stages past their share
+# fall back and are listed in the response's "cut_short".
+SEARCH_DEADLINE_SECONDS = float(os.environ.get("SEARCH_DEADLINE_SECONDS", "5"))
+SEARCH_MAX_DEADLINE_SECONDS = float(os.environ.get("SEARCH_MAX_DEADLINE_SECONDS", "30"))
+REQUEST_TIMEOUT_HEADER = "X-Request-Timeout"
+
+# --- Search Fan-out ---
+# Expansion terms are searched concurrently on a shared, bounded pool; terms
+# not finished by the request deadline are dropped
+_search_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("SEARCH_FANOUT_WORKERS", "8")),
+    thread_name_prefix="search-fanout"
+)
+
+# --- Hedged Expansion ---
+# Search the query itself while Vertex expands it; expansion terms are merged
+# in only if expansion returns within EXPANSION_BUDGET_SECONDS of the search
+# starting. A late expansion finishes in the background and is cached.
+SEARCH_HEDGE_EXPANSION = os.environ.get("SEARCH_HEDGE_EXPANSION", "true").lower() == "true"
+EXPANSION_BUDGET_SECONDS = float(os.environ.get("EXPANSION_BUDGET_SECONDS", "1.5"))
+# Vertex expansion is waited on for at most this share of the time left
+# before the deadline (hedged, also at most EXPANSION_BUDGET_SECONDS), then
+# the local engine expands instead
+EXPANSION_DEADLINE_SHARE = float(os.environ.get("EXPANSION_DEADLINE_SHARE", "0.5"))
+# Expansions past their wait are counted until they return; while they hold
+# every worker, searches expand locally at once
+_expansion_pool = RemoteCallPool("query-expansion", int(os.environ.get("EXPANSION_WORKERS", "4")))
 
 # --- Flask App Initialization ---
 
@@ -53,6 +144,8 @@ def get_guides_root() -> Path:
             return parent_guides
     return guides_path.absolute()
 
+_lexical_index = LexicalIndexManager(get_guides_root(), refresh_seconds=LEXICAL_INDEX_REFRESH_SECONDS)
+
 def get_search_function():
     """Lazy import for search functionality with fallback."""
     import sys
@@ -61,48 +154,50 @@ def get_search_function():
         from vector_search import search_guides
         return search_guides
     except ImportError as e:
-        logger.warning(f"Could not import vector_search: {e}. Using simple text search.")
-        # Fallback to simple text search
-        def simple_search_guides(query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-            """Simple text-based search through guide content."""
-            results = []
-            guides_dir = get_guides_root()
-            
-            # Search through all guide files
-            for guide_file in guides_dir.rglob("*.md"):
-                try:
-                    with open(guide_file, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    
-                    # Simple text matching
-                    if query.lower() in content.lower():
-                        # Extract basic info
-                        title = guide_file.stem.replace('-', ' ').title()
-                        division = guide_file.parent.parent.name if guide_file.parent.parent != guides_dir else 'unknown'
-                        
-                        # Get preview
-                        lines = content.split('\n')
-                        preview = ' '.join(lines[:3])[:200] + '...'
-                        
-                        results.append({
-                            "title": title,
-                            "division": division,
-                            "file_path": str(guide_file.relative_to(guides_dir)),
-                            "score": 0.5,  # Placeholder score
-                            "content_preview": preview
-                        })
-                        
-                        if len(results) >= top_k:
-                            break
-                            
-                except Exception as e:
-                    logger.warning(f"Error reading {guide_file}: {e}")
-                    continue
-                    
-            return results
+        logger.warning(f"Could not import vector_search: {e}. Using lexical search.")
+        # Fallback to the in-memory BM25 index
+        def simple_search_guides(
+            query: str, top_k: int = 5, division_filter: str = None, feedback: bool = False,
+            deadline: Optional[Deadline] = None
+        ) -> List[Dict[str, Any]]:
+            """Lexical BM25 search through guide content (feedback needs vectors and is ignored)."""
+            return _lexical_index.get().search(query, top_k=top_k, division_filter=division_filter)
         
         return simple_search_guides
 
+def get_multi_search_function():
+    """Lazy import for batched multi-query search; None when unavailable."""
+    import sys
+    sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+    try:
+        from vector_search import search_guides_multi
+        return search_guides_multi
+    except ImportError as e:
+        logger.warning(f"Could not import vector_search: {e}. Batched search not available.")
+        return None
+
+def get_related_function():
+    """Lazy import for the related-guides lookup; None when vector search is unavailable."""
+    import sys
+    sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+    try:
+        from vector_search import related_guides
+        return related_guides
+    except ImportError as e:
+        logger.warning(f"Could not import vector_search: {e}. Related guides not available.")
+        return None
+
+def get_remote_free_function():
+    """Lazy import for telling which terms embed without a remote call; None when unavailable."""
+    import sys
+    sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+    try:
+        from vector_search import embeds_without_remote_call
+        return embeds_without_remote_call
+    except ImportError as e:
+        logger.warning(f"Could not import vector_search: {e}. Searching every local expansion term.")
+        return None
+
 def get_build_index_function():
     """Lazy import for index building functionality with fallback."""
     import sys
@@ -116,6 +211,51 @@ def get_build_index_function():
             return {"status": "not implemented", "error": str(e)}
         return placeholder_build_index
 
+def warm_up() -> Dict[str, Any]:
+    """
+    Build shared clients, the resident vector index and the local expansion tables.
+    
+    Runs once per gunicorn worker at boot (see gunicorn.conf.py) so the first
+    request doesn't pay for model loading, gRPC channel setup or index loading.
+    When the on-disk index artifact is baked into the image it is memory-mapped.
+    """
+    report = gcp_clients.warm_up()
+    
+    start = time.perf_counter()
+    index = _lexical_index.get()
+    report["lexical_index"] = {
+        "ok": True,
+        "files": len(index),
+        "ms": round((time.perf_counter() - start) * 1000, 1)
+    }
+    
+    start = time.perf_counter()
+    try:
+        from vector_search import get_resident_index
+        index = get_resident_index()
+        report["search_index"] = {
+            "ok": True,
+            "guides": len(index),
+            "ms": round((time.perf_counter() - start) * 1000, 1)
+        }
+    except Exception as e:
+        logger.warning(f"Could not preload search index: {e}. It will load on first search.")
+        report["search_index"] = {"ok": False, "error": str(e)}
+    
+    # Loaded from the index artifact, or mined from the guides (~0.5 s) if there is none
+    start = time.perf_counter()
+    try:
+        expander = get_local_expander(guides_root=get_guides_root())
+        report["local_expansion"] = {
+            "ok": True,
+            "phrases": len(expander),
+            "ms": round((time.perf_counter() - start) * 1000, 1)
+        }
+    except Exception as e:
+        logger.warning(f"Could not build local expansion: {e}. It will build on first use.")
+        report["local_expansion"] = {"ok": False, "error": str(e)}
+    return report
+
 def do_list_guide_divisions() -> List[Dict[str, Any]]:
     """List only the 'se' guide division with its guide count."""
     divisions = []
@@ -168,6 +308,11 @@ def do_list_guides_by_division(division: str) -> List[Dict[str, str]]:
 
 def do_get_guide_content(guide_path: str) -> Dict[str, Any]:
     """Logic for getting the content of a specific guide."""
+    return _guide_file_flights.do(guide_path, _read_guide_content, guide_path)
+
+
+def _read_guide_content(guide_path: str) -> Dict[str, Any]:
+    """Read and parse a guide file; see do_get_guide_content."""
     guide_file = get_guides_root() / guide_path
     
     if not guide_file.exists():
@@ -199,52 +344,57 @@ def do_get_guide_content(guide_path: str) -> Dict[str, Any]:
     }
 
 
-def _get_cached_expansion(query: str) -> Optional[List[str]]:
-    """Get cached expansion if still valid."""
-    if query in _expansion_cache:
-        terms, timestamp = _expansion_cache[query]
-        if time.time() - timestamp < CACHE_TTL_SECONDS:
-            logger.info(f"Cache hit for query: {query[:50]}...")
-            return terms
-        else:
-            del _expansion_cache[query]
-    return None
+def _expansion_cache_key(query: str, max_terms: int) -> str:
+    """Cache key for an expansion: term count plus case- and whitespace-normalized query."""
+    return f"{max_terms}:{' '.join(query.lower().split())}"
 
 
-def _cache_expansion(query: str, terms: List[str]) -> None:
-    """Cache expanded terms with timestamp."""
-    _expansion_cache[query] = (terms, time.time())
-    # Limit cache size to 1000 entries
-    if len(_expansion_cache) > 1000:
-        oldest = min(_expansion_cache.items(), key=lambda x: x[1][1])
-        del _expansion_cache[oldest[0]]
+def _expand_query_locally(query: str, max_terms: int = 4) -> List[str]:
+    """
+    Expand a query from the corpus-mined term graph and guide phrases.
+    
+    Needs no remote call; returns just the query if the tables are unavailable.
+    """
+    try:
+        expander = get_local_expander(guides_root=get_guides_root())
+        return _expansion_agreement.timed_expand(expander, query, max_terms)
+    except Exception as e:
+        logger.warning(f"Local expansion failed: {e}. Using original query only.")
+        return [query]
 
 
-def _expand_query_with_vertex(query: str, max_terms: int = 4) -> List[str]:
+def _expand_query_with_vertex(query: str, max_terms: int = 4, timeout: Optional[float] = None) -> List[str]:
     """
     Use Vertex AI to expand a query into related technical search terms.
     
     Args:
         query: User's input (feature, task, question, etc.)
         max_terms: Maximum number of additional terms to generate
+        timeout: How long to wait for the same expansion already in flight
         
     Returns:
         List of search terms including the original query
+    
+    Raises:
+        CircuitOpenError or the Vertex error when Gemini is unavailable, and
+        concurrent.futures.TimeoutError past `timeout`; callers fall back to
+        _expand_query_locally
     """
     # Check cache first
-    cached = _get_cached_expansion(query)
-    if cached:
-        return cached
+    key = _expansion_cache_key(query, max_terms)
+    terms = _expansion_cache.get(key)
+    if terms:
+        logger.info(f"Cache hit for query: {query[:50]}...")
+    else:
+        terms = _expansion_flights.do(key, _generate_expansion, query, max_terms, timeout=timeout)
     
+    # The key ignores case and spacing; lead with the query exactly as given
+    return [query] + terms[1:]
+
+
+def _generate_expansion(query: str, max_terms: int) -> List[str]:
+    """Ask Vertex AI for expansion terms and cache them; see _expand_query_with_vertex."""
     try:
-        import vertexai
-        from vertexai.generative_models import GenerativeModel
-        
-        # Initialize Vertex AI
-        vertexai.init(project=PROJECT_ID, location=GCP_LOCATION)
-        
-        model = GenerativeModel("gemini-1.5-flash")
-        
         prompt = f"""Given this software development query, generate {max_terms} related technical search terms for finding implementation guides.
 
 Query: "{query}"
@@ -255,7 +405,7 @@ Focus on: module names, design patterns, security concerns, integration points.
 Example input: "user wants to upload avatar"
 Example output: file upload, image processing, profile management, media storage"""
 
-        response = model.generate_content(prompt)
+        response = _expansion_breaker.call(_generate_content, prompt)
         
         # Parse response into list
         terms = [t.strip() for t in response.text.split(',') if t.strip()]
@@ -265,93 +415,387 @@ Example output: file upload, image processing, profile management, media storage
         result = [query] + terms[:max_terms]
         
         # Cache the result
-        _cache_expansion(query, result)
+        _expansion_cache.set(_expansion_cache_key(query, max_terms), result)
         
         logger.info(f"Expanded '{query[:30]}...' to {len(result)} terms")
+        _expansion_agreement.record(result, _expand_query_locally(query, max_terms))
         return result
         
+    except CircuitOpenError:
+        raise
     except Exception as e:
-        logger.warning(f"Vertex expansion failed: {e}. Using original query only.")
-        return [query]
+        logger.warning(f"Vertex expansion failed: {e}. Using local expansion.")
+        raise
+
+
+def _generate_content(prompt: str):
+    """One Gemini request; runs behind the expansion circuit breaker."""
+    model = gcp_clients.get_generative_model("gemini-1.5-flash")
+    return model.generate_content(prompt)
+
+
+def do_related_guides(guide_path: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    """Logic for listing the guides most similar to a guide, from precomputed neighbours."""
+    related_func = get_related_function()
+    if related_func is None:
+        raise RuntimeError("Related guides require the vector search index")
+    try:
+        return related_func(guide_path, top_k=top_k)
+    except KeyError:
+        raise FileNotFoundError(f"Guide not found in index: {guide_path}")
 
 
-def do_search_guides(query: str, top_k: int = 5, expand: bool = True) -> List[Dict[str, Any]]:
+def _index_generation() -> str:
+    """Generation of the vector and lexical indexes; changes on every rebuild."""
+    try:
+        from vector_search import get_index_generation
+        vector_generation = get_index_generation()
+    except ImportError:
+        vector_generation = 0
+    return f"{vector_generation}.{_lexical_index.generation}"
+
+
+def do_search_guides(
+    query: str,
+    top_k: int = 5,
+    expand: Union[bool, str] = True,
+    hybrid: bool = False,
+    division_filter: Optional[str] = None,
+    expansion: Optional[str] = None,
+    timeout: Optional[float] = None
+) -> List[Dict[str, Any]]:
     """
     Search guides with automatic query expansion via Vertex AI.
     
+    See do_search_guides_detailed for the arguments, caching and the search deadline.
+    
+    Returns:
+        List of matching guides with scores
+    """
+    return do_search_guides_detailed(
+        query, top_k, expand, hybrid, division_filter, expansion, timeout
+    )["results"]
+
+
+def do_search_guides_detailed(
+    query: str,
+    top_k: int = 5,
+    expand: Union[bool, str] = True,
+    hybrid: bool = False,
+    division_filter: Optional[str] = None,
+    expansion: Optional[str] = None,
+    timeout: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Search guides with automatic query expansion, reporting the terms used.
+    
+    Responses are cached per normalized query, options and index generation;
+    a stale entry is returned immediately and refreshed in the background.
+    
+    The search runs under a deadline of `timeout` seconds. Each stage that
+    may block waits only for its share of the time left, then falls back:
+    Vertex expansion to the local engine, remote embedding to the local
+    index, and term searches are dropped (with BM25 answering if none
+    finished). In hedged mode the expansion terms are also left out if
+    expansion misses its budget. A response cut short any of these ways is
+    not cached.
+    
     Args:
         query: Search query (any format: user story, feature, question, etc.)
         top_k: Maximum results to return
-        expand: Whether to expand query with Vertex AI (default: True)
+        expand: True to expand the query into related terms, False to search it
+                alone, or "prf" to refine it by pseudo-relevance feedback over
+                the resident vectors (no expansion call, one embedding)
+        hybrid: Whether to fuse vector results with BM25 results by reciprocal rank
+        division_filter: Only return guides from this division, filtered inside the index
+        expansion: Expansion backend, "vertex" or "local" (default: EXPANSION_BACKEND)
+        timeout: Deadline in seconds (default: SEARCH_DEADLINE_SECONDS, at
+                 most SEARCH_MAX_DEADLINE_SECONDS)
     
     Returns:
-        List of matching guides with scores
+        Dict with "results" (matching guides with scores), "terms" ("used"
+        and "dropped" search terms, and "expansion_pending" when expansion
+        missed its budget), "cut_short" (stages that ran out of time:
+        "expansion", "embedding", "search" or "hybrid") and "fallback"
+        (stages that fell back because Vertex failed or its breaker is open:
+        "expansion" or "embedding")
     """
-    search_func = get_search_function()
+    if not isinstance(expand, bool) and expand != PRF_EXPANSION:
+        raise ValueError(f"Unknown expand mode {expand!r}, expected true, false or {PRF_EXPANSION!r}")
+    expansion = expansion or EXPANSION_BACKEND
+    if expansion not in EXPANSION_BACKENDS:
+        raise ValueError(f"Unknown expansion backend {expansion!r}, expected one of {EXPANSION_BACKENDS}")
+    if timeout is not None and not timeout > 0:
+        raise ValueError(f"timeout must be a positive number of seconds, got {timeout!r}")
+    deadline = Deadline(min(timeout or SEARCH_DEADLINE_SECONDS, SEARCH_MAX_DEADLINE_SECONDS))
+    query = " ".join(query.split())
+    key = json.dumps(
+        [query.lower(), top_k, division_filter, expand, hybrid, expansion, _index_generation()]
+    )
+    args = (query, top_k, expand, hybrid, division_filter, expansion)
+    
+    entry = _search_cache.get(key)
+    if entry is not None:
+        response, computed_at = entry
+        if time.time() - computed_at >= SEARCH_CACHE_FRESH_SECONDS:
+            _count_search_cache("stale_hits")
+            _refresh_search_in_background(key, args)
+        return copy.deepcopy(response)
     
-    # Expand query into multiple search terms
-    search_terms = _expand_query_with_vertex(query) if expand else [query]
+    response = _search_guides_uncached(*args, deadline=deadline)
+    if _is_complete(response):
+        _search_cache.set(key, [copy.deepcopy(response), time.time()])
+    return response
+
+
+def _count_search_cache(counter: str) -> None:
+    """Increment one of the search cache's stale-while-revalidate counters."""
+    with _search_refresh_lock:
+        _search_cache_counters[counter] += 1
+
+
+def _refresh_search_in_background(key: str, args: tuple) -> None:
+    """Recompute a stale cache entry on a daemon thread, at most once per key at a time."""
+    with _search_refresh_lock:
+        if key in _search_refreshing:
+            return
+        _search_refreshing.add(key)
+    
+    def refresh():
+        try:
+            response = _search_guides_uncached(
+                *args, deadline=Deadline(SEARCH_DEADLINE_SECONDS), hedge=False
+            )
+            if not _is_complete(response):
+                raise TimeoutError(
+                    f"incomplete: cut short {response['cut_short']}, fell back {response['fallback']}"
+                )
+            _search_cache.set(key, [response, time.time()])
+            _count_search_cache("refreshes")
+        except Exception as e:
+            _count_search_cache("refresh_failures")
+            logger.warning(f"Background refresh of search '{args[0][:50]}' failed: {e}")
+        finally:
+            with _search_refresh_lock:
+                _search_refreshing.discard(key)
+    
+    threading.Thread(target=refresh, daemon=True).start()
+
+
+def _is_complete(response: Dict[str, Any]) -> bool:
+    """Whether a search response used every term and stage it would have with no time limits or outages."""
+    terms = response["terms"]
+    return (not terms["dropped"] and not terms.get("expansion_pending")
+            and not response["cut_short"] and not response["fallback"])
+
+
+def _search_guides_uncached(
+    query: str,
+    top_k: int,
+    expand: Union[bool, str],
+    hybrid: bool,
+    division_filter: Optional[str],
+    expansion: str = VERTEX_EXPANSION,
+    deadline: Optional[Deadline] = None,
+    hedge: bool = True
+) -> Dict[str, Any]:
+    """Expand, embed and score a search; see do_search_guides_detailed."""
+    deadline = deadline or Deadline(SEARCH_DEADLINE_SECONDS)
     
     all_results = []
     seen_paths = set()
+    expansion_pending = False
+    feedback = expand == PRF_EXPANSION
+    expand = expand is True
+    # With the Gemini breaker open expansion is local and instant; no need to hedge
+    if (expand and hedge and SEARCH_HEDGE_EXPANSION and expansion == VERTEX_EXPANSION
+            and _expansion_breaker.allows_calls()):
+        # Search the query itself while expansion runs
+        remote_expansion = _expansion_pool.submit(
+            _expand_query_with_vertex, query, timeout=deadline.remaining()
+        )
+        used, dropped = _search_terms(
+            [query], query, top_k, division_filter, deadline, all_results, seen_paths
+        )
+        try:
+            expanded_terms = deadline.wait(
+                remote_expansion, "expansion",
+                share=EXPANSION_DEADLINE_SHARE, cap=EXPANSION_BUDGET_SECONDS - deadline.elapsed()
+            )[1:]
+        except FutureTimeoutError:
+            # It keeps running and caches its terms for the next search.
+            # Local terms stand in for it only where searching them needs
+            # no remote embedding, so the miss adds no second Vertex wait.
+            _expansion_pool.abandon(remote_expansion)
+            expansion_pending = True
+            expanded_terms = _expand_query_locally(query)[1:]
+            embeds_without_remote_call = get_remote_free_function()
+            if embeds_without_remote_call is not None:
+                expanded_terms = [
+                    term for term, local in zip(expanded_terms, embeds_without_remote_call(expanded_terms))
+                    if local
+                ]
+        except Exception:
+            # Gemini failed or every worker is held by abandoned expansions;
+            # the local expansion stands in for it
+            deadline.fall_back("expansion")
+            expanded_terms = _expand_query_locally(query)[1:]
+        if expanded_terms:
+            expanded_used, expanded_dropped = _search_terms(
+                expanded_terms, query, top_k, division_filter, deadline, all_results, seen_paths
+            )
+            used += expanded_used
+            dropped += expanded_dropped
+    else:
+        # Expand query into multiple search terms
+        search_terms = [query]
+        if expand and expansion == VERTEX_EXPANSION:
+            remote_expansion = _expansion_pool.submit(
+                _expand_query_with_vertex, query, timeout=deadline.remaining()
+            )
+            try:
+                search_terms = deadline.wait(remote_expansion, "expansion", share=EXPANSION_DEADLINE_SHARE)
+            except FutureTimeoutError:
+                _expansion_pool.abandon(remote_expansion)
+                expansion_pending = True
+                search_terms = _expand_query_locally(query)
+            except Exception:
+                # Gemini failed, its breaker is open or its workers are all held
+                deadline.fall_back("expansion")
+                search_terms = _expand_query_locally(query)
+        elif expand:
+            search_terms = _expand_query_locally(query)
+        used, dropped = _search_terms(
+            search_terms, query, top_k, division_filter, deadline, all_results, seen_paths,
+            feedback=feedback
+        )
+    if not used:
+        # Nothing finished in time: answer from the in-memory BM25 index
+        _fallback_text_search(query, top_k, all_results, seen_paths, division_filter)
+    
+    # Sort by score and return top_k
+    all_results.sort(key=lambda x: x.get('score', 0), reverse=True)
     
-    for term in search_terms:
+    if hybrid and deadline.expired():
+        deadline.cut("hybrid")
+        results = all_results[:top_k]
+    elif hybrid:
+        lexical_results = _lexical_index.get().search(
+            query, top_k=top_k, division_filter=division_filter
+        )
+        results = reciprocal_rank_fusion([all_results, lexical_results], top_k=top_k)
+    else:
+        results = all_results[:top_k]
+    terms = {"used": used, "dropped": dropped}
+    if expansion_pending:
+        terms["expansion_pending"] = True
+    return {
+        "results": results,
+        "terms": terms,
+        "cut_short": deadline.cut_short,
+        "fallback": deadline.fallbacks
+    }
+
+
+def _search_terms(
+    search_terms: List[str],
+    query: str,
+    top_k: int,
+    division_filter: Optional[str],
+    deadline: Deadline,
+    all_results: List[Dict],
+    seen_paths: set,
+    feedback: bool = False
+) -> Tuple[List[str], List[str]]:
+    """
+    Search every term before `deadline` and merge the results in term order.
+    With `feedback`, each term is refined by pseudo-relevance feedback.
+    
+    Returns:
+        (terms used, terms dropped because their search missed the deadline)
+    """
+    search_kwargs = {"top_k": top_k, "division_filter": division_filter, "deadline": deadline}
+    if feedback:
+        search_kwargs["feedback"] = True
+    
+    # Embed every term in one batched request and score them together
+    multi_search_func = get_multi_search_function()
+    if multi_search_func is not None:
+        future = _search_executor.submit(multi_search_func, search_terms, **search_kwargs)
         try:
-            results = search_func(term, top_k=top_k)
-            for r in results:
-                path = r.get('file_path', '')
-                if path and path not in seen_paths:
-                    seen_paths.add(path)
-                    # Boost score for original query matches
-                    if term == query:
-                        r['score'] = r.get('score', 0) * 1.1
-                    all_results.append(r)
+            term_results = deadline.wait(future, "search")
+        except FutureTimeoutError:
+            deadline.cut("search")
+            logger.warning(f"Batched search for {len(search_terms)} terms missed the deadline")
+            return [], list(search_terms)
+        except Exception as e:
+            logger.warning(f"Batched search failed for {len(search_terms)} terms: {e}")
+        else:
+            for term, results in zip(search_terms, term_results):
+                _merge_term_results(term, query, results, all_results, seen_paths)
+            return list(search_terms), []
+    
+    # Otherwise search the terms concurrently, one request each
+    search_func = get_search_function()
+    futures = [
+        _search_executor.submit(search_func, term, **search_kwargs)
+        for term in search_terms
+    ]
+    done, _ = wait(futures, timeout=deadline.remaining())
+    
+    used, dropped = [], []
+    for term, future in zip(search_terms, futures):
+        if future not in done:
+            future.cancel()
+            dropped.append(term)
+            continue
+        used.append(term)
+        try:
+            _merge_term_results(term, query, future.result(), all_results, seen_paths)
         except Exception as e:
             logger.warning(f"Search failed for '{term}': {e}")
             # Fallback to simple text search for this term
-            _fallback_text_search(term, top_k, all_results, seen_paths)
-    
-    # Sort by score and return top_k
-    all_results.sort(key=lambda x: x.get('score', 0), reverse=True)
-    return all_results[:top_k]
+            _fallback_text_search(term, top_k, all_results, seen_paths, division_filter)
+    if dropped:
+        deadline.cut("search")
+        logger.warning(f"Dropped {len(dropped)} of {len(search_terms)} search terms at the deadline")
+    return used, dropped
+
+
+def _merge_term_results(
+    term: str,
+    query: str,
+    results: List[Dict],
+    all_results: List[Dict],
+    seen_paths: set
+) -> None:
+    """Add one term's results, skipping guides already found by an earlier term."""
+    for r in results:
+        path = r.get('file_path', '')
+        if path and path not in seen_paths:
+            seen_paths.add(path)
+            # Boost score for original query matches
+            if term == query:
+                r['score'] = r.get('score', 0) * 1.1
+            all_results.append(r)
 
 
 def _fallback_text_search(
     query: str, 
     top_k: int, 
     results: List[Dict], 
-    seen_paths: set
+    seen_paths: set,
+    division_filter: Optional[str] = None
 ) -> None:
-    """Simple text search fallback when vector search fails."""
-    guides_dir = get_guides_root()
-    
-    for guide_file in guides_dir.rglob("*.md"):
+    """Lexical BM25 fallback when vector search fails."""
+    for result in _lexical_index.get().search(query, top_k=top_k, division_filter=division_filter):
         if len(results) >= top_k:
             break
-        try:
-            with open(guide_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            if query.lower() in content.lower():
-                path = str(guide_file.relative_to(guides_dir))
-                if path in seen_paths:
-                    continue
-                seen_paths.add(path)
-                
-                title = guide_file.stem.replace('-', ' ').title()
-                division = guide_file.parent.parent.name if guide_file.parent.parent != guides_dir else 'unknown'
-                lines = content.split('\n')
-                preview = ' '.join(lines[:3])[:200] + '...'
-                
-                results.append({
-                    "title": title,
-                    "division": division,
-                    "file_path": path,
-                    "score": 0.5,
-                    "content_preview": preview
-                })
-        except Exception as e:
-            logger.warning(f"Error reading {guide_file}: {e}")
+        path = result["file_path"]
+        if path in seen_paths:
+            continue
+        seen_paths.add(path)
+        results.append(result)
 
 
 # --- MCP Server Initialization ---
@@ -435,6 +879,40 @@ def api_get_guide(guide_path: str):
         logger.error(f"Error getting guide {guide_path}: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route("/guides/<path:guide_path>/related", methods=["GET"])
+def api_related_guides(guide_path: str):
+    """REST API: List the guides most similar to a guide."""
+    try:
+        top_k = request.args.get("top_k", 5, type=int)
+        related = do_related_guides(guide_path, top_k=top_k)
+        return jsonify({"guide": guide_path, "related": related, "count": len(related)})
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        logger.error(f"Error getting related guides for {guide_path}: {e}")
+        return jsonify({"error": str(e)}), 500
+
+def _request_timeout(data: Dict[str, Any]) -> Optional[float]:
+    """
+    Deadline asked for by the X-Request-Timeout header or a "timeout" field
+    of `data`, the request body or MCP tool arguments.
+    
+    Both are in seconds and the shorter wins; None means the server default.
+    Raises ValueError if either is not a positive number.
+    """
+    timeouts = []
+    for value in (request.headers.get(REQUEST_TIMEOUT_HEADER), data.get("timeout")):
+        if value is None:
+            continue
+        try:
+            seconds = float(value)
+        except (TypeError, ValueError):
+            seconds = float("nan")
+        if not seconds > 0:
+            raise ValueError(f"timeout must be a positive number of seconds, got {value!r}")
+        timeouts.append(seconds)
+    return min(timeouts) if timeouts else None
+
 @app.route("/search", methods=["POST"])
 def api_search_guides():
     """REST API: Search guides using semantic search."""
@@ -442,12 +920,33 @@ def api_search_guides():
         data = request.get_json() or {}
         query = data.get("query", "")
         top_k = data.get("top_k", 5)
+        hybrid = bool(data.get("hybrid", False))
+        expand = data.get("expand", True)
+        expansion = data.get("expansion")
         
         if not query:
             return jsonify({"error": "query parameter is required"}), 400
+        if not isinstance(expand, bool) and expand != PRF_EXPANSION:
+            return jsonify({"error": f"expand must be true, false or \"{PRF_EXPANSION}\""}), 400
+        if expansion is not None and expansion not in EXPANSION_BACKENDS:
+            return jsonify({"error": f"expansion must be one of {list(EXPANSION_BACKENDS)}"}), 400
+        try:
+            timeout = _request_timeout(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        results = do_search_guides(query, top_k=top_k)
-        return jsonify({"results": results, "query": query, "count": len(results)})
+        response = do_search_guides_detailed(
+            query, top_k=top_k, expand=expand, hybrid=hybrid, expansion=expansion, timeout=timeout
+        )
+        results = response["results"]
+        return jsonify({
+            "results": results,
+            "query": query,
+            "count": len(results),
+            "terms": response["terms"],
+            "cut_short": response["cut_short"],
+            "fallback": response["fallback"]
+        })
     except Exception as e:
         logger.error(f"Error searching guides: {e}")
         return jsonify({"error": str(e)}), 500
@@ -463,16 +962,20 @@ def api_get_recommendations():
         
         if not topics:
             return jsonify({"error": "topics parameter is required"}), 400
+        try:
+            timeout = _request_timeout(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        # Combine topics into search query
+        # Combine topics into search query; the division filter is applied
+        # inside the index, so every returned slot is a guide from that division
         query = " ".join(topics)
-        results = do_search_guides(query, top_k=top_k)
+        results = do_search_guides(
+            query, top_k=top_k, division_filter=division.lower() if division else None,
+            timeout=timeout
+        )
         
-        # Filter by division if specified
-        if division:
-            results = [r for r in results if r.get("division", "").lower() == division.lower()]
-        
-        return jsonify({"recommendations": results[:top_k], "topics": topics})
+        return jsonify({"recommendations": results, "topics": topics})
     except Exception as e:
         logger.error(f"Error getting recommendations: {e}")
         return jsonify({"error": str(e)}), 500
@@ -559,15 +1062,31 @@ def mcp_endpoint():
                 },
                 {
                     "name": "search_guides",
-                    "description": "Search for guides using semantic search when available, otherwise text search.",
+                    "description": "Search for guides using semantic search when available, otherwise text search. Results include the best-matching section of each guide when available.",
                     "inputSchema": {
                         "type": "object",
                         "properties": {
                             "query": {"type": "string", "description": "Search query"},
-                            "top_k": {"type": "integer", "description": "Number of results", "default": 3}
+                            "top_k": {"type": "integer", "description": "Number of results", "default": 3},
+                            "hybrid": {"type": "boolean", "description": "Fuse semantic and keyword (BM25) rankings", "default": False},
+                            "expand": {"type": ["boolean", "string"], "enum": [True, False, PRF_EXPANSION], "description": "Expand the query into related terms (true), search it alone (false), or refine it by pseudo-relevance feedback in embedding space (\"prf\", fastest)", "default": True},
+                            "expansion": {"type": "string", "enum": list(EXPANSION_BACKENDS), "description": "Query expansion: Gemini (vertex) or corpus-mined (local), default from server config"},
+                            "timeout": {"type": "number", "description": "Deadline in seconds; slow stages fall back to local search instead of waiting (default from server config)"}
                         },
                         "required": ["query"]
                     }
+                },
+                {
+                    "name": "related_guides",
+                    "description": "List the guides most similar to a given guide, from precomputed neighbours (no embedding call).",
+                    "inputSchema": {
+                        "type": "object",
+                        "properties": {
+                            "path": {"type": "string", "description": "Path to the guide, e.g. se/login or se/login/index.md"},
+                            "top_k": {"type": "integer", "description": "Number of results", "default": 5}
+                        },
+                        "required": ["path"]
+                    }
                 }
             ]
             result = {"tools": tools_data}
@@ -587,7 +1106,26 @@ def mcp_endpoint():
             elif tool_name == "search_guides":
                 query = arguments.get("query")
                 top_k = arguments.get("top_k", 3)
-                result = {"content": [{"type": "text", "text": str(do_search_guides(query, top_k))}]}
+                hybrid = bool(arguments.get("hybrid", False))
+                expand = arguments.get("expand", True)
+                expansion = arguments.get("expansion")
+                try:
+                    if not isinstance(expand, bool) and expand != PRF_EXPANSION:
+                        raise ValueError(f"expand must be true, false or \"{PRF_EXPANSION}\"")
+                    if expansion is not None and expansion not in EXPANSION_BACKENDS:
+                        raise ValueError(f"expansion must be one of {list(EXPANSION_BACKENDS)}")
+                    timeout = _request_timeout(arguments)
+                except ValueError as e:
+                    return jsonify({
+                        "jsonrpc": "2.0",
+                        "id": request_id,
+                        "error": {"code": -32602, "message": str(e)}
+                    }), 400
+                result = {"content": [{"type": "text", "text": str(do_search_guides(query, top_k, expand=expand, hybrid=hybrid, expansion=expansion, timeout=timeout))}]}
+            elif tool_name == "related_guides":
+                path = arguments.get("path")
+                top_k = arguments.get("top_k", 5)
+                result = {"content": [{"type": "text", "text": str(do_related_guides(path, top_k))}]}
             else:
                 return jsonify({
                     "jsonrpc": "2.0",
@@ -625,16 +1163,81 @@ def index():
             "GET /divisions": "List all guide divisions",
             "GET /divisions/<division>/guides": "List guides in a division",
             "GET /guides/<path>": "Get guide content",
-            "POST /search": "Search guides (body: {query, top_k})",
-            "POST /recommendations": "Get recommendations (body: {topics, division, top_k})"
+            "GET /guides/<path>/related": "List the most similar guides (query: top_k)",
+            "POST /search": "Search guides (body: {query, top_k, hybrid, expand, expansion, timeout})",
+            "POST /recommendations": "Get recommendations (body: {topics, division, top_k, timeout})",
+            "GET /stats": "Cache and index counters"
         }
     })
 
+@app.route("/stats", methods=["GET"])
+def stats():
+    """Cache and index counters for capacity planning."""
+    import sys
+    sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+    try:
+        from vector_search import get_embedding_cache_stats
+        embedding_cache = get_embedding_cache_stats()
+    except ImportError as e:
+        embedding_cache = {"error": f"vector search unavailable: {e}"}
+    search_cache = _search_cache.stats()
+    with _search_refresh_lock:
+        search_cache.update(_search_cache_counters)
+    search_cache["generation"] = _index_generation()
+    singleflight = [_expansion_flights.stats(), _guide_file_flights.stats()]
+    try:
+        from vector_search import get_embedding_singleflight_stats
+        singleflight.append(get_embedding_singleflight_stats())
+    except ImportError:
+        pass
+    return jsonify({
+        "embedding_cache": embedding_cache,
+        "expansion_cache": _expansion_cache.stats(),
+        "expansion_agreement": _expansion_agreement.stats(),
+        "search_cache": search_cache,
+        "singleflight": singleflight
+    })
+
+def _remote_call_pool_stats() -> List[Dict[str, Any]]:
+    """Remote calls abandoned at their deadline and still holding a worker, per pool."""
+    pools = [_expansion_pool.stats()]
+    try:
+        from vector_search import get_embedding_pool_stats
+        pools.append(get_embedding_pool_stats())
+    except ImportError:
+        pass
+    return pools
+
+def _circuit_breaker_stats() -> List[Dict[str, Any]]:
+    """State of the breakers around every remote model call."""
+    breakers = [_expansion_breaker.stats()]
+    try:
+        from vector_search import get_embedding_breaker_stats
+        breakers.append(get_embedding_breaker_stats())
+    except ImportError:
+        pass
+    return breakers
+
 @app.route("/health", methods=["GET"])
 def health_check():
-    """Health check endpoint."""
-    return jsonify({"status": "healthy"})
+    """
+    Health check endpoint.
+    
+    Reports "degraded" while any remote model breaker is not closed or any
+    remote call pool is held entirely by abandoned calls. Search still
+    answers from its fallbacks then, so the status code stays 200.
+    """
+    breakers = _circuit_breaker_stats()
+    pools = _remote_call_pool_stats()
+    degraded = any(b["state"] != "closed" for b in breakers) or any(p["exhausted"] for p in pools)
+    return jsonify({
+        "status": "degraded" if degraded else "healthy",
+        "circuit_breakers": breakers,
+        "remote_call_pools": pools
+    })
 
 if __name__ == "__main__":
+    if os.environ.get("WARM_UP_ON_BOOT", "true").lower() == "true":
+        warm_up()
     port = int(os.environ.get("PORT", 8080))
     app.run(host="0.0.0.0", port=port, debug=False)
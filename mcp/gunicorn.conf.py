@@ -0,0 +1,21 @@
+"""
+Gunicorn configuration for the guides HTTP server.
+
+Usage:
+  gunicorn -c gunicorn.conf.py guides_mcp_http_server:app
+"""
+
+import os
+
+bind = f":{os.environ.get('PORT', '8080')}"
+workers = 1
+threads = 8
+timeout = 0
+
+
+def post_worker_init(worker):
+    """Warm shared clients and the search index before the worker takes traffic."""
+    if os.environ.get("WARM_UP_ON_BOOT", "true").lower() != "true":
+        return
+    from guides_mcp_http_server import warm_up
+    warm_up()
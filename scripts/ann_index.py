@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Inverted-file (IVF) approximate nearest-neighbour index in pure NumPy.
+
+Vectors are clustered with spherical k-means; a query is scored only against
+the rows in its `nprobe` closest clusters instead of the whole corpus.
+"""
+
+import logging
+import os
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+IVF_FILE = "ivf.npz"
+DEFAULT_NPROBE = 8
+KMEANS_ITERATIONS = 20
+ASSIGN_CHUNK_ROWS = 8192
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the most similar centroid for every row, computed in chunks."""
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_CHUNK_ROWS):
+        chunk = np.asarray(vectors[start:start + ASSIGN_CHUNK_ROWS], dtype=np.float32)
+        assignments[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+
+class IVFIndex:
+    """
+    Coarse quantizer plus inverted lists over the rows of a VectorIndex.
+
+    The rows of list `c` are `list_rows[list_offsets[c]:list_offsets[c + 1]]`.
+    """
+
+    def __init__(self, centroids: np.ndarray, list_offsets: np.ndarray, list_rows: np.ndarray):
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        n_lists: Optional[int] = None,
+        iterations: int = KMEANS_ITERATIONS,
+        seed: int = 0
+    ) -> "IVFIndex":
+        """
+        Cluster unit-normalized `vectors` with spherical k-means.
+
+        Args:
+            vectors: N x D unit-normalized float32 matrix
+            n_lists: Number of clusters (default: about sqrt(N))
+            iterations: k-means iterations
+            seed: Random seed for centroid initialization
+
+        Returns:
+            The built IVFIndex
+        """
+        n = len(vectors)
+        if n == 0:
+            raise ValueError("Cannot build an IVF index over zero vectors")
+        n_lists = min(n, n_lists or max(1, int(round(np.sqrt(n)))))
+        rng = np.random.default_rng(seed)
+
+        centroids = np.array(vectors[rng.choice(n, n_lists, replace=False)], dtype=np.float32)
+        for _ in range(iterations):
+            assignments = _assign(vectors, centroids)
+            sums = np.zeros_like(centroids)
+            for start in range(0, n, ASSIGN_CHUNK_ROWS):
+                chunk = np.asarray(vectors[start:start + ASSIGN_CHUNK_ROWS], dtype=np.float32)
+                # Sum rows per cluster as a one-hot matrix product
+                one_hot = np.zeros((len(chunk), n_lists), dtype=np.float32)
+                one_hot[np.arange(len(chunk)), assignments[start:start + len(chunk)]] = 1.0
+                sums += one_hot.T @ chunk
+
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            empty = norms[:, 0] == 0
+            # Reseed empty clusters with random rows
+            if empty.any():
+                sums[empty] = vectors[rng.choice(n, int(empty.sum()), replace=False)]
+                norms[empty] = 1.0
+            centroids = sums / norms
+
+        assignments = _assign(vectors, centroids)
+        list_rows = np.argsort(assignments, kind="stable").astype(np.int32)
+        counts = np.bincount(assignments, minlength=n_lists)
+        list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        logger.info(
+            f"Built IVF index: {n} vectors in {n_lists} lists "
+            f"(largest {int(counts.max())}, empty {int((counts == 0).sum())})"
+        )
+        return cls(centroids, list_offsets, list_rows)
+
+    def candidates(self, query: np.ndarray, nprobe: int = DEFAULT_NPROBE) -> np.ndarray:
+        """Rows in the `nprobe` lists whose centroids are most similar to a unit-norm query."""
+        nprobe = max(1, min(nprobe, self.n_lists))
+        centroid_scores = self.centroids @ query
+        probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        return np.concatenate([
+            self.list_rows[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probe
+        ])
+
+    def __len__(self) -> int:
+        return len(self.list_rows)
+
+    def save(self, index_dir: Path) -> None:
+        """Write the IVF structure into `index_dir`, replacing any previous one atomically."""
+        path = Path(index_dir) / IVF_FILE
+        tmp = path.with_name(IVF_FILE + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                centroids=self.centroids,
+                list_offsets=self.list_offsets,
+                list_rows=self.list_rows,
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, index_dir: Path) -> Optional["IVFIndex"]:
+        """Load the IVF structure saved in `index_dir`, or None if there is none."""
+        path = Path(index_dir) / IVF_FILE
+        if not path.is_file():
+            return None
+        with np.load(path) as data:
+            return cls(data["centroids"], data["list_offsets"], data["list_rows"])
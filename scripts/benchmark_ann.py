@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark ANN Script
+
+Reports recall@k and per-query latency of the IVF approximate index against
+an exact scan, for a range of nprobe values. Runs either on an index artifact
+written by generate_embeddings.py or on a synthetic clustered corpus, so the
+trade-off can be checked at sizes the guide corpus has not reached yet.
+
+Usage:
+    python scripts/benchmark_ann.py                          # synthetic, 100k x 768
+    python scripts/benchmark_ann.py --rows 20000 --dim 256
+    python scripts/benchmark_ann.py --quantize               # int8 scan + re-scoring
+    python scripts/benchmark_ann.py --index-dir guides/semantic_index/passages
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from vector_index import VectorIndex, normalize_rows
+
+
+def synthetic_index(rows: int, dim: int, clusters: int, seed: int) -> VectorIndex:
+    """Unit vectors scattered around random topic centres, like real embeddings."""
+    rng = np.random.default_rng(seed)
+    centres = normalize_rows(rng.standard_normal((clusters, dim)))
+    labels = rng.integers(0, clusters, rows)
+    vectors = centres[labels] + 1.2 * rng.standard_normal((rows, dim)).astype(np.float32) / np.sqrt(dim)
+    records = [{"title": f"doc {i}", "file_path": f"doc-{i}.md"} for i in range(rows)]
+    return VectorIndex(vectors, records)
+
+
+def timed(index: VectorIndex, queries: np.ndarray, top_k: int, **kwargs):
+    """Run each query on its own (as the server does) and return results and mean ms."""
+    start = time.perf_counter()
+    results = [index.search(q, top_k=top_k, include_foundational=False, **kwargs) for q in queries]
+    return results, (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IVF recall vs latency against an exact scan")
+    parser.add_argument("--index-dir", type=Path, help="Index artifact to benchmark (default: synthetic)")
+    parser.add_argument("--rows", type=int, default=100_000, help="Synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=768, help="Synthetic vector dimension")
+    parser.add_argument("--clusters", type=int, default=2000, help="Synthetic topic count")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries")
+    parser.add_argument("--top-k", type=int, default=10, help="Results per query")
+    parser.add_argument("--lists", type=int, help="IVF list count (default: about sqrt(rows))")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--quantize", action="store_true", help="Scan int8 vectors and re-score candidates")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.index_dir:
+        index = VectorIndex.load(args.index_dir, mmap=False)
+    else:
+        index = synthetic_index(args.rows, args.dim, args.clusters, args.seed)
+
+    if args.quantize and not index.is_quantized:
+        index.quantize()
+    elif not args.quantize:
+        index.codes = index.scales = None
+
+    start = time.perf_counter()
+    index.build_ann(n_lists=args.lists)
+    build_seconds = time.perf_counter() - start
+    # Benchmark the IVF path regardless of the production size threshold
+    index.ann_min_rows = 0
+
+    # Queries are perturbed copies of indexed rows
+    rng = np.random.default_rng(args.seed + 1)
+    picked = np.asarray(index.vectors[rng.choice(len(index), args.queries)], dtype=np.float32)
+    queries = picked + 0.3 * rng.standard_normal(picked.shape).astype(np.float32) / np.sqrt(index.dimension)
+
+    exact, exact_ms = timed(index, queries, args.top_k, exact=True)
+    truth = [{r["file_path"] for r in results} for results in exact]
+
+    print(f"Index: {len(index)} rows x {index.dimension} dims, {index.ivf.n_lists} lists "
+          f"(built in {build_seconds:.1f} s){', int8 scan' if index.is_quantized else ''}")
+    print(f"{'nprobe':>8} {'recall@' + str(args.top_k):>10} {'ms/query':>10} {'speedup':>8}")
+    print(f"{'exact':>8} {1.0:>10.3f} {exact_ms:>10.2f} {1.0:>7.1f}x")
+    for nprobe in args.nprobe:
+        approx, ms = timed(index, queries, args.top_k, nprobe=nprobe)
+        recall = np.mean([
+            len(expected & {r["file_path"] for r in results}) / max(1, len(expected))
+            for expected, results in zip(truth, approx)
+        ])
+        print(f"{nprobe:>8} {recall:>10.3f} {ms:>10.2f} {exact_ms / ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Thread-safe LRU cache with TTL expiry and an optional SQLite persistence tier.
+
+The in-memory tier is an OrderedDict guarded by a lock, so lookups, inserts and
+evictions are O(1). When a persistence path is given, every insert is written
+through to a SQLite file; memory misses fall back to it, which lets warm entries
+survive restarts and be shared by every process on the host.
+
+SingleFlight sits in front of the remote calls that fill these caches, so a
+burst of identical misses makes one call instead of one per thread.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteCacheStore:
+    """Key/value store backing a TTLCache, safe to share between processes."""
+
+    def __init__(self, path: Path, table: str = "cache"):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=5.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[tuple]:
+        """Return (value, stored_at) for `key`, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, stored_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, value: Any, stored_at: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, stored_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), stored_at)
+            )
+            self._conn.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def prune(self, older_than: float, max_entries: int) -> int:
+        """Drop expired rows and keep at most `max_entries` of the newest."""
+        with self._lock:
+            cursor = self._conn.execute(
+                f"DELETE FROM {self.table} WHERE stored_at < ?", (older_than,)
+            )
+            removed = cursor.rowcount
+            cursor = self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key NOT IN "
+                f"(SELECT key FROM {self.table} ORDER BY stored_at DESC LIMIT ?)",
+                (max_entries,)
+            )
+            removed += cursor.rowcount
+            self._conn.commit()
+        return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+            self._conn.commit()
+
+
+class TTLCache:
+    """
+    Size-bounded LRU cache whose entries expire after `ttl_seconds`.
+
+    Values must be JSON-serializable when a persistence tier is configured.
+    """
+
+    # Prune the persistence tier once every this many writes
+    PRUNE_INTERVAL = 256
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl_seconds: float = 3600,
+        persist_path: Optional[Path] = None,
+        name: str = "cache"
+    ):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.persistent_hits = 0
+
+        self._store = None
+        if persist_path:
+            try:
+                self._store = SQLiteCacheStore(persist_path, table=name.replace("-", "_"))
+            except Exception as e:
+                logger.warning(f"Could not open {name} cache at {persist_path}: {e}. Using memory only.")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        """Whether `get(key)` would hit; does not count as a lookup or refresh recency."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None and self._store is not None:
+            try:
+                entry = self._store.get(key)
+            except Exception:
+                entry = None
+        return entry is not None and now - entry[1] < self.ttl_seconds
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for `key`, or None if missing or expired."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                if now - stored_at < self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+
+        if self._store is not None:
+            try:
+                entry = self._store.get(key)
+            except Exception as e:
+                logger.warning(f"{self.name} cache read failed: {e}")
+                entry = None
+            if entry is not None:
+                value, stored_at = entry
+                if now - stored_at < self.ttl_seconds:
+                    with self._lock:
+                        self._insert(key, value, stored_at)
+                        self.hits += 1
+                        self.persistent_hits += 1
+                    return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, value: Any) -> None:
+        """Insert or refresh `key`, evicting the least recently used entry if full."""
+        stored_at = time.time()
+        with self._lock:
+            self._insert(key, value, stored_at)
+            self._writes += 1
+            prune = self._writes % self.PRUNE_INTERVAL == 0
+
+        if self._store is not None:
+            try:
+                self._store.set(key, value, stored_at)
+                if prune:
+                    self._store.prune(stored_at - self.ttl_seconds, self.max_entries)
+            except Exception as e:
+                logger.warning(f"{self.name} cache write failed: {e}")
+
+    def _insert(self, key: str, value: Any, stored_at: float) -> None:
+        """Insert under the lock; caller must hold `self._lock`."""
+        self._entries[key] = (value, stored_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+        if self._store is not None:
+            self._store.delete(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self._store is not None:
+            self._store.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for sizing the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "persistent": self._store is not None,
+                "persistent_hits": self.persistent_hits,
+            }
+
+
+class SingleFlight:
+    """
+    Per-key in-flight call deduplication.
+
+    The first caller for a key runs the function; callers arriving while it
+    runs wait on its future and get the same result or exception. Results are
+    shared between callers, so they must not be mutated. A caller with a
+    deadline passes its remaining time as `timeout` and stops waiting then.
+    """
+
+    def __init__(self, name: str = "singleflight"):
+        self.name = name
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key: str, fn: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        Return `fn(*args, **kwargs)`, sharing one execution per key at a time.
+
+        Raises concurrent.futures.TimeoutError when joining a call still running
+        after `timeout` seconds; the call itself carries on for its caller.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.calls += 1
+            else:
+                self.shared += 1
+        if not leader:
+            return future.result(timeout=timeout)
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Executions, and calls saved by joining one already in flight."""
+        with self._lock:
+            return {
+                "name": self.name,
+                "calls": self.calls,
+                "saved_calls": self.shared,
+                "in_flight": len(self._calls),
+            }
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Circuit breaker for remote model calls.
+
+A breaker tracks the outcome of recent calls to one remote service. While the
+failure rate over the last CIRCUIT_WINDOW_SECONDS stays below
+CIRCUIT_FAILURE_RATE it is closed and calls pass through. Once it trips it is
+open: calls fail at once with CircuitOpenError, so callers take their fallback
+path without waiting on the service. After CIRCUIT_OPEN_SECONDS it is half-open
+and lets a single probe call through; the probe closes it on success and opens
+it again on failure. A probe still running after CIRCUIT_PROBE_TIMEOUT_SECONDS
+counts as failed, so a hung call cannot hold the probe slot forever.
+
+State is per process, so each gunicorn worker trips on its own observations.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+CIRCUIT_FAILURE_RATE = float(os.getenv("CIRCUIT_FAILURE_RATE", "0.5"))
+CIRCUIT_MIN_CALLS = int(os.getenv("CIRCUIT_MIN_CALLS", "5"))
+CIRCUIT_WINDOW_SECONDS = float(os.getenv("CIRCUIT_WINDOW_SECONDS", "60"))
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+CIRCUIT_PROBE_TIMEOUT_SECONDS = float(os.getenv("CIRCUIT_PROBE_TIMEOUT_SECONDS", "30"))
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a service whose breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Failure-rate circuit breaker around calls to one remote service.
+
+    Every exception raised by the wrapped call counts as a failure. The
+    breaker trips when at least `min_calls` calls finished within the last
+    `window_seconds` and the share of them that failed reaches
+    `failure_rate`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = CIRCUIT_FAILURE_RATE,
+        min_calls: int = CIRCUIT_MIN_CALLS,
+        window_seconds: float = CIRCUIT_WINDOW_SECONDS,
+        open_seconds: float = CIRCUIT_OPEN_SECONDS,
+        probe_timeout: float = CIRCUIT_PROBE_TIMEOUT_SECONDS
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = max(1, min_calls)
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.probe_timeout = probe_timeout
+
+        self._lock = threading.Lock()
+        self._outcomes: deque = deque()  # (finished_at, failed)
+        self._failures = 0
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_started_at = 0.0
+        # Numbers probes, so the outcome of one that timed out is ignored
+        self._probe_id = 0
+
+        self.trips = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        """Current state; an open breaker reads half-open once its wait is over."""
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Return `fn(*args, **kwargs)`, or raise CircuitOpenError while open."""
+        probe = self._acquire()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self._record(failed=True, probe=probe)
+            raise
+        except BaseException:
+            # Interrupts say nothing about the service; just free the probe slot
+            if probe:
+                with self._lock:
+                    if probe == self._probe_id:
+                        self._probing = False
+            raise
+        self._record(failed=False, probe=probe)
+        return result
+
+    def allows_calls(self) -> bool:
+        """Whether a call made now would reach the service."""
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            return state == CLOSED or (state == HALF_OPEN and not self._probing)
+
+    def _current_state(self, now: float) -> str:
+        """State at `now`; caller must hold `self._lock`. Expires a hung probe."""
+        if self._probing and now - self._probe_started_at >= self.probe_timeout:
+            logger.warning(
+                f"Circuit {self.name!r} probe still running after {self.probe_timeout:g} s; "
+                f"counting it as failed"
+            )
+            self._probing = False
+            self._trip(now)
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            return HALF_OPEN
+        return self._state
+
+    def _acquire(self) -> int:
+        """Admit a call; returns the probe's number if it is the half-open probe, else 0."""
+        now = time.monotonic()
+        with self._lock:
+            state = self._current_state(now)
+            if state == CLOSED:
+                return 0
+            if state == HALF_OPEN and not self._probing:
+                self._state = HALF_OPEN
+                self._probing = True
+                self._probe_started_at = now
+                self._probe_id += 1
+                return self._probe_id
+            self.rejected += 1
+        raise CircuitOpenError(f"Circuit {self.name!r} is open")
+
+    def _record(self, failed: bool, probe: int) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if probe:
+                if probe != self._probe_id or not self._probing:
+                    # Timed out and already counted as failed
+                    return
+                self._probing = False
+                if failed:
+                    self._trip(now)
+                else:
+                    logger.info(f"Circuit {self.name!r} closed after a successful probe")
+                    self._state = CLOSED
+                    self._outcomes.clear()
+                    self._failures = 0
+                return
+            if self._state != CLOSED:
+                # A call admitted before the breaker tripped; already accounted for
+                return
+
+            self._outcomes.append((now, failed))
+            self._failures += failed
+            self._prune(now)
+            if (failed and len(self._outcomes) >= self.min_calls
+                    and self._failures / len(self._outcomes) >= self.failure_rate):
+                self._trip(now)
+
+    def _prune(self, now: float) -> None:
+        while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+            self._failures -= self._outcomes.popleft()[1]
+
+    def _trip(self, now: float) -> None:
+        logger.warning(
+            f"Circuit {self.name!r} opened; calls fail fast for {self.open_seconds:g} s"
+        )
+        self._state = OPEN
+        self._opened_at = now
+        self.trips += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """State, recent failure rate and how many calls were short-circuited."""
+        now = time.monotonic()
+        with self._lock:
+            state = self._current_state(now)
+            self._prune(now)
+            calls = len(self._outcomes)
+            retry_in: Optional[float] = None
+            if state == OPEN:
+                retry_in = round(self.open_seconds - (now - self._opened_at), 1)
+            return {
+                "name": self.name,
+                "state": state,
+                "window_calls": calls,
+                "window_failure_rate": round(self._failures / calls, 3) if calls else 0.0,
+                "trips": self.trips,
+                "rejected_calls": self.rejected,
+                "retry_in_seconds": retry_in,
+            }
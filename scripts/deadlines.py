@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Per-request deadlines for the search stack.
+
+A Deadline is created when a request arrives and handed to every stage that
+may block (query expansion, remote embedding, term search). Each stage waits
+at most its share of the time left and, when that runs out, degrades to its
+local fallback and records its name, so the response can say which stages
+were cut short. Remote calls keep running on their worker threads after a
+stage stops waiting for them; they are never waited on past the deadline.
+
+Stages that fell back in time but because their remote service failed or
+its circuit breaker is open are recorded separately, as fallbacks.
+
+Remote calls run on a RemoteCallPool, which counts the calls requests gave
+up on. Those hold a worker until they return, so once they hold every
+worker the pool refuses new calls and callers fall back at once instead of
+queueing behind hung requests.
+"""
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional
+
+
+class Deadline:
+    """Absolute expiry of one request, shared by the threads serving it."""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + seconds
+        self._cut_short: List[str] = []
+        self._fallbacks: List[str] = []
+        self._lock = threading.Lock()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def budget(self, share: float = 1.0, cap: Optional[float] = None) -> float:
+        """Seconds a stage may wait: `share` of the time left, and at most `cap`."""
+        seconds = self.remaining() * share
+        if cap is not None:
+            seconds = min(seconds, max(0.0, cap))
+        return seconds
+
+    def wait(self, future: Future, stage: str, share: float = 1.0, cap: Optional[float] = None) -> Any:
+        """
+        Result of `future` within the stage's budget.
+
+        Raises concurrent.futures.TimeoutError, after recording `stage` as
+        cut short, if the future is not done in time.
+        """
+        try:
+            return future.result(timeout=self.budget(share, cap))
+        except FutureTimeoutError:
+            # A done future raised its own timeout; the stage was not cut
+            if not future.done():
+                self.cut(stage)
+            raise
+
+    def cut(self, stage: str) -> None:
+        """Record that `stage` ran out of time and fell back."""
+        with self._lock:
+            if stage not in self._cut_short:
+                self._cut_short.append(stage)
+
+    def fall_back(self, stage: str) -> None:
+        """Record that `stage` used its local fallback because its service was unavailable."""
+        with self._lock:
+            if stage not in self._fallbacks:
+                self._fallbacks.append(stage)
+
+    @property
+    def cut_short(self) -> List[str]:
+        """Stages that ran out of time so far, in the order they did."""
+        with self._lock:
+            return list(self._cut_short)
+
+    @property
+    def fallbacks(self) -> List[str]:
+        """Stages that fell back for a failed or short-circuited service, in order."""
+        with self._lock:
+            return list(self._fallbacks)
+
+
+class PoolExhaustedError(RuntimeError):
+    """Raised instead of running a call while abandoned calls hold every worker."""
+
+
+class RemoteCallPool:
+    """
+    Thread pool for remote calls that requests wait on under a deadline.
+
+    A caller that stops waiting for a call hands its future to `abandon`;
+    the call is counted until it returns. While abandoned calls hold every
+    worker, `submit` returns futures that have already failed with
+    PoolExhaustedError.
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._abandoned = 0
+
+        self.abandoned_total = 0
+        self.rejected = 0
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """Run `fn(*args, **kwargs)` on the pool, unless abandoned calls fill it."""
+        with self._lock:
+            exhausted = self._abandoned >= self.max_workers
+            if exhausted:
+                self.rejected += 1
+        if exhausted:
+            future: Future = Future()
+            future.set_exception(PoolExhaustedError(
+                f"All {self.max_workers} {self.name!r} workers are busy with abandoned calls"
+            ))
+            return future
+        return self._executor.submit(fn, *args, **kwargs)
+
+    def abandon(self, future: Future) -> None:
+        """Count `future` as given up on until it finishes."""
+        with self._lock:
+            self._abandoned += 1
+            self.abandoned_total += 1
+        future.add_done_callback(self._release)
+
+    def _release(self, future: Future) -> None:
+        with self._lock:
+            self._abandoned -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Workers, abandoned calls still running, and calls refused because of them."""
+        with self._lock:
+            return {
+                "name": self.name,
+                "workers": self.max_workers,
+                "abandoned_in_flight": self._abandoned,
+                "abandoned_total": self.abandoned_total,
+                "rejected_calls": self.rejected,
+                "exhausted": self._abandoned >= self.max_workers,
+            }
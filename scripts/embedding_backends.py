@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Pluggable embedding backends.
+
+`vertex` calls the Vertex AI text embedding model. `local` is a dependency-light
+hashed TF-IDF vectorizer in NumPy: it needs no network or credentials, so it
+serves as an offline fallback and lets CI and benchmarks run the full search
+path. Its document-frequency statistics are fitted at index time and persisted
+next to the index it was used to build.
+"""
+
+import hashlib
+import logging
+import math
+import os
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from lexical_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+VERTEX_BACKEND = "vertex"
+LOCAL_BACKEND = "local"
+BACKENDS = (VERTEX_BACKEND, LOCAL_BACKEND)
+
+LOCAL_MODEL_NAME = "local-hashed-tfidf-v1"
+LOCAL_DIMENSION = 768
+VECTORIZER_FILE = "vectorizer.npz"
+
+
+class EmbeddingBackend:
+    """Turns texts into embedding vectors. `name` identifies the vector space."""
+
+    name = ""
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        raise NotImplementedError
+
+
+class VertexEmbeddingBackend(EmbeddingBackend):
+    """Vertex AI text embedding model, shared through the client registry."""
+
+    def __init__(self, model_name: Optional[str] = None):
+        import gcp_clients
+        self.name = model_name or gcp_clients.EMBEDDING_MODEL_NAME
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        import gcp_clients
+        model = gcp_clients.get_embedding_model(self.name)
+        return [list(e.values) for e in model.get_embeddings(texts)]
+
+
+@lru_cache(maxsize=65536)
+def _bucket(feature: str, dimension: int) -> Tuple[int, float]:
+    """Stable hash of a feature to a (bucket, sign) pair."""
+    digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+    return digest % dimension, (1.0 if digest >> 63 else -1.0)
+
+
+class HashedTfidfBackend(EmbeddingBackend):
+    """
+    Signed feature hashing of unigrams and bigrams with sublinear TF and IDF weights.
+
+    Unfitted, every bucket has IDF 1.0, which still gives usable bag-of-words vectors.
+    """
+
+    name = LOCAL_MODEL_NAME
+
+    def __init__(self, dimension: int = LOCAL_DIMENSION, idf: Optional[np.ndarray] = None, doc_count: int = 0):
+        self.dimension = dimension
+        self.idf = idf if idf is not None else np.ones(dimension, dtype=np.float32)
+        self.doc_count = doc_count
+
+    @staticmethod
+    def _features(text: str) -> List[str]:
+        tokens = tokenize(text)
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def fit(self, texts: List[str]) -> "HashedTfidfBackend":
+        """Learn per-bucket IDF weights from a corpus."""
+        doc_freq = np.zeros(self.dimension, dtype=np.float64)
+        for text in texts:
+            buckets = {_bucket(f, self.dimension)[0] for f in self._features(text)}
+            doc_freq[list(buckets)] += 1
+        self.doc_count = len(texts)
+        self.idf = (np.log((1.0 + self.doc_count) / (1.0 + doc_freq)) + 1.0).astype(np.float32)
+        return self
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, count in Counter(self._features(text)).items():
+                bucket, sign = _bucket(feature, self.dimension)
+                vectors[row, bucket] += sign * (1.0 + math.log(count))
+        vectors *= self.idf
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).tolist()
+
+    def save(self, index_dir: Path) -> None:
+        """Persist the fitted statistics next to the index built with them."""
+        index_dir = Path(index_dir)
+        index_dir.mkdir(parents=True, exist_ok=True)
+        np.savez(
+            index_dir / VECTORIZER_FILE,
+            idf=self.idf,
+            doc_count=np.array(self.doc_count),
+            dimension=np.array(self.dimension),
+        )
+
+    @classmethod
+    def load(cls, index_dir: Path) -> "HashedTfidfBackend":
+        with np.load(Path(index_dir) / VECTORIZER_FILE) as data:
+            return cls(
+                dimension=int(data["dimension"]),
+                idf=data["idf"].astype(np.float32),
+                doc_count=int(data["doc_count"]),
+            )
+
+
+def get_backend(name: Optional[str] = None, index_dir: Optional[Path] = None) -> EmbeddingBackend:
+    """
+    Create the embedding backend called `name` (default: $EMBEDDING_BACKEND or "vertex").
+
+    Args:
+        name: "vertex" or "local"
+        index_dir: For the local backend, where its fitted statistics live
+
+    Returns:
+        The backend instance
+    """
+    name = name or os.getenv("EMBEDDING_BACKEND", VERTEX_BACKEND)
+    if name == VERTEX_BACKEND:
+        return VertexEmbeddingBackend()
+    if name == LOCAL_BACKEND:
+        if index_dir is not None and (Path(index_dir) / VECTORIZER_FILE).is_file():
+            return HashedTfidfBackend.load(index_dir)
+        logger.warning("No fitted local vectorizer found; using unfitted IDF weights")
+        return HashedTfidfBackend()
+    raise ValueError(f"Unknown embedding backend {name!r}, expected one of {BACKENDS}")
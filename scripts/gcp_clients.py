@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Process-wide registry of heavyweight Google Cloud clients and models.
+
+Firestore clients, embedding models and generative models are expensive to
+construct (model metadata lookups plus fresh gRPC channels), so each is created
+once per process on first use and shared by every thread. `warm_up` builds them
+eagerly, e.g. from a gunicorn worker boot hook.
+"""
+
+import os
+import logging
+import threading
+import time
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+# None lets the clients take the project from application default credentials
+PROJECT_ID = os.getenv("GCP_PROJECT_ID") or os.getenv("GOOGLE_CLOUD_PROJECT") or None
+LOCATION = os.getenv("GCP_LOCATION", "us-central1")
+
+EMBEDDING_MODEL_NAME = "text-embedding-004"
+GENERATIVE_MODEL_NAME = "gemini-1.5-flash"
+
+_lock = threading.RLock()
+_vertex_initialized = False
+_firestore_client = None
+_embedding_models: Dict[str, Any] = {}
+_generative_models: Dict[str, Any] = {}
+
+
+def init_vertex() -> None:
+    """Initialize the Vertex AI SDK once per process."""
+    global _vertex_initialized
+    if _vertex_initialized:
+        return
+    with _lock:
+        if not _vertex_initialized:
+            import vertexai
+            vertexai.init(project=PROJECT_ID, location=LOCATION)
+            _vertex_initialized = True
+
+
+def get_firestore_client():
+    """Return the shared Firestore client."""
+    global _firestore_client
+    if _firestore_client is not None:
+        return _firestore_client
+    with _lock:
+        if _firestore_client is None:
+            from google.cloud import firestore
+            _firestore_client = firestore.Client(project=PROJECT_ID)
+        return _firestore_client
+
+
+def get_embedding_model(name: str = EMBEDDING_MODEL_NAME):
+    """Return the shared TextEmbeddingModel for `name`."""
+    model = _embedding_models.get(name)
+    if model is not None:
+        return model
+    with _lock:
+        if name not in _embedding_models:
+            init_vertex()
+            from vertexai.language_models import TextEmbeddingModel
+            _embedding_models[name] = TextEmbeddingModel.from_pretrained(name)
+        return _embedding_models[name]
+
+
+def get_generative_model(name: str = GENERATIVE_MODEL_NAME):
+    """Return the shared GenerativeModel for `name`."""
+    model = _generative_models.get(name)
+    if model is not None:
+        return model
+    with _lock:
+        if name not in _generative_models:
+            init_vertex()
+            from vertexai.generative_models import GenerativeModel
+            _generative_models[name] = GenerativeModel(name)
+        return _generative_models[name]
+
+
+def warm_up() -> Dict[str, Any]:
+    """
+    Eagerly construct every registered client and model.
+
+    Failures are logged and reported rather than raised, so a worker still
+    boots when a backend is unreachable and retries lazily on first use.
+
+    Returns:
+        Per-client status with construction time in milliseconds
+    """
+    report = {}
+    for name, factory in (
+        ("vertex", init_vertex),
+        ("firestore", get_firestore_client),
+        ("embedding_model", get_embedding_model),
+        ("generative_model", get_generative_model),
+    ):
+        start = time.perf_counter()
+        try:
+            factory()
+            report[name] = {"ok": True, "ms": round((time.perf_counter() - start) * 1000, 1)}
+        except Exception as e:
+            logger.warning(f"Warm-up of {name} failed: {e}")
+            report[name] = {"ok": False, "error": str(e)}
+    logger.info(f"Client warm-up complete: {report}")
+    return report
@@ -3,19 +3,32 @@
 Generate Embeddings Script
 
 This script scans all guide files in the guides directory, generates embeddings
-using Google Vertex AI, and uploads them to Firestore for semantic search.
+using Google Vertex AI, and uploads them to the vector store (Firestore by
+default) for semantic search.
+It always also writes an offline index built with the local hashed TF-IDF
+backend, which needs no network access, and the corpus-mined tables for local
+query expansion.
 
 This script is designed to be run as part of the content pipeline workflow.
 
 Usage:
     python scripts/generate_embeddings.py
+    python scripts/generate_embeddings.py --backend local   # offline, no Google credentials
+    python scripts/generate_embeddings.py --store sqlite    # vectors of record in local SQLite
     
 Environment Variables:
-    GCP_PROJECT_ID: Google Cloud Project ID (default: from application default)
+    GCP_PROJECT_ID: Google Cloud Project ID (default: $GOOGLE_CLOUD_PROJECT, then
+                    from application default credentials)
+    SEMANTIC_INDEX_DIR: Where to write the on-disk index artifact
+                        (default: guides/semantic_index)
+    EMBEDDING_BACKEND: Default for --backend ("vertex" or "local")
+    VECTOR_STORE: Default for --store ("firestore", "sqlite" or "mmap")
+    VECTOR_STORE_PATH: Collection, file or directory of the vector store
 """
 
 import os
 import sys
+import argparse
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
@@ -26,49 +39,60 @@ except ImportError:
     print("   Install with: pip install python-frontmatter")
     sys.exit(1)
 
-try:
-    from google.cloud import firestore
-    from vertexai.language_models import TextEmbeddingModel
-    import vertexai
-except ImportError:
-    print("❌ Missing dependencies: google-cloud-firestore, google-cloud-aiplatform")
-    print("   Install with: pip install google-cloud-firestore google-cloud-aiplatform")
-    sys.exit(1)
+import gcp_clients
+from embedding_backends import BACKENDS, VERTEX_BACKEND, HashedTfidfBackend, get_backend
+from passages import split_guide_file
+from query_expansion import LocalExpander
+from vector_index import VectorIndex, normalize_maturity
+from vector_store import FIRESTORE_STORE, MMAP_STORE, STORE_BACKENDS, MmapVectorStore, get_vector_store, guide_document_id
 
 # --- CONFIGURATION ---
-PROJECT_ID = os.getenv("GCP_PROJECT_ID")
-LOCATION = "us-central1"
-FIRESTORE_COLLECTION = "implementation-guides"
+PROJECT_ID = gcp_clients.PROJECT_ID
+LOCATION = gcp_clients.LOCATION
 GUIDES_ROOT_DIR = Path("guides")
-MODEL_NAME = "text-embedding-004"
+MODEL_NAME = gcp_clients.EMBEDDING_MODEL_NAME
 MAX_WORKERS = 10
 BATCH_SIZE = 5  # Process embeddings in batches to avoid rate limits
+SEMANTIC_INDEX_DIR = Path(os.getenv("SEMANTIC_INDEX_DIR", str(GUIDES_ROOT_DIR / "semantic_index")))
+PASSAGE_INDEX_DIR = SEMANTIC_INDEX_DIR / "passages"
+LOCAL_INDEX_DIR = SEMANTIC_INDEX_DIR / "local"
 
-# --- INITIALIZE CLIENTS ---
-print(f"🔧 Initializing Google Cloud clients...")
-print(f"   Project ID: {PROJECT_ID}")
-print(f"   Location: {LOCATION}")
+# Set in main(); the Vertex backend is None in offline (--backend local) runs
+embedder = None
 
-# Initialize Vertex AI
-vertexai.init(project=PROJECT_ID, location=LOCATION)
 
-# Initialize Firestore
-db = firestore.Client(project=PROJECT_ID)
-
-# Initialize embedding model
-model = TextEmbeddingModel.from_pretrained(MODEL_NAME)
+def init_vertex_clients() -> None:
+    """Initialize the Vertex embedding backend from the shared registry."""
+    global embedder
+    
+    try:
+        from google.cloud import firestore  # noqa: F401
+        import vertexai  # noqa: F401
+    except ImportError:
+        print("❌ Missing dependencies: google-cloud-firestore, google-cloud-aiplatform")
+        print("   Install with: pip install google-cloud-firestore google-cloud-aiplatform")
+        print("   Or run offline with: --backend local")
+        sys.exit(1)
+    
+    print(f"🔧 Initializing Google Cloud clients...")
+    print(f"   Project ID: {PROJECT_ID or 'from application default'}")
+    print(f"   Location: {LOCATION}")
+    
+    embedder = get_backend(VERTEX_BACKEND)
 
 
 def extract_text_for_embedding(content: str, max_chars: int = 10000) -> str:
     """
     Extract and prepare text for embedding generation.
-    Truncate if necessary to stay within model limits.
+    Truncate if necessary to stay within model limits; the passage index
+    still covers the full text of long guides.
     """
     # Remove excessive whitespace
     text = " ".join(content.split())
     
     # Truncate if too long
     if len(text) > max_chars:
+        print(f"   ⚠️  Guide-level embedding truncated from {len(text)} to {max_chars} chars")
         text = text[:max_chars] + "..."
     
     return text
@@ -89,20 +113,24 @@ def process_guide_file(file_path: Path) -> dict:
         metadata = post.metadata
         
         # Generate a unique, stable ID from the file path
-        doc_id = str(file_path.relative_to(GUIDES_ROOT_DIR)).replace("/", "_").replace(".md", "")
+        doc_id = guide_document_id(file_path.relative_to(GUIDES_ROOT_DIR))
         
         # Prepare text for embedding
         embedding_text = extract_text_for_embedding(content)
         
-        # Generate embedding
-        embeddings = model.get_embeddings([embedding_text])
-        vector = embeddings[0].values
+        # Generate embeddings for the guide and each heading-delimited passage;
+        # offline runs only build the local index, from the text
+        vector = None
+        passages = []
+        if embedder is not None:
+            vector = embedder.embed([embedding_text])[0]
+            passages = embed_passages(file_path, metadata)
         
-        # Prepare data for Firestore
+        # Prepare data for the vector store
         doc_data = {
             "title": metadata.get("title", file_path.parent.name),
             "division": metadata.get("division", "uncategorized"),
-            "maturity": metadata.get("maturity", "unknown"),
+            "maturity": normalize_maturity(metadata.get("maturity")),
             "source_url": metadata.get("source_url", ""),  # Empty for local guides
             "file_path": str(file_path.relative_to(GUIDES_ROOT_DIR)),
             "content": content,
@@ -111,44 +139,157 @@ def process_guide_file(file_path: Path) -> dict:
             "is_local": not bool(metadata.get("source_url")),  # Flag for local-only guides
         }
         
-        return {"id": doc_id, "data": doc_data, "path": rel_path}
+        return {
+            "id": doc_id,
+            "data": doc_data,
+            "passages": passages,
+            "embedding_text": embedding_text,
+            "path": rel_path
+        }
         
     except Exception as e:
         print(f"❌ Failed to process {file_path}: {e}")
         return None
 
 
-def upsert_to_firestore(results: list) -> tuple:
+def embed_passages(file_path: Path, metadata: dict) -> list:
+    """
+    Split a guide into passages and embed each one.
+    Returns passage records with their vector and byte range in the file.
     """
-    Upsert processed guide documents to Firestore.
+    title = metadata.get("title", file_path.parent.name)
+    passages = split_guide_file(file_path)
+    records = []
+    
+    for i in range(0, len(passages), BATCH_SIZE):
+        batch = passages[i:i + BATCH_SIZE]
+        texts = [
+            extract_text_for_embedding(f"{title} - {p['heading']}\n\n{p['text']}")
+            for p in batch
+        ]
+        embeddings = embedder.embed(texts)
+        for passage, embedding in zip(batch, embeddings):
+            records.append({
+                "title": title,
+                "division": metadata.get("division", "uncategorized"),
+                "maturity": normalize_maturity(metadata.get("maturity")),
+                "file_path": str(file_path.relative_to(GUIDES_ROOT_DIR)),
+                "content": passage["text"],
+                "embedding": embedding,
+                "section": {
+                    "heading": passage["heading"],
+                    "start": passage["start"],
+                    "end": passage["end"],
+                },
+            })
+    
+    return records
+
+
+def upsert_to_store(results: list, store) -> tuple:
+    """
+    Upsert processed guide documents to the vector store in one batch.
     Returns (success_count, failure_count).
     """
-    success_count = 0
-    failure_count = 0
-    
-    for result in results:
-        if result is None:
-            failure_count += 1
-            continue
-            
-        try:
-            doc_id = result["id"]
-            doc_data = result["data"]
-            
-            # Upsert to Firestore
-            db.collection(FIRESTORE_COLLECTION).document(doc_id).set(doc_data)
-            print(f"   ✅ Upserted: {doc_id}")
-            success_count += 1
-            
-        except Exception as e:
-            print(f"   ❌ Failed to upsert {result['path']}: {e}")
-            failure_count += 1
-    
-    return success_count, failure_count
+    documents = [dict(result["data"], id=result["id"]) for result in results if result is not None]
+    failure_count = len(results) - len(documents)
+    
+    try:
+        store.upsert(documents)
+    except Exception as e:
+        print(f"   ❌ Failed to upsert to the {store.name} store: {e}")
+        return 0, len(results)
+    
+    for document in documents:
+        print(f"   ✅ Upserted: {document['id']}")
+    return len(documents), failure_count
+
+
+def save_index(index: VectorIndex, index_dir: Path, model: str, related: bool = False) -> dict:
+    """
+    Build the int8 scan copy and the IVF structure for approximate search, then
+    save the index. Building is cheap at any size; searches only use the IVF
+    structure above ANN_MIN_ROWS. With `related`, also precompute each guide's
+    nearest guides for the related-guides lookup.
+    """
+    return MmapVectorStore(index_dir, related=related).write_index(index, model=model)
+
+
+def write_index_artifact(results: list) -> int:
+    """
+    Write the processed guides and their passages as memory-mappable on-disk indexes.
+    Returns the number of guide vectors written.
+    """
+    results = [result for result in results if result is not None]
+    
+    index = VectorIndex.from_documents(result["data"] for result in results)
+    header = save_index(index, SEMANTIC_INDEX_DIR, MODEL_NAME, related=True)
+    print(f"   ✅ Wrote {header['count']} vectors ({header['dimension']} dims) to {SEMANTIC_INDEX_DIR}")
+    
+    passage_index = VectorIndex.from_documents(
+        passage for result in results for passage in result["passages"]
+    )
+    passage_header = save_index(passage_index, PASSAGE_INDEX_DIR, MODEL_NAME)
+    print(f"   ✅ Wrote {passage_header['count']} passage vectors to {PASSAGE_INDEX_DIR}")
+    
+    return header["count"]
+
+
+def write_local_index(results: list) -> int:
+    """
+    Fit the local hashed TF-IDF backend on the guides and write an offline index
+    with its statistics. Returns the number of vectors written.
+    """
+    results = [result for result in results if result is not None]
+    texts = [f"{r['data']['title']}\n\n{r['embedding_text']}" for r in results]
+    
+    backend = HashedTfidfBackend().fit(texts)
+    documents = [
+        dict(result["data"], embedding=vector)
+        for result, vector in zip(results, backend.embed(texts))
+    ]
+    
+    header = save_index(VectorIndex.from_documents(documents), LOCAL_INDEX_DIR, backend.name, related=True)
+    backend.save(LOCAL_INDEX_DIR)
+    print(f"   ✅ Wrote {header['count']} local-backend vectors to {LOCAL_INDEX_DIR}")
+    return header["count"]
+
+
+def write_expansion_index(results: list) -> int:
+    """
+    Mine the local query expansion tables from the guides and write them next
+    to the index. Returns the number of candidate phrases written.
+    """
+    results = [result for result in results if result is not None]
+    expander = LocalExpander.build(
+        (result["data"]["title"], result["data"]["content"]) for result in results
+    )
+    expander.save(SEMANTIC_INDEX_DIR)
+    print(f"   ✅ Wrote local expansion ({len(expander.neighbours)} terms, {len(expander)} phrases) "
+          f"to {SEMANTIC_INDEX_DIR}")
+    return len(expander)
 
 
 def main():
     """Finds all guides and processes them in parallel."""
+    parser = argparse.ArgumentParser(description="Generate guide embeddings and search indexes")
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default=os.getenv("EMBEDDING_BACKEND", VERTEX_BACKEND),
+        help="Embedding backend; 'local' runs offline and only writes the local index"
+    )
+    parser.add_argument(
+        "--store",
+        choices=STORE_BACKENDS,
+        default=os.getenv("VECTOR_STORE", FIRESTORE_STORE),
+        help="Vector store of record; 'mmap' keeps only the on-disk index artifact"
+    )
+    args = parser.parse_args()
+    
+    if args.backend == VERTEX_BACKEND:
+        init_vertex_clients()
+    
     print("=" * 70)
     print("🚀 Starting Embedding Generation Process")
     print("=" * 70)
@@ -161,7 +302,7 @@ def main():
         return
     
     print(f"\n📊 Found {len(guide_files)} guides to process")
-    print(f"🔧 Using model: {MODEL_NAME}")
+    print(f"🔧 Using model: {MODEL_NAME if embedder else HashedTfidfBackend.name}")
     print(f"🔧 Max workers: {MAX_WORKERS}")
     print("=" * 70 + "\n")
     
@@ -174,12 +315,26 @@ def main():
             result = future.result()
             results.append(result)
     
+    # The mmap store is the index artifact written below
+    if embedder is not None and args.store != MMAP_STORE:
+        store = get_vector_store(args.store)
+        print("\n" + "=" * 70)
+        print(f"💾 Uploading to the {store.name} vector store...")
+        print("=" * 70 + "\n")
+        
+        success_count, failure_count = upsert_to_store(results, store)
+    else:
+        failure_count = sum(1 for result in results if result is None)
+        success_count = len(results) - failure_count
+    
     print("\n" + "=" * 70)
-    print("💾 Uploading to Firestore...")
+    print("📦 Writing on-disk index artifacts...")
     print("=" * 70 + "\n")
     
-    # Upsert to Firestore
-    success_count, failure_count = upsert_to_firestore(results)
+    if embedder is not None:
+        write_index_artifact(results)
+    write_local_index(results)
+    write_expansion_index(results)
     
     # Final summary
     print("\n" + "=" * 70)
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+In-memory BM25 inverted index over the guide markdown files.
+
+Used when vector search is unavailable, and optionally fused with vector
+results through reciprocal rank fusion. The index is built once from disk;
+queries only touch in-memory posting arrays.
+"""
+
+import logging
+import re
+import threading
+import time
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from vector_index import UNKNOWN_MATURITY, normalize_maturity
+
+logger = logging.getLogger(__name__)
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+PREVIEW_CHARS = 200
+FOUNDATIONAL_MATURITY = "foundational-1"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how i if in into is it its of on or "
+    "that the this to was we what when where which who will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase alphanumeric tokens, without stopwords and single characters."""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in _STOPWORDS]
+
+
+def _parse_guide(guide_file: Path, guides_root: Path) -> Dict[str, Any]:
+    """Read a guide file into a document dict for indexing."""
+    with open(guide_file, "r", encoding="utf-8") as f:
+        content = f.read()
+
+    frontmatter = {}
+    body = content
+    if content.startswith("---"):
+        parts = content.split("---", 2)
+        if len(parts) >= 3:
+            body = parts[2]
+            for line in parts[1].strip().split("\n"):
+                if ":" in line:
+                    key, value = line.split(":", 1)
+                    frontmatter[key.strip()] = value.strip().strip("\"'")
+
+    rel_path = guide_file.relative_to(guides_root)
+    division = rel_path.parts[0] if len(rel_path.parts) > 1 else "unknown"
+    title = frontmatter.get("title") or guide_file.parent.name.replace("-", " ").title()
+
+    return {
+        "title": title,
+        "division": division,
+        "file_path": str(rel_path),
+        "maturity": frontmatter.get("maturity", "Unknown"),
+        "content_preview": " ".join(body.split())[:PREVIEW_CHARS],
+        # Title tokens count twice so a title match outranks a passing mention
+        "text": f"{title}\n{title}\n{body}",
+    }
+
+
+def guide_files(guides_root: Path) -> List[Path]:
+    """Every guide's index.md, the same set generate_embeddings.py embeds; READMEs are not guides."""
+    guides_root = Path(guides_root)
+    return sorted(
+        p for p in guides_root.glob("**/index.md")
+        if "semantic_index" not in p.relative_to(guides_root).parts
+    )
+
+
+def corpus_signature(guides_root: Path) -> Tuple[int, int, int]:
+    """Cheap change detector for the guides tree: (file count, total size, newest mtime)."""
+    count = size = newest = 0
+    for path in guide_files(guides_root):
+        stat = path.stat()
+        count += 1
+        size += stat.st_size
+        newest = max(newest, stat.st_mtime_ns)
+    return count, size, newest
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed set of documents.
+
+    Each term's postings hold document ids and precomputed BM25 weights, so a
+    query is a handful of scatter-adds into a score array.
+    """
+
+    def __init__(self, documents: List[Dict[str, Any]], k1: float = BM25_K1, b: float = BM25_B):
+        self.titles = [d["title"] for d in documents]
+        self.divisions = np.array([d["division"] for d in documents], dtype=object)
+        self.file_paths = [d["file_path"] for d in documents]
+        self.maturities = np.array([normalize_maturity(d.get("maturity")) for d in documents], dtype=object)
+        self._folded_divisions = np.array([(d or "").casefold() for d in self.divisions.tolist()], dtype=object)
+        self.previews = [d.get("content_preview", "") for d in documents]
+
+        term_freqs: Dict[str, Dict[int, int]] = {}
+        doc_lengths = np.zeros(len(documents), dtype=np.float32)
+        for doc_id, document in enumerate(documents):
+            tokens = tokenize(document["text"])
+            doc_lengths[doc_id] = len(tokens)
+            for token in tokens:
+                postings = term_freqs.setdefault(token, {})
+                postings[doc_id] = postings.get(doc_id, 0) + 1
+
+        n = len(documents)
+        avg_length = float(doc_lengths.mean()) if n else 0.0
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for term, postings in term_freqs.items():
+            doc_ids = np.fromiter(postings.keys(), dtype=np.int32, count=len(postings))
+            tf = np.fromiter(postings.values(), dtype=np.float32, count=len(postings))
+            idf = np.log(1.0 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            norm = k1 * (1.0 - b + b * doc_lengths[doc_ids] / max(avg_length, 1.0))
+            weights = (idf * tf * (k1 + 1.0) / (tf + norm)).astype(np.float32)
+            self.postings[term] = (doc_ids, weights)
+
+    def __len__(self) -> int:
+        return len(self.file_paths)
+
+    @classmethod
+    def from_guides_dir(cls, guides_root: Path) -> "BM25Index":
+        """Build an index from every markdown file under `guides_root`."""
+        guides_root = Path(guides_root)
+        documents = []
+        for guide_file in guide_files(guides_root):
+            try:
+                documents.append(_parse_guide(guide_file, guides_root))
+            except Exception as e:
+                logger.warning(f"Error reading {guide_file}: {e}")
+        return cls(documents)
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        division_filter: str = None,
+        maturity_filter: str = None,
+        include_foundational: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Rank documents for `query` by BM25.
+
+        Scores are reported relative to the best match (1.0); the raw BM25
+        score is kept as "bm25".
+
+        Args:
+            query: Free-text query
+            top_k: Number of results to return
+            division_filter: Optional division to filter by
+            maturity_filter: Optional maturity level to filter by
+            include_foundational: Whether foundational guides pass the maturity filter
+
+        Returns:
+            Matching documents with scores, best first
+        """
+        if len(self) == 0 or top_k <= 0:
+            return []
+
+        scores = np.zeros(len(self), dtype=np.float32)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if postings is not None:
+                doc_ids, weights = postings
+                scores[doc_ids] += weights
+
+        mask = scores > 0
+        if division_filter:
+            mask &= self._folded_divisions == division_filter.casefold()
+        if maturity_filter:
+            allowed = (self.maturities == maturity_filter) | (self.maturities == UNKNOWN_MATURITY)
+            if include_foundational:
+                allowed |= self.maturities == FOUNDATIONAL_MATURITY
+            mask &= allowed
+
+        candidates = np.flatnonzero(mask)
+        if len(candidates) == 0:
+            return []
+
+        k = min(top_k, len(candidates))
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        best = float(scores[top[0]])
+
+        return [
+            {
+                "title": self.titles[i],
+                "division": self.divisions[i],
+                "file_path": self.file_paths[i],
+                "maturity": self.maturities[i],
+                "score": float(scores[i]) / best,
+                "bm25": float(scores[i]),
+                "content_preview": self.previews[i] + "...",
+            }
+            for i in top
+        ]
+
+
+class LexicalIndexManager:
+    """
+    Holds the current BM25 index for a guides tree and rebuilds it on change.
+
+    `get` never blocks on disk after the first build: at most once every
+    `refresh_seconds` it starts a background check of the tree's signature
+    and swaps in a rebuilt index if files changed. `generation` counts
+    those swaps.
+    """
+
+    def __init__(self, guides_root: Path, refresh_seconds: float = 60.0):
+        self.guides_root = Path(guides_root)
+        self.refresh_seconds = refresh_seconds
+        self._index: Optional[BM25Index] = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self.generation = 0
+
+    def get(self) -> BM25Index:
+        """Return the current index, building it synchronously on first use."""
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._rebuild(corpus_signature(self.guides_root))
+            return self._index
+
+        if time.monotonic() - self._checked_at >= self.refresh_seconds:
+            with self._lock:
+                if not self._refreshing:
+                    self._refreshing = True
+                    self._checked_at = time.monotonic()
+                    threading.Thread(target=self._refresh, daemon=True).start()
+        return self._index
+
+    def _refresh(self) -> None:
+        try:
+            signature = corpus_signature(self.guides_root)
+            if signature != self._signature:
+                self._rebuild(signature)
+        except Exception as e:
+            logger.warning(f"Lexical index refresh failed: {e}")
+        finally:
+            self._refreshing = False
+
+    def _rebuild(self, signature: Tuple[int, int, int]) -> None:
+        start = time.perf_counter()
+        index = BM25Index.from_guides_dir(self.guides_root)
+        if self._index is not None:
+            self.generation += 1
+        self._index = index
+        self._signature = signature
+        self._checked_at = time.monotonic()
+        logger.info(
+            f"Built lexical index over {len(index)} files with {len(index.postings)} terms "
+            f"in {(time.perf_counter() - start) * 1000:.0f} ms"
+        )
+
+
+def reciprocal_rank_fusion(
+    result_lists: List[List[Dict[str, Any]]],
+    top_k: int = 5,
+    k: int = RRF_K
+) -> List[Dict[str, Any]]:
+    """
+    Fuse ranked result lists by reciprocal rank: score = sum of 1 / (k + rank).
+
+    Results are matched on "file_path"; the first list's copy of a result is
+    kept, with its original score preserved as "source_score".
+
+    Args:
+        result_lists: Ranked result lists, best first
+        top_k: Number of fused results to return
+        k: RRF damping constant
+
+    Returns:
+        Fused results, best first
+    """
+    fused: Dict[str, Dict[str, Any]] = {}
+    for results in result_lists:
+        for rank, result in enumerate(results, start=1):
+            path = result.get("file_path")
+            if not path:
+                continue
+            if path not in fused:
+                entry = dict(result)
+                entry["source_score"] = result.get("score", 0)
+                entry["score"] = 0.0
+                fused[path] = entry
+            fused[path]["score"] += 1.0 / (k + rank)
+
+    ranked = sorted(fused.values(), key=lambda r: r["score"], reverse=True)
+    return ranked[:top_k]
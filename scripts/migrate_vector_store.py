@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Migrate Vector Store Script
+
+Copies guide documents between vector stores, and compares how long each
+store takes to load its vectors into a resident index and to serve searches
+from it.
+
+Usage:
+    python scripts/migrate_vector_store.py copy --from firestore --to sqlite
+    python scripts/migrate_vector_store.py copy --from sqlite --to mmap --to-path /tmp/index
+    python scripts/migrate_vector_store.py copy --from firestore --to firestore  # re-pack embeddings
+    python scripts/migrate_vector_store.py benchmark --stores firestore sqlite mmap
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from vector_store import STORE_BACKENDS, get_vector_store
+
+
+def copy(args) -> None:
+    """Copy every document of one store into another."""
+    # Copying a store onto itself rewrites every document in the current format
+    if args.replace and args.source == args.target and args.from_path == args.to_path:
+        sys.exit("❌ --replace would empty the source store")
+
+    source = get_vector_store(args.source, args.from_path)
+    target = get_vector_store(args.target, args.to_path)
+
+    start = time.perf_counter()
+    documents = list(source.iter_documents(include_content=True))
+    read_seconds = time.perf_counter() - start
+    print(f"📥 Read {len(documents)} documents from {source.name} in {read_seconds:.2f} s")
+
+    if args.replace:
+        print(f"🗑️  Removed {target.delete_all()} documents from {target.name}")
+
+    start = time.perf_counter()
+    written = target.upsert(documents)
+    print(f"📤 Wrote {written} documents to {target.name} in {time.perf_counter() - start:.2f} s")
+
+
+def benchmark(args) -> None:
+    """Time loading each store into a resident index and searching it."""
+    print(f"{'store':>10} {'rows':>8} {'load ms':>10} {'ms/query':>10}")
+    for name in args.stores:
+        store = get_vector_store(name)
+        start = time.perf_counter()
+        try:
+            index = store.load_index()
+        except Exception as e:
+            print(f"{name:>10} failed to load: {e}")
+            continue
+        load_ms = (time.perf_counter() - start) * 1000
+
+        if not len(index):
+            print(f"{name:>10} {0:>8} {load_ms:>10.1f} {'-':>10}")
+            continue
+
+        # Queries are stored vectors, so every store answers the same workload
+        rng = np.random.default_rng(args.seed)
+        queries = np.asarray(index.vectors[rng.choice(len(index), args.queries)], dtype=np.float32)
+        start = time.perf_counter()
+        for query in queries:
+            index.search(query, top_k=args.top_k)
+        query_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        print(f"{name:>10} {len(index):>8} {load_ms:>10.1f} {query_ms:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy or benchmark guide vector stores")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    copy_parser = subparsers.add_parser("copy", help="Copy documents from one store to another")
+    copy_parser.add_argument("--from", dest="source", choices=STORE_BACKENDS, required=True)
+    copy_parser.add_argument("--to", dest="target", choices=STORE_BACKENDS, required=True)
+    copy_parser.add_argument("--from-path", help="Collection, file or directory of the source store")
+    copy_parser.add_argument("--to-path", help="Collection, file or directory of the target store")
+    copy_parser.add_argument("--replace", action="store_true", help="Empty the target store first")
+    copy_parser.set_defaults(func=copy)
+
+    bench_parser = subparsers.add_parser("benchmark", help="Time loading and searching each store")
+    bench_parser.add_argument("--stores", choices=STORE_BACKENDS, nargs="+", default=list(STORE_BACKENDS))
+    bench_parser.add_argument("--queries", type=int, default=200, help="Number of queries")
+    bench_parser.add_argument("--top-k", type=int, default=10, help="Results per query")
+    bench_parser.add_argument("--seed", type=int, default=0)
+    bench_parser.set_defaults(func=benchmark)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
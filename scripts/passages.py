@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Split guide markdown into heading-delimited passages.
+
+Each passage records the byte range it covers in the source `index.md`, so
+search can return just the matching section and callers can fetch the exact
+slice from disk without loading the whole guide.
+"""
+
+import re
+from pathlib import Path
+from typing import List, Dict, Any
+
+MAX_PASSAGE_CHARS = 2000
+
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+
+
+def _frontmatter_end(lines: List[str]) -> int:
+    """Index of the first line after a leading `---` frontmatter block (0 if none)."""
+    if not lines or lines[0].strip() != "---":
+        return 0
+    for i in range(1, len(lines)):
+        if lines[i].strip() == "---":
+            return i + 1
+    return 0
+
+
+def _split_long(heading: str, lines: List[str], start: int, max_chars: int) -> List[Dict[str, Any]]:
+    """Split one section into passages of at most `max_chars` (or one line), at line boundaries."""
+    passages = []
+    chunk: List[str] = []
+    chunk_start = start
+    chunk_chars = 0
+    offset = start
+
+    for line in lines:
+        if chunk and chunk_chars + len(line) > max_chars:
+            passages.append(_passage(heading, chunk, chunk_start))
+            chunk, chunk_start, chunk_chars = [], offset, 0
+        chunk.append(line)
+        chunk_chars += len(line)
+        offset += len(line.encode("utf-8"))
+
+    if chunk:
+        passages.append(_passage(heading, chunk, chunk_start))
+    return passages
+
+
+def _passage(heading: str, lines: List[str], start: int) -> Dict[str, Any]:
+    text = "".join(lines)
+    return {
+        "heading": heading,
+        "start": start,
+        "end": start + len(text.encode("utf-8")),
+        "text": text.strip(),
+    }
+
+
+def split_into_passages(raw: str, max_chars: int = MAX_PASSAGE_CHARS) -> List[Dict[str, Any]]:
+    """
+    Split a guide into passages at markdown headings.
+
+    Frontmatter is skipped and headings inside fenced code blocks are ignored.
+    Sections longer than `max_chars` are split further at line boundaries, so
+    no part of the guide is dropped.
+
+    Args:
+        raw: Full text of the guide file, including frontmatter
+        max_chars: Upper bound on passage length (a single longer line is kept whole)
+
+    Returns:
+        Passages with "heading", "text" and the "start"/"end" byte offsets of
+        the passage in the UTF-8 encoded source file
+    """
+    lines = raw.splitlines(keepends=True)
+    body_start = _frontmatter_end(lines)
+    offset = sum(len(line.encode("utf-8")) for line in lines[:body_start])
+
+    sections = []
+    heading = ""
+    section_lines: List[str] = []
+    section_start = offset
+    in_fence = False
+
+    for line in lines[body_start:]:
+        if _FENCE_RE.match(line):
+            in_fence = not in_fence
+        match = None if in_fence else _HEADING_RE.match(line)
+        if match:
+            if section_lines:
+                sections.append((heading, section_lines, section_start))
+            heading = match.group(2)
+            section_lines = []
+            section_start = offset
+        section_lines.append(line)
+        offset += len(line.encode("utf-8"))
+
+    if section_lines:
+        sections.append((heading, section_lines, section_start))
+
+    passages = []
+    for heading, section_lines, start in sections:
+        for passage in _split_long(heading, section_lines, start, max_chars):
+            # Skip heading-only or blank sections
+            if passage["text"] and passage["text"].lstrip("#").strip() != heading:
+                passages.append(passage)
+    return passages
+
+
+def read_passage(guides_root: Path, file_path: str, start: int, end: int) -> str:
+    """Read the byte range [start, end) of a guide file as text."""
+    with open(Path(guides_root) / file_path, "rb") as f:
+        f.seek(start)
+        return f.read(end - start).decode("utf-8", errors="replace").strip()
+
+
+def read_guide_body(guides_root: Path, file_path: str) -> str:
+    """Read a guide file's markdown body, without its frontmatter."""
+    lines = (Path(guides_root) / file_path).read_bytes().decode("utf-8").splitlines(keepends=True)
+    return "".join(lines[_frontmatter_end(lines):]).strip()
+
+
+def split_guide_file(path: Path, max_chars: int = MAX_PASSAGE_CHARS) -> List[Dict[str, Any]]:
+    """Split a guide file, decoding its raw bytes so offsets match the file on disk."""
+    return split_into_passages(Path(path).read_bytes().decode("utf-8"), max_chars)
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Local query expansion mined from the guides corpus.
+
+A query is expanded without a model call, from two tables built at index time:
+
+- a term graph linking each word to the words it co-occurs with in the same
+  guide section, weighted by normalized pointwise mutual information (NPMI);
+- candidate phrases from guide titles, headings and bold lead-ins, with the
+  title and headings of each guide linked as near-synonyms.
+
+Expansion scores phrases by how strongly their words relate to the query and
+returns the best few, in the same shape as the Vertex expansion. It runs in
+well under a millisecond, so it serves as the fallback when Vertex is slow or
+unavailable, and `ExpansionAgreement` measures how often the two agree.
+"""
+
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from lexical_index import guide_files, tokenize
+from passages import read_guide_body, split_into_passages
+
+logger = logging.getLogger(__name__)
+
+EXPANSION_FILE = "expansion.json"
+EXPANSION_FORMAT_VERSION = 1
+
+SEMANTIC_INDEX_DIR = Path(os.getenv(
+    "SEMANTIC_INDEX_DIR",
+    str(Path(__file__).parent.parent / "guides" / "semantic_index")
+))
+
+MAX_VOCABULARY = 4000
+MIN_COOCCURRENCE = 2
+MAX_NEIGHBOURS = 15
+MAX_PHRASE_TOKENS = 4
+# Phrases found in more guides than this share are template headings
+MAX_PHRASE_GUIDE_SHARE = 0.05
+# Score given to a phrase linked to a title or heading the query matches
+SYNONYM_WEIGHT = 0.5
+COOCCURRENCE_BLOCK_ROWS = 512
+
+_TITLE_RE = re.compile(r"^title:\s*[\"']?(.*?)[\"']?\s*$", re.MULTILINE)
+_HEADING_RE = re.compile(r"^#{1,6}\s+(.*?)\s*#*\s*$", re.MULTILINE)
+_BOLD_RE = re.compile(r"\*\*([^*\n]{3,60})\*\*")
+_WORD_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9\-/]*")
+# Maturity suffixes of guide titles ("Onboarding Intro 1") carry no topic
+_MATURITY_WORDS = frozenset("intro introduction growth foundational".split())
+
+
+def _phrase(text: str) -> Optional[Tuple[str, Tuple[str, ...]]]:
+    """Clean a title/heading/bold span into (display text, tokens), or None if unusable."""
+    # Words with "/" are link paths ("pm/dashboard"), not search terms
+    words = [
+        w for w in _WORD_RE.findall(text)
+        if w.lower() not in _MATURITY_WORDS and not w.isdigit() and "/" not in w
+    ]
+    display = " ".join(words).lower().strip("-/ ")
+    tokens = tuple(tokenize(display))
+    if not 1 <= len(tokens) <= MAX_PHRASE_TOKENS or len(display) >= 50:
+        return None
+    return display, tokens
+
+
+class LocalExpander:
+    """
+    Corpus-mined expansion: NPMI term neighbours plus title/heading phrases.
+
+    `neighbours` maps a token to [(token, weight)], strongest first.
+    `phrases` holds (display text, tokens); `links` groups phrase ids that
+    name the same guide (its title and headings).
+    """
+
+    def __init__(
+        self,
+        neighbours: Dict[str, List[Tuple[str, float]]],
+        phrases: List[Tuple[str, Tuple[str, ...]]],
+        links: List[List[int]]
+    ):
+        self.neighbours = neighbours
+        self.phrases = phrases
+        self.links = links
+
+        self._phrases_by_token: Dict[str, List[int]] = defaultdict(list)
+        for phrase_id, (_, tokens) in enumerate(phrases):
+            for token in set(tokens):
+                self._phrases_by_token[token].append(phrase_id)
+        self._linked: Dict[int, List[int]] = defaultdict(list)
+        for group in links:
+            for phrase_id in group:
+                self._linked[phrase_id].extend(p for p in group if p != phrase_id)
+
+    def __len__(self) -> int:
+        return len(self.phrases)
+
+    @classmethod
+    def build(cls, documents: Iterable[Tuple[str, str]]) -> "LocalExpander":
+        """
+        Mine the tables from (title, markdown body) pairs.
+
+        Args:
+            documents: One (title, body) per guide
+
+        Returns:
+            The built LocalExpander
+        """
+        sections: List[Set[str]] = []
+        phrase_guides: Dict[str, Set[int]] = defaultdict(set)
+        phrase_tokens: Dict[str, Tuple[str, ...]] = {}
+        guide_phrases: List[List[str]] = []
+
+        guide_count = 0
+        for guide_id, (title, body) in enumerate(documents):
+            guide_count += 1
+            for passage in split_into_passages(body) or [{"text": body}]:
+                tokens = set(tokenize(passage["text"]))
+                if tokens:
+                    sections.append(tokens)
+
+            named = []
+            spans = [(title, True)] + [(h, True) for h in _HEADING_RE.findall(body)]
+            spans += [(b, False) for b in _BOLD_RE.findall(body)]
+            for text, names_guide in spans:
+                phrase = _phrase(text)
+                if phrase is None:
+                    continue
+                display, tokens = phrase
+                phrase_guides[display].add(guide_id)
+                phrase_tokens.setdefault(display, tokens)
+                if names_guide and display not in named:
+                    named.append(display)
+            guide_phrases.append(named)
+
+        max_guides = max(1, int(guide_count * MAX_PHRASE_GUIDE_SHARE))
+        kept = sorted(d for d, guides in phrase_guides.items() if len(guides) <= max_guides)
+        phrase_ids = {display: i for i, display in enumerate(kept)}
+        phrases = [(display, phrase_tokens[display]) for display in kept]
+        links = [
+            ids for ids in (
+                [phrase_ids[d] for d in named if d in phrase_ids] for named in guide_phrases
+            )
+            if len(ids) > 1
+        ]
+
+        expander = cls(_npmi_neighbours(sections), phrases, links)
+        logger.info(
+            f"Built local expansion over {guide_count} guides: {len(expander.neighbours)} terms, "
+            f"{len(phrases)} phrases"
+        )
+        return expander
+
+    @classmethod
+    def from_guides_dir(cls, guides_root: Path) -> "LocalExpander":
+        """Build from every guide's index.md under `guides_root`."""
+        guides_root = Path(guides_root)
+        documents = []
+        for path in guide_files(guides_root):
+            try:
+                file_path = str(path.relative_to(guides_root))
+                match = _TITLE_RE.search(path.read_text(encoding="utf-8"))
+                title = match.group(1) if match else path.parent.name.replace("-", " ")
+                documents.append((title, read_guide_body(guides_root, file_path)))
+            except Exception as e:
+                logger.warning(f"Error reading {path}: {e}")
+        return cls.build(documents)
+
+    def expand(self, query: str, max_terms: int = 4) -> List[str]:
+        """
+        Related search terms for `query`.
+
+        Args:
+            query: Free-text query
+            max_terms: Maximum number of additional terms to return
+
+        Returns:
+            List of search terms including the original query first
+        """
+        query_tokens = set(tokenize(query))
+        related: Dict[str, float] = {}
+        for token in query_tokens:
+            for neighbour, weight in self.neighbours.get(token, ()):
+                if neighbour not in query_tokens:
+                    related[neighbour] = related.get(neighbour, 0.0) + weight
+
+        candidates: Set[int] = set()
+        for token in query_tokens.union(related):
+            candidates.update(self._phrases_by_token.get(token, ()))
+
+        scores: Dict[int, float] = {}
+        for phrase_id in candidates:
+            tokens = self.phrases[phrase_id][1]
+            matched = sum(1 for t in tokens if t in query_tokens)
+            if matched == len(tokens):
+                # Nothing new for the search to find
+                continue
+            score = (matched + sum(related.get(t, 0.0) for t in tokens)) / math.sqrt(len(tokens))
+            scores[phrase_id] = scores.get(phrase_id, 0.0) + score
+            # A title or heading the query names lends weight to its guide's other names
+            if matched and matched * 2 >= len(tokens):
+                for linked in self._linked.get(phrase_id, ()):
+                    scores[linked] = scores.get(linked, 0.0) + SYNONYM_WEIGHT * matched / len(tokens)
+
+        terms = []
+        seen = {frozenset(query_tokens)}
+        for phrase_id in sorted(scores, key=lambda p: (-scores[p], p)):
+            display, tokens = self.phrases[phrase_id]
+            if frozenset(tokens) in seen or set(tokens) <= query_tokens:
+                continue
+            seen.add(frozenset(tokens))
+            terms.append(display)
+            if len(terms) == max_terms:
+                break
+
+        # Thin phrase evidence: fall back to the strongest single related words
+        for token, _ in sorted(related.items(), key=lambda item: -item[1]):
+            if len(terms) == max_terms:
+                break
+            if frozenset([token]) not in seen:
+                seen.add(frozenset([token]))
+                terms.append(token)
+
+        return [query] + terms
+
+    def save(self, index_dir: Path) -> None:
+        """Write the tables into `index_dir`, replacing any previous ones atomically."""
+        index_dir = Path(index_dir)
+        index_dir.mkdir(parents=True, exist_ok=True)
+        path = index_dir / EXPANSION_FILE
+        tmp = path.with_name(EXPANSION_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": EXPANSION_FORMAT_VERSION,
+                "neighbours": {t: [[n, round(w, 4)] for n, w in ns] for t, ns in self.neighbours.items()},
+                "phrases": [[display, list(tokens)] for display, tokens in self.phrases],
+                "links": self.links,
+            }, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, index_dir: Path) -> Optional["LocalExpander"]:
+        """Load the tables saved in `index_dir`, or None if there are none."""
+        path = Path(index_dir) / EXPANSION_FILE
+        if not path.is_file():
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != EXPANSION_FORMAT_VERSION:
+            raise ValueError(f"Unsupported expansion format {data.get('version')!r} in {path}")
+        return cls(
+            {t: [(n, w) for n, w in ns] for t, ns in data["neighbours"].items()},
+            [(display, tuple(tokens)) for display, tokens in data["phrases"]],
+            data["links"],
+        )
+
+
+def _npmi_neighbours(sections: List[Set[str]]) -> Dict[str, List[Tuple[str, float]]]:
+    """Top positive-NPMI co-occurring terms per term, counted over sections."""
+    if not sections:
+        return {}
+    doc_freq: Dict[str, int] = defaultdict(int)
+    for tokens in sections:
+        for token in tokens:
+            doc_freq[token] += 1
+    vocabulary = sorted(
+        (t for t, df in doc_freq.items() if df >= MIN_COOCCURRENCE and df < len(sections)),
+        key=lambda t: (-doc_freq[t], t)
+    )[:MAX_VOCABULARY]
+    if not vocabulary:
+        return {}
+    column = {t: i for i, t in enumerate(vocabulary)}
+
+    # Section x term incidence matrix; co-occurrence counts are its Gram matrix
+    incidence = np.zeros((len(sections), len(vocabulary)), dtype=np.float32)
+    for row, tokens in enumerate(sections):
+        incidence[row, [column[t] for t in tokens if t in column]] = 1.0
+
+    n = float(len(sections))
+    log_p = np.log(incidence.sum(axis=0) / n)
+    neighbours: Dict[str, List[Tuple[str, float]]] = {}
+    for start in range(0, len(vocabulary), COOCCURRENCE_BLOCK_ROWS):
+        counts = incidence[:, start:start + COOCCURRENCE_BLOCK_ROWS].T @ incidence
+        with np.errstate(divide="ignore", invalid="ignore"):
+            log_p_joint = np.log(counts / n)
+            npmi = (log_p_joint - log_p[start:start + len(counts), None] - log_p[None, :]) / -log_p_joint
+        npmi[(counts < MIN_COOCCURRENCE) | ~np.isfinite(npmi)] = 0.0
+        npmi[np.arange(len(counts)), np.arange(start, start + len(counts))] = 0.0
+
+        k = min(MAX_NEIGHBOURS, len(vocabulary) - 1)
+        if k <= 0:
+            break
+        top = np.argpartition(-npmi, k - 1, axis=1)[:, :k]
+        for row, columns in enumerate(top):
+            weights = npmi[row, columns]
+            order = np.argsort(-weights, kind="stable")
+            ranked = [(vocabulary[columns[i]], float(weights[i])) for i in order if weights[i] > 0]
+            if ranked:
+                neighbours[vocabulary[start + row]] = ranked
+    return neighbours
+
+
+_expander: Optional[LocalExpander] = None
+_expander_lock = threading.Lock()
+
+
+def get_local_expander(
+    index_dir: Path = SEMANTIC_INDEX_DIR,
+    guides_root: Optional[Path] = None
+) -> LocalExpander:
+    """
+    The shared LocalExpander: loaded from the index artifact written by
+    generate_embeddings.py, or built from the guide files if there is none.
+    """
+    global _expander
+    if _expander is not None:
+        return _expander
+    with _expander_lock:
+        if _expander is None:
+            expander = None
+            try:
+                expander = LocalExpander.load(index_dir)
+            except Exception as e:
+                logger.warning(f"Could not load local expansion from {index_dir}: {e}")
+            if expander is None:
+                expander = LocalExpander.from_guides_dir(guides_root or Path(__file__).parent.parent / "guides")
+            _expander = expander
+    return _expander
+
+
+class ExpansionAgreement:
+    """
+    Running agreement between remote (Vertex) and local expansions of the
+    same queries, to judge whether the remote call earns its latency.
+
+    Per query: the share of remote terms the local engine also produced
+    (after case/spacing normalization), and the Jaccard overlap of the two
+    term lists' words.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.comparisons = 0
+        self._term_recall = 0.0
+        self._token_jaccard = 0.0
+        self.local_calls = 0
+        self._local_seconds = 0.0
+
+    def timed_expand(self, expander: LocalExpander, query: str, max_terms: int = 4) -> List[str]:
+        """Run a local expansion, counting its latency."""
+        start = time.perf_counter()
+        terms = expander.expand(query, max_terms=max_terms)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.local_calls += 1
+            self._local_seconds += elapsed
+        return terms
+
+    def record(self, remote_terms: List[str], local_terms: List[str]) -> None:
+        """Compare two expansions of one query; both lists lead with the query itself."""
+        remote = {" ".join(t.lower().split()) for t in remote_terms[1:]}
+        local = {" ".join(t.lower().split()) for t in local_terms[1:]}
+        if not remote:
+            return
+        remote_tokens = set(tokenize(" ".join(remote)))
+        local_tokens = set(tokenize(" ".join(local)))
+        union = remote_tokens | local_tokens
+        with self._lock:
+            self.comparisons += 1
+            self._term_recall += len(remote & local) / len(remote)
+            self._token_jaccard += len(remote_tokens & local_tokens) / len(union) if union else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "comparisons": self.comparisons,
+                "mean_term_recall": round(self._term_recall / self.comparisons, 4) if self.comparisons else 0.0,
+                "mean_token_jaccard": round(self._token_jaccard / self.comparisons, 4) if self.comparisons else 0.0,
+                "local_calls": self.local_calls,
+                "local_mean_us": round(self._local_seconds * 1e6 / self.local_calls, 1) if self.local_calls else 0.0,
+            }
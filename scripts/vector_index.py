@@ -0,0 +1,791 @@
+#!/usr/bin/env python3
+"""
+Resident in-memory vector index for guide embeddings.
+
+Holds every guide vector in one contiguous, pre-normalized float32 matrix with
+parallel metadata arrays, so a query is scored with a single matrix-vector
+product instead of one cosine similarity call per document.
+
+An index can also carry an int8 copy of its vectors with one scale factor per
+row. Searches then scan the int8 matrix, a quarter of the size, and re-score
+only the best candidates against the full-precision vectors, which stay
+memory-mapped and are paged in just for those rows.
+"""
+
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Dict, Any, Iterable, Optional
+
+import numpy as np
+
+from ann_index import IVFIndex, IVF_FILE, DEFAULT_NPROBE
+
+logger = logging.getLogger(__name__)
+
+FOUNDATIONAL_MATURITY = "foundational-1"
+# Guides with no known maturity pass every maturity filter
+UNKNOWN_MATURITY = "Unknown"
+FOUNDATIONAL_BOOST = 1.1
+# Filter-mask cache key for a division or maturity value no guide has
+_UNMATCHED_FACET = "\0unmatched"
+PREVIEW_CHARS = 200
+
+# Passage scores are combined per guide by taking the best one ("max") or by
+# summing the best SUM_AGGREGATE_PASSAGES ("sum"), so long guides with many
+# weak sections don't outrank a guide with one strong match
+AGGREGATE_MODES = ("max", "sum")
+SUM_AGGREGATE_PASSAGES = 3
+
+# On-disk artifact layout; bump the format version on incompatible changes
+INDEX_FORMAT_VERSION = 1
+VECTORS_FILE = "vectors.npy"
+CODES_FILE = "vectors_int8.npy"
+SCALES_FILE = "scales.npy"
+RELATED_FILE = "related.npz"
+METADATA_FILE = "metadata.json"
+
+# Precomputed nearest guides per guide, built in blocks of RELATED_BLOCK_ROWS
+# rows so the N x N similarity matrix is never held in memory at once
+RELATED_TOP_N = 10
+RELATED_BLOCK_ROWS = 1024
+
+# With int8 vectors, each query re-scores max(RESCORE_MIN, top_k * RESCORE_FACTOR)
+# candidate rows at full precision
+RESCORE_FACTOR = 4
+RESCORE_MIN = 64
+SCAN_CHUNK_ROWS = 512
+
+# Pseudo-relevance feedback: a query is moved towards the mean of its
+# PRF_FEEDBACK_ROWS best rows, as PRF_ALPHA * query + PRF_BETA * mean (Rocchio)
+PRF_FEEDBACK_ROWS = 5
+PRF_ALPHA = 1.0
+PRF_BETA = 0.75
+
+# Below ANN_MIN_ROWS an exact scan is fast enough and the IVF structure is
+# ignored even if one was built; ANN_NPROBE is how many lists a query visits
+ANN_MIN_ROWS = int(os.getenv("ANN_MIN_ROWS", "20000"))
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", str(DEFAULT_NPROBE)))
+
+
+def normalize_maturity(maturity: Optional[str]) -> str:
+    """A guide's maturity, with a missing one or any casing of "unknown" as UNKNOWN_MATURITY."""
+    if not maturity or maturity.casefold() == UNKNOWN_MATURITY.casefold():
+        return UNKNOWN_MATURITY
+    return maturity
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Return a float32 copy of `vectors` with every row scaled to unit length."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if vectors.size == 0:
+        return vectors
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    # Zero vectors stay zero so they score 0.0, matching cosine_similarity
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def quantize_rows(vectors: np.ndarray):
+    """
+    Symmetric per-row int8 quantization.
+
+    Returns:
+        (codes, scales) with `vectors[i] ~= codes[i] * scales[i]`
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0 if len(vectors) else np.zeros(0, dtype=np.float32)
+    scales = scales.astype(np.float32)
+    safe = np.where(scales == 0, 1.0, scales)[:, None]
+    codes = np.clip(np.rint(vectors / safe), -127, 127).astype(np.int8)
+    return codes, scales
+
+
+def _write_npy(path: Path, array: np.ndarray) -> None:
+    """Write `array` to `path` via a temporary file and an atomic rename."""
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+
+class VectorIndex:
+    """
+    Immutable matrix of guide vectors plus per-row metadata.
+
+    Row `i` of `vectors` belongs to `titles[i]`, `divisions[i]`, `file_paths[i]`,
+    `maturities[i]` and `previews[i]`. In a passage index each row is one
+    section of a guide and `sections[i]` holds its heading and byte range in
+    the guide file; in a whole-guide index `sections[i]` is None.
+
+    `codes` and `scales` are the optional int8 copy of `vectors`, and
+    `related_rows`/`related_scores` the optional nearest-guide table.
+    """
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        records: List[Dict[str, Any]],
+        normalized: bool = False
+    ):
+        if len(vectors) != len(records):
+            raise ValueError(
+                f"Vector count ({len(vectors)}) does not match record count ({len(records)})"
+            )
+
+        # Pre-normalized vectors (e.g. a memory-mapped artifact) are used as-is
+        self.vectors = vectors if normalized else normalize_rows(vectors)
+        self.titles = [r.get("title") for r in records]
+        self.divisions = np.array([r.get("division") or "" for r in records], dtype=object)
+        self.file_paths = [r.get("file_path") for r in records]
+        self.maturities = np.array([normalize_maturity(r.get("maturity")) for r in records], dtype=object)
+        self.previews = [
+            (r.get("content_preview") or r.get("content") or "")[:PREVIEW_CHARS]
+            for r in records
+        ]
+        self.sections = [r.get("section") for r in records]
+        # Integer id of the guide each row belongs to, for per-guide aggregation
+        _, self._guide_groups = np.unique(
+            np.array([p or "" for p in self.file_paths], dtype=object), return_inverse=True
+        )
+        # Facet masks per division and maturity level, so filtering is a boolean
+        # AND and the foundational boost is one multiply by a weight vector.
+        # Guides spell divisions as both "SE" and "se", so divisions match
+        # case-insensitively.
+        folded_divisions = np.array([d.casefold() for d in self.divisions.tolist()], dtype=object)
+        self._division_masks = {v: folded_divisions == v for v in set(folded_divisions.tolist())}
+        self._maturity_masks = {v: self.maturities == v for v in set(self.maturities.tolist())}
+        self._no_rows = np.zeros(len(records), dtype=bool)
+        self._boost_weights = np.where(
+            self._maturity_masks.get(FOUNDATIONAL_MATURITY, self._no_rows), FOUNDATIONAL_BOOST, 1.0
+        ).astype(np.float32)
+        self._filter_masks: Dict[tuple, np.ndarray] = {}
+        self.model = ""
+        self.created_at = None
+        self.ivf: Optional[IVFIndex] = None
+        self.ann_min_rows = ANN_MIN_ROWS
+        self.codes: Optional[np.ndarray] = None
+        self.scales: Optional[np.ndarray] = None
+        self.related_rows: Optional[np.ndarray] = None
+        self.related_scores: Optional[np.ndarray] = None
+        self._row_by_path: Dict[str, int] = {}
+        for row, path in enumerate(self.file_paths):
+            self._row_by_path.setdefault(path, row)
+
+    def __len__(self) -> int:
+        return len(self.file_paths)
+
+    @property
+    def dimension(self) -> int:
+        return self.vectors.shape[1] if self.vectors.ndim == 2 and len(self) else 0
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Dict[str, Any]]) -> "VectorIndex":
+        """
+        Build an index from Firestore-style document dicts.
+
+        Documents without an embedding, or whose embedding dimension differs
+        from the first one seen, are skipped.
+
+        Args:
+            documents: Dicts with an "embedding" list or array and guide metadata fields
+
+        Returns:
+            A populated VectorIndex
+        """
+        rows = []
+        records = []
+        dimension = None
+
+        for data in documents:
+            embedding = data.get("embedding")
+            if embedding is None or len(embedding) == 0:
+                continue
+            if dimension is None:
+                dimension = len(embedding)
+            elif len(embedding) != dimension:
+                logger.warning(
+                    f"Skipping {data.get('file_path')}: embedding has {len(embedding)} "
+                    f"dimensions, expected {dimension}"
+                )
+                continue
+            rows.append(embedding)
+            records.append(data)
+
+        vectors = np.array(rows, dtype=np.float32).reshape(len(rows), dimension or 0)
+        return cls(vectors, records)
+
+    def build_ann(self, n_lists: Optional[int] = None) -> IVFIndex:
+        """Cluster the rows into an IVF structure for approximate search."""
+        self.ivf = IVFIndex.build(self.vectors, n_lists=n_lists)
+        return self.ivf
+
+    def quantize(self) -> None:
+        """Build the int8 copy of the vectors used for the first-pass scan."""
+        self.codes, self.scales = quantize_rows(self.vectors)
+
+    def _nearest_guides(self, rows: slice, top_n: int):
+        """Top `top_n` rows of other guides for each row in `rows`, best first."""
+        sims = np.asarray(self.vectors[rows], dtype=np.float32) @ self.vectors.T
+        # A guide is never related to itself
+        sims[self._guide_groups[rows][:, None] == self._guide_groups[None, :]] = -np.inf
+        top = np.argpartition(-sims, top_n - 1, axis=1)[:, :top_n]
+        top_scores = np.take_along_axis(sims, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+    def build_related(self, top_n: int = RELATED_TOP_N) -> None:
+        """
+        Precompute the `top_n` most similar other guides for every row.
+
+        Meant for a whole-guide index, where each row is one guide.
+        """
+        top_n = min(top_n, len(self) - 1)
+        if top_n <= 0:
+            self.related_rows = self.related_scores = None
+            return
+        self.related_rows = np.empty((len(self), top_n), dtype=np.int32)
+        self.related_scores = np.empty((len(self), top_n), dtype=np.float32)
+        for start in range(0, len(self), RELATED_BLOCK_ROWS):
+            block = slice(start, min(start + RELATED_BLOCK_ROWS, len(self)))
+            self.related_rows[block], self.related_scores[block] = self._nearest_guides(block, top_n)
+
+    def related(self, file_path: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Guides most similar to the one at `file_path`.
+
+        Answered from the precomputed table when it has enough neighbours,
+        otherwise with one scan of the stored vectors; never needs an embedding.
+
+        Raises:
+            KeyError: If no guide with that path is indexed
+        """
+        row = self._row_by_path.get(file_path)
+        if row is None:
+            raise KeyError(f"No indexed guide at {file_path}")
+        if top_k <= 0 or len(self) < 2:
+            return []
+
+        if self.related_rows is not None and top_k <= self.related_rows.shape[1]:
+            rows, scores = self.related_rows[row, :top_k], self.related_scores[row, :top_k]
+        else:
+            rows, scores = self._nearest_guides(slice(row, row + 1), min(top_k, len(self) - 1))
+            rows, scores = rows[0], scores[0]
+        return [
+            self._result(int(r), float(score))
+            for r, score in zip(rows, scores) if np.isfinite(score)
+        ]
+
+    @property
+    def is_quantized(self) -> bool:
+        return self.codes is not None
+
+    @property
+    def uses_ann(self) -> bool:
+        """Whether searches go through the IVF structure rather than an exact scan."""
+        return self.ivf is not None and len(self) >= self.ann_min_rows
+
+    def save(self, index_dir: Path, model: str = "") -> Dict[str, Any]:
+        """
+        Write the index as a raw `.npy` vector block plus a JSON metadata sidecar.
+
+        Files are written under temporary names and renamed into place, with the
+        metadata last, so a reader never sees a half-written artifact.
+
+        Args:
+            index_dir: Directory to write the artifact into
+            model: Name of the embedding model the vectors came from
+
+        Returns:
+            The metadata header that was written (without the columns)
+        """
+        index_dir = Path(index_dir)
+        index_dir.mkdir(parents=True, exist_ok=True)
+
+        header = {
+            "format_version": INDEX_FORMAT_VERSION,
+            "model": model,
+            "count": len(self),
+            "dimension": self.dimension,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "ann_lists": self.ivf.n_lists if self.ivf is not None else 0,
+            "quantization": "int8" if self.is_quantized else None,
+            "related_top_n": self.related_rows.shape[1] if self.related_rows is not None else 0,
+        }
+        metadata = dict(header)
+        metadata["columns"] = {
+            "title": self.titles,
+            "division": self.divisions.tolist(),
+            "file_path": self.file_paths,
+            "maturity": self.maturities.tolist(),
+            "content_preview": self.previews,
+            "section": self.sections,
+        }
+
+        _write_npy(index_dir / VECTORS_FILE, np.ascontiguousarray(self.vectors, dtype=np.float32))
+
+        if self.is_quantized:
+            _write_npy(index_dir / CODES_FILE, np.ascontiguousarray(self.codes))
+            _write_npy(index_dir / SCALES_FILE, np.ascontiguousarray(self.scales))
+        if self.ivf is not None:
+            self.ivf.save(index_dir)
+        if self.related_rows is not None:
+            related_tmp = index_dir / (RELATED_FILE + ".tmp")
+            with open(related_tmp, "wb") as f:
+                np.savez(f, rows=self.related_rows, scores=self.related_scores)
+            os.replace(related_tmp, index_dir / RELATED_FILE)
+
+        # Don't leave stale optional files next to vectors they weren't built from
+        stale = [] if self.is_quantized else [CODES_FILE, SCALES_FILE]
+        if self.ivf is None:
+            stale.append(IVF_FILE)
+        if self.related_rows is None:
+            stale.append(RELATED_FILE)
+        for name in stale:
+            if (index_dir / name).exists():
+                (index_dir / name).unlink()
+
+        metadata_tmp = index_dir / (METADATA_FILE + ".tmp")
+        with open(metadata_tmp, "w", encoding="utf-8") as f:
+            json.dump(metadata, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(metadata_tmp, index_dir / METADATA_FILE)
+
+        logger.info(f"Wrote {len(self)} vectors to {index_dir}")
+        return header
+
+    @classmethod
+    def load(cls, index_dir: Path, mmap: bool = True) -> "VectorIndex":
+        """
+        Load an index artifact written by `save`.
+
+        With `mmap` the vector block is memory-mapped read-only, so startup does
+        not copy it and all processes on the host share it via the page cache.
+
+        Args:
+            index_dir: Directory containing the artifact
+            mmap: Whether to memory-map the vectors instead of reading them
+
+        Returns:
+            The loaded VectorIndex
+        """
+        index_dir = Path(index_dir)
+        with open(index_dir / METADATA_FILE, "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+
+        version = metadata.get("format_version")
+        if version != INDEX_FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported index format version {version} in {index_dir} "
+                f"(expected {INDEX_FORMAT_VERSION})"
+            )
+
+        vectors = np.load(index_dir / VECTORS_FILE, mmap_mode="r" if mmap else None)
+        columns = metadata["columns"]
+        records = [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+        index = cls(vectors, records, normalized=True)
+        index.model = metadata.get("model", "")
+        index.created_at = metadata.get("created_at")
+        if metadata.get("quantization") == "int8":
+            index.codes = np.load(index_dir / CODES_FILE, mmap_mode="r" if mmap else None)
+            index.scales = np.load(index_dir / SCALES_FILE)
+            if len(index.codes) != len(index) or len(index.scales) != len(index):
+                logger.warning(f"Ignoring int8 vectors in {index_dir}: they do not match the vectors")
+                index.codes = index.scales = None
+        if metadata.get("related_top_n"):
+            with np.load(index_dir / RELATED_FILE) as related:
+                if len(related["rows"]) == len(index):
+                    index.related_rows, index.related_scores = related["rows"], related["scores"]
+                else:
+                    logger.warning(f"Ignoring related-guide table in {index_dir}: it does not match the vectors")
+        if metadata.get("ann_lists"):
+            ivf = IVFIndex.load(index_dir)
+            if ivf is not None and len(ivf) == len(index):
+                index.ivf = ivf
+            else:
+                logger.warning(f"Ignoring IVF structure in {index_dir}: it does not match the vectors")
+        return index
+
+    @property
+    def is_passage_index(self) -> bool:
+        return any(section is not None for section in self.sections)
+
+    @staticmethod
+    def exists(index_dir: Path) -> bool:
+        """Whether `index_dir` holds a complete index artifact."""
+        index_dir = Path(index_dir)
+        return (index_dir / METADATA_FILE).is_file() and (index_dir / VECTORS_FILE).is_file()
+
+    def _dot(self, rows, queries: np.ndarray) -> np.ndarray:
+        """First-pass scores of `rows` (a slice or index array) against unit queries, as rows x Q."""
+        if not self.is_quantized:
+            return self.vectors[rows] @ queries.T
+        return (self.codes[rows].astype(np.float32) @ queries.T) * self.scales[rows][:, None]
+
+    def _score(
+        self,
+        queries: np.ndarray,
+        nprobe: Optional[int] = None,
+        exact: bool = False
+    ) -> np.ndarray:
+        """
+        Cosine similarity of each unit query against every row, as a Q x N array.
+
+        When the IVF structure is in use, only rows in each query's `nprobe`
+        closest lists are scored and every other row is -inf. With int8
+        vectors the scores are approximate; `exact` forces a full-precision
+        scan of every row.
+        """
+        if exact or (not self.uses_ann and not self.is_quantized):
+            return queries @ self.vectors.T
+
+        if not self.uses_ann:
+            # Small chunks keep each int8 -> float32 conversion in cache and
+            # never copy the whole matrix
+            scores = np.empty((len(queries), len(self)), dtype=np.float32)
+            for start in range(0, len(self), SCAN_CHUNK_ROWS):
+                chunk = slice(start, min(start + SCAN_CHUNK_ROWS, len(self)))
+                scores[:, chunk] = self._dot(chunk, queries).T
+            return scores
+
+        scores = np.full((len(queries), len(self)), -np.inf, dtype=np.float32)
+        for i, query in enumerate(queries):
+            rows = np.sort(self.ivf.candidates(query, nprobe or ANN_NPROBE))
+            scores[i, rows] = self._dot(rows, query[None, :])[:, 0]
+        return scores
+
+    def _boost(self, scores: np.ndarray, include_foundational: bool) -> np.ndarray:
+        """Boost foundational rows by FOUNDATIONAL_BOOST, capped at 1.0."""
+        if not include_foundational:
+            return scores
+        return np.minimum(1.0, scores * self._boost_weights)
+
+    def _rescore(
+        self,
+        queries: np.ndarray,
+        scores: np.ndarray,
+        candidates: int,
+        include_foundational: bool,
+        whole_guides: bool = False
+    ) -> np.ndarray:
+        """
+        Replace approximate scores with full-precision ones for each query's
+        best `candidates` rows; every other row becomes -inf. With
+        `whole_guides`, every eligible row of a candidate's guide is re-scored
+        too, so per-guide aggregation sees all of that guide's passages.
+        """
+        candidates = min(candidates, scores.shape[1])
+        rescored = np.full_like(scores, -np.inf)
+        top = np.argpartition(-scores, candidates - 1, axis=1)[:, :candidates]
+        for i, rows in enumerate(top):
+            eligible = np.isfinite(scores[i])
+            if whole_guides:
+                guides = np.isin(self._guide_groups, self._guide_groups[rows[eligible[rows]]])
+                rows = np.flatnonzero(guides & eligible)
+            else:
+                rows = np.sort(rows[eligible[rows]])
+            if len(rows):
+                rescored[i, rows] = self.vectors[rows] @ queries[i]
+        return self._boost(rescored, include_foundational)
+
+    def _masked_scores(
+        self,
+        query_embeddings: List[List[float]],
+        division_filter: Optional[str],
+        maturity_filter: Optional[str],
+        include_foundational: bool,
+        nprobe: Optional[int],
+        exact: bool,
+        candidates: int,
+        whole_guides: bool = False
+    ):
+        """
+        Boosted scores with filtered-out rows at -inf, plus the filter mask.
+
+        With int8 vectors, `candidates` rows per query are re-scored at full precision.
+        """
+        queries = normalize_rows(np.asarray(query_embeddings, dtype=np.float32))
+        mask = self._filter_mask(division_filter, maturity_filter, include_foundational)
+
+        scores = self._boost(self._score(queries, nprobe=nprobe, exact=exact), include_foundational)
+        scores = np.where(mask, scores, -np.inf)
+        if self.is_quantized and not exact:
+            scores = self._rescore(queries, scores, candidates, include_foundational, whole_guides)
+        return scores, mask
+
+    def _filter_mask(
+        self,
+        division_filter: Optional[str],
+        maturity_filter: Optional[str],
+        include_foundational: bool
+    ) -> np.ndarray:
+        """
+        Read-only boolean mask of rows that pass the division and maturity filters.
+
+        Masks are combined from the precomputed facets once per distinct
+        filter combination and then reused. Values no guide has share one
+        cache key, so arbitrary filter strings cannot grow the cache.
+        """
+        division = division_filter.casefold() if division_filter else None
+        if division is not None and division not in self._division_masks:
+            division = _UNMATCHED_FACET
+        maturity = maturity_filter or None
+        if maturity is not None and maturity not in self._maturity_masks:
+            maturity = _UNMATCHED_FACET
+        key = (division, maturity, bool(include_foundational) if maturity else None)
+        mask = self._filter_masks.get(key)
+        if mask is not None:
+            return mask
+
+        mask = np.ones(len(self), dtype=bool)
+        if division is not None:
+            mask &= self._division_masks.get(division, self._no_rows)
+
+        # Guides with an unknown maturity are never filtered out; foundational
+        # guides pass any maturity filter when include_foundational is set
+        if maturity is not None:
+            allowed = self._maturity_masks.get(maturity, self._no_rows).copy()
+            allowed |= self._maturity_masks.get(UNKNOWN_MATURITY, self._no_rows)
+            if include_foundational:
+                allowed |= self._maturity_masks.get(FOUNDATIONAL_MATURITY, self._no_rows)
+            mask &= allowed
+
+        mask.flags.writeable = False
+        self._filter_masks[key] = mask
+        return mask
+
+    def feedback_queries(
+        self,
+        query_embeddings: List[List[float]],
+        division_filter: str = None,
+        maturity_filter: str = None,
+        include_foundational: bool = True,
+        feedback_rows: int = PRF_FEEDBACK_ROWS,
+        alpha: float = PRF_ALPHA,
+        beta: float = PRF_BETA,
+        nprobe: Optional[int] = None,
+        exact: bool = False
+    ) -> np.ndarray:
+        """
+        Refine queries by pseudo-relevance feedback (Rocchio, positive only).
+
+        Each query is scored once with the given filters, and moved towards
+        the mean full-precision vector of its best `feedback_rows` rows.
+        Searching with the result costs one more scoring pass and no extra
+        embedding calls.
+
+        Args:
+            query_embeddings: One vector per query
+            division_filter: Optional division to filter by
+            maturity_filter: Optional maturity level to filter by
+            include_foundational: Whether to always include and boost foundational guides
+            feedback_rows: Number of top rows taken as relevant
+            alpha: Weight of the original query
+            beta: Weight of the feedback centroid
+            nprobe: IVF lists to visit when approximate search is active
+            exact: Force an exact full-precision scan of every row
+
+        Returns:
+            Q x D unit-normalized refined query vectors
+        """
+        queries = normalize_rows(np.asarray(query_embeddings, dtype=np.float32))
+        if len(self) == 0 or feedback_rows <= 0 or len(queries) == 0:
+            return queries
+
+        scores, _ = self._masked_scores(
+            queries, division_filter, maturity_filter, include_foundational,
+            nprobe, exact, candidates=max(RESCORE_MIN, feedback_rows * RESCORE_FACTOR)
+        )
+        k = min(feedback_rows, len(self))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+        refined = queries.copy()
+        for i, rows in enumerate(top):
+            rows = np.sort(rows[np.isfinite(scores[i, rows])])
+            if len(rows):
+                centroid = np.asarray(self.vectors[rows], dtype=np.float32).mean(axis=0)
+                refined[i] = alpha * queries[i] + beta * centroid
+        return normalize_rows(refined)
+
+    def search(
+        self,
+        query_embedding: List[float],
+        top_k: int = 5,
+        division_filter: str = None,
+        maturity_filter: str = None,
+        include_foundational: bool = True,
+        nprobe: Optional[int] = None,
+        exact: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Score a query against every guide and return the top matches.
+
+        Args:
+            query_embedding: Query vector (need not be normalized)
+            top_k: Number of results to return
+            division_filter: Optional division to filter by
+            maturity_filter: Optional maturity level to filter by
+            include_foundational: Whether to always include and boost foundational guides
+            nprobe: IVF lists to visit when approximate search is active
+            exact: Force an exact full-precision scan of every row
+
+        Returns:
+            List of matching guides with scores, best first
+        """
+        return self.search_many(
+            [query_embedding],
+            top_k=top_k,
+            division_filter=division_filter,
+            maturity_filter=maturity_filter,
+            include_foundational=include_foundational,
+            nprobe=nprobe,
+            exact=exact
+        )[0]
+
+    def search_many(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 5,
+        division_filter: str = None,
+        maturity_filter: str = None,
+        include_foundational: bool = True,
+        nprobe: Optional[int] = None,
+        exact: bool = False
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Score several queries in one Q x N matrix product.
+
+        Args:
+            query_embeddings: One vector per query
+            top_k: Number of results to return per query
+            division_filter: Optional division to filter by
+            maturity_filter: Optional maturity level to filter by
+            include_foundational: Whether to always include and boost foundational guides
+            nprobe: IVF lists to visit when approximate search is active
+            exact: Force an exact full-precision scan of every row
+
+        Returns:
+            One result list per query, in input order, each best first
+        """
+        if len(self) == 0 or top_k <= 0 or len(query_embeddings) == 0:
+            return [[] for _ in query_embeddings]
+
+        scores, mask = self._masked_scores(
+            query_embeddings, division_filter, maturity_filter, include_foundational,
+            nprobe, exact, candidates=max(RESCORE_MIN, top_k * RESCORE_FACTOR)
+        )
+
+        k = min(top_k, int(mask.sum()))
+        if k == 0:
+            return [[] for _ in query_embeddings]
+
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+
+        # Rows outside the probed IVF lists or re-scored candidates are -inf and never returned
+        return [
+            [self._result(i, float(row_scores[i])) for i in row_top if np.isfinite(row_scores[i])]
+            for row_top, row_scores in zip(top, scores)
+        ]
+
+    def search_grouped(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 5,
+        division_filter: str = None,
+        maturity_filter: str = None,
+        include_foundational: bool = True,
+        aggregate: str = "max",
+        nprobe: Optional[int] = None,
+        exact: bool = False
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Score passages and aggregate them into one result per guide.
+
+        Each result carries the guide's best-scoring passage as "section".
+
+        Args:
+            query_embeddings: One vector per query
+            top_k: Number of guides to return per query
+            division_filter: Optional division to filter by
+            maturity_filter: Optional maturity level to filter by
+            include_foundational: Whether to always include and boost foundational guides
+            aggregate: How to combine passage scores per guide ("max" or "sum")
+            nprobe: IVF lists to visit when approximate search is active
+            exact: Force an exact full-precision scan of every row
+
+        Returns:
+            One result list per query, in input order, each best first
+        """
+        if aggregate not in AGGREGATE_MODES:
+            raise ValueError(f"Unknown aggregate mode {aggregate!r}, expected one of {AGGREGATE_MODES}")
+        if len(self) == 0 or top_k <= 0 or len(query_embeddings) == 0:
+            return [[] for _ in query_embeddings]
+
+        scores, mask = self._masked_scores(
+            query_embeddings, division_filter, maturity_filter, include_foundational,
+            nprobe, exact, candidates=max(RESCORE_MIN, top_k * SUM_AGGREGATE_PASSAGES * RESCORE_FACTOR),
+            whole_guides=True
+        )
+
+        groups = self._guide_groups
+        group_count = int(groups.max()) + 1
+        allowed_rows = np.flatnonzero(mask)
+        if len(allowed_rows) == 0:
+            return [[] for _ in query_embeddings]
+
+        all_results = []
+        for row_scores in scores:
+            # Drop rows outside the probed IVF lists or re-scored candidates
+            rows = allowed_rows[np.isfinite(row_scores[allowed_rows])]
+            if len(rows) == 0:
+                all_results.append([])
+                continue
+            candidate_scores = row_scores[rows]
+            candidate_groups = groups[rows]
+
+            # Order candidates by guide, then best passage first
+            order = np.lexsort((-candidate_scores, candidate_groups))
+            ordered_groups = candidate_groups[order]
+            first = np.ones(len(order), dtype=bool)
+            first[1:] = ordered_groups[1:] != ordered_groups[:-1]
+            best_rows = rows[order[first]]
+
+            guide_scores = np.full(group_count, -np.inf, dtype=np.float32)
+            if aggregate == "max":
+                guide_scores[groups[best_rows]] = row_scores[best_rows]
+            else:
+                starts = np.flatnonzero(first)
+                rank = np.arange(len(order)) - np.repeat(starts, np.diff(np.append(starts, len(order))))
+                keep = order[rank < SUM_AGGREGATE_PASSAGES]
+                guide_scores[np.unique(candidate_groups[keep])] = 0.0
+                np.add.at(guide_scores, candidate_groups[keep], candidate_scores[keep])
+
+            k = min(top_k, len(best_rows))
+            top_groups = np.argpartition(-guide_scores, k - 1)[:k]
+            top_groups = top_groups[np.argsort(-guide_scores[top_groups], kind="stable")]
+
+            best_row_by_group = dict(zip(groups[best_rows].tolist(), best_rows.tolist()))
+            all_results.append([
+                self._result(best_row_by_group[g], float(guide_scores[g]))
+                for g in top_groups.tolist()
+            ])
+        return all_results
+
+    def _result(self, row: int, score: float) -> Dict[str, Any]:
+        """Format a single row as a search result."""
+        result = {
+            "title": self.titles[row],
+            "division": self.divisions[row],
+            "file_path": self.file_paths[row],
+            "maturity": self.maturities[row],
+            "score": score,
+            "content_preview": self.previews[row] + "..."
+        }
+        if self.sections[row] is not None:
+            result["section"] = dict(self.sections[row])
+        return result
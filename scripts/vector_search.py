@@ -1,50 +1,217 @@
 #!/usr/bin/env python3
 """
 Vector search implementation using Vertex AI embeddings and Firestore.
+
+Set EMBEDDING_BACKEND=local to embed queries with the offline hashed TF-IDF
+backend and search the local index artifact, with no Google dependencies.
 """
 
 import os
+import json
 import logging
-from typing import List, Dict, Any
+import threading
+import time
+from datetime import datetime
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import List, Dict, Any, Optional, Tuple
 from pathlib import Path
 import numpy as np
 
-from google.cloud import firestore
-from google.cloud import aiplatform
-from vertexai.language_models import TextEmbeddingModel
+from caching import SingleFlight, TTLCache
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from deadlines import Deadline, PoolExhaustedError, RemoteCallPool
+from embedding_backends import LOCAL_BACKEND, VERTEX_BACKEND, EmbeddingBackend, get_backend
+from passages import read_passage
+from vector_index import METADATA_FILE, VectorIndex
+from vector_store import FIRESTORE_STORE, MMAP_STORE, get_vector_store, guide_document_id
 
 logger = logging.getLogger(__name__)
 
-# Initialize Vertex AI
-PROJECT_ID = os.getenv("GCP_PROJECT_ID", "requirements-mcp-server")
-LOCATION = os.getenv("GCP_LOCATION", "us-central1")
+# On-disk index artifact written by generate_embeddings.py
+SEMANTIC_INDEX_DIR = Path(os.getenv(
+    "SEMANTIC_INDEX_DIR",
+    str(Path(__file__).parent.parent / "guides" / "semantic_index")
+))
+PASSAGE_INDEX_DIR = SEMANTIC_INDEX_DIR / "passages"
+LOCAL_INDEX_DIR = SEMANTIC_INDEX_DIR / "local"
+GUIDES_ROOT = Path(__file__).parent.parent / "guides"
+
+# Embedding backend for queries; "local" also searches the local index artifact
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", VERTEX_BACKEND)
+_backends: Dict[str, EmbeddingBackend] = {}
+_backends_lock = threading.Lock()
+
+# Query embedding cache; set EMBEDDING_CACHE_PATH to persist it across restarts
+_embedding_cache = TTLCache(
+    max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "2048")),
+    ttl_seconds=float(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", "86400")),
+    persist_path=os.getenv("EMBEDDING_CACHE_PATH") or None,
+    name="embeddings"
+)
+# Concurrent misses for the same texts share one backend request
+_embedding_flights = SingleFlight("embeddings")
+# Remote embedding calls fail fast while Vertex is failing, so searches go
+# straight to the local index instead of waiting out each error
+_embedding_breaker = CircuitBreaker("vertex-embeddings")
+# Under a request deadline, remote embedding runs on this pool and is waited
+# on for EMBEDDING_DEADLINE_SHARE of the time left; the rest is kept for
+# searching the local index instead. Late embeddings are still cached; while
+# late calls hold every worker, searches go to the local index at once.
+EMBEDDING_DEADLINE_SHARE = float(os.getenv("EMBEDDING_DEADLINE_SHARE", "0.8"))
+_embedding_pool = RemoteCallPool("embedding", int(os.getenv("EMBEDDING_WORKERS", "4")))
+
+# How often searches check the index artifacts for a newer build; <= 0 disables
+INDEX_RELOAD_CHECK_SECONDS = float(os.getenv("INDEX_RELOAD_CHECK_SECONDS", "60"))
+
+# Current index snapshot, shared by all request threads. Readers take the
+# reference without locking; reloads build a new snapshot off the request
+# path and swap the reference in one assignment.
+_snapshot: Optional["IndexSnapshot"] = None
+_snapshot_lock = threading.Lock()
+_reload_running = False
+_reload_pending = False
+_checked_at = 0.0
 
-try:
-    aiplatform.init(project=PROJECT_ID, location=LOCATION)
-except Exception as e:
-    logger.warning(f"Could not initialize Vertex AI: {e}")
 
-# Firestore collection name
-GUIDES_COLLECTION = "guides_embeddings"
+def _embedding_cache_key(text: str, model_name: str) -> str:
+    """Cache key for a query: model name plus case- and whitespace-normalized text."""
+    return f"{model_name}:{' '.join(text.lower().split())}"
 
 
-def get_embedding(text: str) -> List[float]:
+def get_embedding_backend(name: Optional[str] = None) -> EmbeddingBackend:
+    """Return the shared embedding backend called `name` (default: EMBEDDING_BACKEND)."""
+    name = name or EMBEDDING_BACKEND
+    backend = _backends.get(name)
+    if backend is not None:
+        return backend
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = get_backend(name, index_dir=LOCAL_INDEX_DIR)
+        return _backends[name]
+
+
+def get_embedding(text: str, use_cache: bool = True, backend: Optional[str] = None) -> List[float]:
     """
-    Generate embeddings using Vertex AI text-embedding-004 model.
+    Generate embeddings using the configured backend (Vertex AI text-embedding-004 by default).
     
     Args:
         text: The text to generate embeddings for
+        use_cache: Whether to serve and store the result in the query embedding cache
+        backend: Embedding backend name, "vertex" or "local" (default: EMBEDDING_BACKEND)
         
     Returns:
         List of floats representing the embedding vector
     """
-    try:
-        model = TextEmbeddingModel.from_pretrained("text-embedding-004")
-        embeddings = model.get_embeddings([text])
-        return embeddings[0].values
-    except Exception as e:
-        logger.error(f"Error generating embedding: {e}")
-        raise
+    return get_embeddings([text], use_cache=use_cache, backend=backend)[0]
+
+
+def get_embeddings(
+    texts: List[str],
+    use_cache: bool = True,
+    backend: Optional[str] = None,
+    deadline: Optional[Deadline] = None
+) -> List[List[float]]:
+    """
+    Generate embeddings for several texts with a single backend request.
+    
+    Cached texts are served locally; only the misses are sent to the model,
+    and concurrent calls missing on the same texts share one request.
+    
+    Args:
+        texts: The texts to generate embeddings for
+        use_cache: Whether to serve and store results in the query embedding cache
+        backend: Embedding backend name, "vertex" or "local" (default: EMBEDDING_BACKEND)
+        deadline: Request deadline; a remote request still running after its
+                  share raises concurrent.futures.TimeoutError and cuts "embedding",
+                  and PoolExhaustedError is raised while such requests hold every
+                  EMBEDDING_WORKERS thread
+        
+    Returns:
+        One embedding vector per input text, in input order
+    """
+    embedder = get_embedding_backend(backend)
+    vectors: List[Optional[List[float]]] = [None] * len(texts)
+    keys = [_embedding_cache_key(text, embedder.name) for text in texts]
+    
+    if use_cache:
+        for i, key in enumerate(keys):
+            vectors[i] = _embedding_cache.get(key)
+    
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    if missing:
+        key = "\n".join(keys[i] for i in missing)
+        batch = [texts[i] for i in missing]
+        missing_keys = [keys[i] for i in missing] if use_cache else []
+        try:
+            if (backend or EMBEDDING_BACKEND) == LOCAL_BACKEND:
+                embeddings = _embedding_flights.do(key, embedder.embed, batch)
+            elif deadline is None:
+                embeddings = _embedding_flights.do(key, _embedding_breaker.call, embedder.embed, batch)
+            else:
+                future = _embedding_pool.submit(
+                    _embedding_flights.do, key, _embedding_breaker.call, embedder.embed, batch,
+                    timeout=deadline.remaining()
+                )
+                try:
+                    embeddings = deadline.wait(future, "embedding", share=EMBEDDING_DEADLINE_SHARE)
+                except FutureTimeoutError:
+                    _embedding_pool.abandon(future)
+                    if missing_keys:
+                        future.add_done_callback(lambda f: _cache_late_embeddings(missing_keys, f))
+                    raise
+        except (CircuitOpenError, FutureTimeoutError, PoolExhaustedError):
+            # The caller falls back to the local index; nothing to log per request
+            raise
+        except Exception as e:
+            logger.error(f"Error generating embedding: {e}")
+            raise
+        
+        for i, values in zip(missing, embeddings):
+            vectors[i] = values
+        for cache_key, values in zip(missing_keys, embeddings):
+            _embedding_cache.set(cache_key, values)
+    
+    return vectors
+
+
+def embeds_without_remote_call(texts: List[str]) -> List[bool]:
+    """
+    Whether searching each text now would need no remote embedding request.
+
+    True under the local backend, for texts whose embedding is cached, and
+    while the embedding breaker is open (searches then use the local index).
+    """
+    if EMBEDDING_BACKEND == LOCAL_BACKEND or not _embedding_breaker.allows_calls():
+        return [True] * len(texts)
+    embedder = get_embedding_backend()
+    return [_embedding_cache_key(text, embedder.name) in _embedding_cache for text in texts]
+
+
+def _cache_late_embeddings(keys: List[str], future) -> None:
+    """Cache embeddings that arrived after their request stopped waiting."""
+    if not future.cancelled() and future.exception() is None:
+        for key, values in zip(keys, future.result()):
+            _embedding_cache.set(key, values)
+
+
+def get_embedding_cache_stats() -> Dict[str, Any]:
+    """Hit/miss/eviction counters for the query embedding cache."""
+    return _embedding_cache.stats()
+
+
+def get_embedding_singleflight_stats() -> Dict[str, Any]:
+    """Backend requests made and saved by coalescing concurrent embedding misses."""
+    return _embedding_flights.stats()
+
+
+def get_embedding_breaker_stats() -> Dict[str, Any]:
+    """State of the circuit breaker around remote embedding calls."""
+    return _embedding_breaker.stats()
+
+
+def get_embedding_pool_stats() -> Dict[str, Any]:
+    """Remote embedding calls abandoned at a deadline and still holding a worker."""
+    return _embedding_pool.stats()
 
 
 def cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
@@ -62,10 +229,303 @@ def cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
     return float(dot_product / (norm1 * norm2))
 
 
+def _store_generation() -> Optional[float]:
+    """
+    When the configured vector store was last written, or None if that is
+    unknown (no marker yet, unreachable, or the artifact is the store).
+    """
+    if EMBEDDING_BACKEND == LOCAL_BACKEND:
+        return None
+    try:
+        store = get_vector_store()
+        return None if store.name == MMAP_STORE else store.generation()
+    except Exception as e:
+        logger.warning(f"Could not read the vector store generation: {e}")
+        return None
+
+
+def _artifact_is_current(index_dir: Path, store_generation: Optional[float]) -> bool:
+    """Whether the artifact in `index_dir` exists and was built after the store's last write."""
+    if not VectorIndex.exists(index_dir):
+        return False
+    if store_generation is None:
+        return True
+    try:
+        with open(index_dir / METADATA_FILE, "r", encoding="utf-8") as f:
+            created_at = json.load(f).get("created_at")
+        return datetime.fromisoformat(created_at).timestamp() >= store_generation
+    except (OSError, ValueError, TypeError) as e:
+        logger.warning(f"Could not read the build time of {index_dir}: {e}")
+        return False
+
+
+def load_resident_index(store_generation: Optional[float] = None) -> VectorIndex:
+    """
+    Load guide vectors into a new VectorIndex.
+    
+    Memory-maps the on-disk artifact when one exists and is not older than
+    the store's last write, so startup needs no Firestore round trips;
+    otherwise reads every vector from the configured vector store
+    ($VECTOR_STORE), falling back to Firestore if that fails. With the local
+    embedding backend, the local index artifact is required.
+    
+    Args:
+        store_generation: When the vector store was last written; None (not
+                          read, as on a cold start, or unknown) serves the artifact
+    
+    Returns:
+        The freshly loaded index
+    """
+    if EMBEDDING_BACKEND == LOCAL_BACKEND:
+        index = VectorIndex.load(LOCAL_INDEX_DIR)
+        logger.info(f"Memory-mapped {len(index)} local-backend vectors from {LOCAL_INDEX_DIR}")
+        return index
+    
+    if VectorIndex.exists(SEMANTIC_INDEX_DIR) and not _artifact_is_current(SEMANTIC_INDEX_DIR, store_generation):
+        logger.info(f"Vector store was written after {SEMANTIC_INDEX_DIR} was built; loading the store")
+    elif VectorIndex.exists(SEMANTIC_INDEX_DIR):
+        try:
+            index = VectorIndex.load(SEMANTIC_INDEX_DIR)
+            logger.info(
+                f"Memory-mapped {len(index)} guide vectors from {SEMANTIC_INDEX_DIR} "
+                f"(built {index.created_at})"
+            )
+            return index
+        except Exception as e:
+            logger.warning(f"Could not load index artifact, falling back to the vector store: {e}")
+    
+    store = get_vector_store()
+    if store.name != MMAP_STORE:
+        try:
+            index = store.load_index()
+            logger.info(f"Loaded {len(index)} guide vectors from the {store.name} store")
+            return index
+        except Exception as e:
+            if store.name == FIRESTORE_STORE:
+                raise
+            logger.warning(f"Could not load the {store.name} store, falling back to Firestore: {e}")
+    
+    index = get_vector_store(FIRESTORE_STORE).load_index()
+    logger.info(f"Loaded {len(index)} guide vectors from Firestore")
+    return index
+
+
+class IndexSnapshot:
+    """
+    Immutable set of indexes that one search runs against.
+
+    A search takes the current snapshot once and uses only its indexes, so a
+    reload swapping in the next generation never changes an in-flight search.
+    """
+
+    def __init__(
+        self,
+        guide_index: Optional[VectorIndex],
+        passage_index: Optional[VectorIndex],
+        local_index: Optional[VectorIndex],
+        generation: int,
+        signature: Tuple,
+        error: Optional[str] = None
+    ):
+        self.guide_index = guide_index
+        self.passage_index = passage_index
+        self.local_index = local_index
+        self.generation = generation
+        self.signature = signature
+        self.error = error
+        self.loaded_at = time.time()
+
+    def require_guide_index(self) -> VectorIndex:
+        if self.guide_index is None:
+            raise RuntimeError(f"Guide index unavailable: {self.error}")
+        return self.guide_index
+
+
+def _index_signature(store_generation: Optional[float]) -> Tuple:
+    """
+    Modification times of the artifact metadata files, which are written
+    last, plus the vector store's generation, so writes to either reload.
+    """
+    signature = [("store", store_generation)]
+    for index_dir in (SEMANTIC_INDEX_DIR, PASSAGE_INDEX_DIR, LOCAL_INDEX_DIR):
+        try:
+            signature.append((str(index_dir), (index_dir / METADATA_FILE).stat().st_mtime_ns))
+        except OSError:
+            signature.append((str(index_dir), None))
+    return tuple(signature)
+
+
+def _load_artifact(index_dir: Path) -> Optional[VectorIndex]:
+    """Memory-map the index artifact in `index_dir`, or None if there is none."""
+    if not VectorIndex.exists(index_dir):
+        return None
+    try:
+        index = VectorIndex.load(index_dir)
+        logger.info(f"Memory-mapped {len(index)} vectors from {index_dir}")
+        return index
+    except Exception as e:
+        logger.warning(f"Could not load index artifact {index_dir}: {e}")
+        return None
+
+
+def load_snapshot(generation: int, check_store: bool = True) -> IndexSnapshot:
+    """
+    Load every index into a new snapshot.
+
+    A failure to load the guide index is recorded on the snapshot rather than
+    raised, so the local fallback index can still serve searches.
+
+    Without `check_store` (the cold start) the vector store's generation is
+    not read, so the baked artifacts are served with no network round trip;
+    the first background check reloads if the store was written since.
+    """
+    store_generation = _store_generation() if check_store else None
+    signature = _index_signature(store_generation)
+    guide_index, error = None, None
+    try:
+        guide_index = load_resident_index(store_generation)
+    except Exception as e:
+        logger.error(f"Could not load guide index: {e}")
+        error = str(e)
+    
+    if EMBEDDING_BACKEND == LOCAL_BACKEND:
+        passage_index, local_index = None, guide_index
+    else:
+        # Passages are built with the guide artifact; searching stale ones
+        # would hide store writes, so they are skipped until the next build.
+        # The local index is only a fallback and is kept either way.
+        passage_index = None
+        if _artifact_is_current(PASSAGE_INDEX_DIR, store_generation):
+            passage_index = _load_artifact(PASSAGE_INDEX_DIR)
+        local_index = _load_artifact(LOCAL_INDEX_DIR)
+    return IndexSnapshot(guide_index, passage_index, local_index, generation, signature, error)
+
+
+def get_index_snapshot() -> IndexSnapshot:
+    """
+    Return the current snapshot without blocking, except for the first load.
+
+    At most once every INDEX_RELOAD_CHECK_SECONDS this starts a background
+    check for rebuilt artifacts, vector store writes (or a failed guide
+    index) and reloads if needed.
+    """
+    global _snapshot, _checked_at
+    snapshot = _snapshot
+    if snapshot is None:
+        with _snapshot_lock:
+            if _snapshot is None:
+                _snapshot = load_snapshot(generation=1, check_store=False)
+                # Check the store on the next search, off the request path
+                _checked_at = time.monotonic() - INDEX_RELOAD_CHECK_SECONDS
+            return _snapshot
+    
+    if INDEX_RELOAD_CHECK_SECONDS > 0 and time.monotonic() - _checked_at >= INDEX_RELOAD_CHECK_SECONDS:
+        _checked_at = time.monotonic()
+        threading.Thread(target=_reload_if_changed, daemon=True).start()
+    return snapshot
+
+
+def _reload_if_changed() -> None:
+    snapshot = _snapshot
+    try:
+        if (snapshot is None or snapshot.guide_index is None
+                or _index_signature(_store_generation()) != snapshot.signature):
+            request_index_reload()
+    except Exception as e:
+        logger.warning(f"Index change check failed: {e}")
+
+
+def request_index_reload() -> None:
+    """
+    Build the next snapshot on a background thread and swap it in.
+
+    Requests made while a reload is running are coalesced into one more
+    reload after it, so a burst of index updates costs at most two loads.
+    """
+    global _reload_running, _reload_pending
+    with _snapshot_lock:
+        if _reload_running:
+            _reload_pending = True
+            return
+        _reload_running = True
+    threading.Thread(target=_reload_worker, daemon=True).start()
+
+
+def _reload_worker() -> None:
+    global _snapshot, _reload_running, _reload_pending
+    while True:
+        current = _snapshot
+        try:
+            start = time.perf_counter()
+            snapshot = load_snapshot(generation=(current.generation if current else 0) + 1)
+            if snapshot.guide_index is None and current is not None and current.guide_index is not None:
+                # Keep serving the last good generation rather than a broken one
+                logger.warning(f"Index reload failed, keeping generation {current.generation}")
+            else:
+                _snapshot = snapshot
+                logger.info(
+                    f"Swapped in index generation {snapshot.generation} "
+                    f"in {(time.perf_counter() - start) * 1000:.0f} ms"
+                )
+        except Exception as e:
+            logger.warning(f"Index reload failed: {e}")
+        
+        with _snapshot_lock:
+            if not _reload_pending:
+                _reload_running = False
+                return
+            _reload_pending = False
+
+
+def get_resident_index() -> VectorIndex:
+    """Return the current guide index, loading it on first use."""
+    return get_index_snapshot().require_guide_index()
+
+
+def get_index_generation() -> int:
+    """Generation of the snapshot searches currently use (0 before the first load)."""
+    snapshot = _snapshot
+    return snapshot.generation if snapshot is not None else 0
+
+
+def _attach_section_text(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Fill in the text of each result's matching section from the guide file."""
+    for result in results:
+        section = result.get("section")
+        if not section:
+            continue
+        try:
+            section["text"] = read_passage(
+                GUIDES_ROOT, result["file_path"], section["start"], section["end"]
+            )
+        except OSError as e:
+            logger.warning(f"Could not read section of {result['file_path']}: {e}")
+    return results
+
+
+def _guide_document(guide_id: str, title: str, division: str, content: str,
+                    file_path: str, maturity: str) -> Dict[str, Any]:
+    """
+    Embed a guide (title + content) into a vector store document.
+
+    Always with the Vertex backend: the store of record is shared, and local
+    TF-IDF vectors written there would not match anyone's queries.
+    """
+    return {
+        "id": guide_id,
+        "title": title,
+        "division": division,
+        "content": content,  # The store keeps it apart from the vector document
+        "file_path": file_path,
+        "maturity": maturity,
+        "embedding": get_embedding(f"{title}\n\n{content}", use_cache=False, backend=VERTEX_BACKEND),
+    }
+
+
 def index_guide(guide_id: str, title: str, division: str, content: str, 
-                file_path: str, maturity: str = "Unknown") -> None:
+                file_path: str, maturity: str = "Unknown", reload: bool = True) -> None:
     """
-    Index a guide in Firestore with its embedding.
+    Index a guide in the vector store with its embedding.
     
     Args:
         guide_id: Unique identifier for the guide
@@ -74,26 +534,13 @@ def index_guide(guide_id: str, title: str, division: str, content: str,
         content: Full text content
         file_path: Path to the guide file
         maturity: Maturity level
+        reload: Whether to reload the search indexes afterwards
     """
     try:
-        db = firestore.Client(project=PROJECT_ID)
-        
-        # Generate embedding for the content
-        # We'll embed title + content for better search
-        text_to_embed = f"{title}\n\n{content}"
-        embedding = get_embedding(text_to_embed)
-        
-        # Store in Firestore
-        doc_ref = db.collection(GUIDES_COLLECTION).document(guide_id)
-        doc_ref.set({
-            "title": title,
-            "division": division,
-            "content": content[:1000],  # Store preview
-            "file_path": file_path,
-            "maturity": maturity,
-            "embedding": embedding,
-            "indexed_at": firestore.SERVER_TIMESTAMP
-        })
+        document = _guide_document(guide_id, title, division, content, file_path, maturity)
+        get_vector_store().upsert([document])
+        if reload:
+            request_index_reload()
         
         logger.info(f"Indexed guide: {title}")
     except Exception as e:
@@ -106,7 +553,10 @@ def search_guides(
     top_k: int = 5, 
     division_filter: str = None,
     maturity_filter: str = None,
-    include_foundational: bool = True
+    include_foundational: bool = True,
+    aggregate: str = "max",
+    feedback: bool = False,
+    deadline: Optional[Deadline] = None
 ) -> List[Dict[str, Any]]:
     """
     Search guides using semantic similarity with maturity filtering.
@@ -117,71 +567,146 @@ def search_guides(
         division_filter: Optional division to filter by
         maturity_filter: Optional maturity level to filter by (e.g., 'introduction-1')
         include_foundational: Whether to always include foundational guides (default: True)
+        aggregate: How passage scores combine per guide, "max" or "sum" (default: "max")
+        feedback: Refine the query by pseudo-relevance feedback before scoring
+        deadline: Request deadline; see search_guides_multi
         
     Returns:
         List of matching guides with scores
     """
-    try:
-        db = firestore.Client(project=PROJECT_ID)
-        
-        # Generate embedding for the query
-        query_embedding = get_embedding(query)
-        
-        # Fetch all documents (or filtered by division)
-        collection_ref = db.collection(GUIDES_COLLECTION)
-        if division_filter:
-            docs = collection_ref.where("division", "==", division_filter).stream()
-        else:
-            docs = collection_ref.stream()
+    return search_guides_multi(
+        [query],
+        top_k=top_k,
+        division_filter=division_filter,
+        maturity_filter=maturity_filter,
+        include_foundational=include_foundational,
+        aggregate=aggregate,
+        feedback=feedback,
+        deadline=deadline
+    )[0]
+
+
+def search_guides_multi(
+    queries: List[str],
+    top_k: int = 5,
+    division_filter: str = None,
+    maturity_filter: str = None,
+    include_foundational: bool = True,
+    aggregate: str = "max",
+    feedback: bool = False,
+    deadline: Optional[Deadline] = None
+) -> List[List[Dict[str, Any]]]:
+    """
+    Search guides for several queries at once.
+    
+    All queries are embedded in one batched request and scored against the
+    corpus in a single Q x N matrix product. When a passage index is available,
+    passages are scored and aggregated per guide, and each result carries the
+    best-matching "section" (heading, byte range and text) of its guide.
+    
+    With `feedback`, each query is first scored as is, then moved towards its
+    best-matching vectors (Rocchio pseudo-relevance feedback) and scored
+    again: one more matrix product instead of more embedding calls.
+    
+    Args:
+        queries: Search queries, e.g. an original query plus its expansions
+        top_k: Number of results to return per query
+        division_filter: Optional division to filter by
+        maturity_filter: Optional maturity level to filter by
+        include_foundational: Whether to always include foundational guides (default: True)
+        aggregate: How passage scores combine per guide, "max" or "sum" (default: "max")
+        feedback: Refine each query by pseudo-relevance feedback before scoring
+        deadline: Request deadline. If remote embedding outlives its share,
+                  the local index is searched instead and "embedding" is cut;
+                  if it fails, "embedding" is recorded as a fallback
         
-        # Calculate similarity scores
-        results = []
-        for doc in docs:
-            data = doc.to_dict()
-            doc_embedding = data.get("embedding", [])
-            
-            if not doc_embedding:
-                continue
-            
-            guide_maturity = data.get("maturity", "Unknown")
-            
-            # Apply maturity filtering
-            # 1. Always include foundational guides if include_foundational is True
-            # 2. Include guides matching the maturity_filter
-            # 3. If no maturity_filter set, include all guides
-            if maturity_filter and guide_maturity != "Unknown":
-                is_foundational = guide_maturity == "foundational-1"
-                matches_maturity = guide_maturity == maturity_filter
-                
-                # Skip if doesn't match maturity and isn't foundational (when foundational is included)
-                if not matches_maturity:
-                    if not (include_foundational and is_foundational):
-                        continue
-            
-            similarity = cosine_similarity(query_embedding, doc_embedding)
-            
-            # Apply foundational boost: increase score by 10% for foundational guides
-            if include_foundational and guide_maturity == "foundational-1":
-                similarity = min(1.0, similarity * 1.1)  # Cap at 1.0
-            
-            results.append({
-                "title": data.get("title"),
-                "division": data.get("division"),
-                "file_path": data.get("file_path"),
-                "maturity": guide_maturity,
-                "score": similarity,
-                "content_preview": data.get("content", "")[:200] + "..."
-            })
+    Returns:
+        One list of matching guides per query, in input order
+    """
+    filters = {
+        "top_k": top_k,
+        "division_filter": division_filter,
+        "maturity_filter": maturity_filter,
+        "include_foundational": include_foundational,
+    }
+    try:
+        # One snapshot for the whole search, even if a reload swaps in a new one
+        snapshot = get_index_snapshot()
+        try:
+            query_embeddings = get_embeddings(queries, deadline=deadline)
+        except Exception as e:
+            # Keep search working through Vertex outages with the offline index
+            local_index = snapshot.local_index
+            if EMBEDDING_BACKEND == LOCAL_BACKEND or local_index is None:
+                raise
+            if isinstance(e, FutureTimeoutError):
+                logger.warning("Embedding missed its deadline; searching the local index")
+            else:
+                if not isinstance(e, (CircuitOpenError, PoolExhaustedError)):
+                    logger.warning(f"Embedding backend failed ({e}); searching the local index")
+                if deadline is not None:
+                    deadline.fall_back("embedding")
+            local_embeddings = get_embeddings(queries, backend=LOCAL_BACKEND)
+            if feedback:
+                local_embeddings = _feedback_queries(local_index, local_embeddings, filters)
+            return local_index.search_many(local_embeddings, **filters)
         
-        # Sort by similarity and return top k
-        results.sort(key=lambda x: x["score"], reverse=True)
-        return results[:top_k]
+        passage_index = snapshot.passage_index
+        if passage_index is not None:
+            if feedback:
+                query_embeddings = _feedback_queries(passage_index, query_embeddings, filters)
+            all_results = passage_index.search_grouped(
+                query_embeddings, aggregate=aggregate, **filters
+            )
+            return [_attach_section_text(results) for results in all_results]
         
+        # Score every guide with one matrix product; filters and the
+        # foundational boost are applied to the score array
+        guide_index = snapshot.require_guide_index()
+        if feedback:
+            query_embeddings = _feedback_queries(guide_index, query_embeddings, filters)
+        return guide_index.search_many(query_embeddings, **filters)
     except Exception as e:
         logger.error(f"Error searching guides: {e}")
         raise
 
 
+def _feedback_queries(index: VectorIndex, query_embeddings, filters: Dict[str, Any]) -> np.ndarray:
+    """Pseudo-relevance-feedback queries over `index`, under the search's filters."""
+    return index.feedback_queries(
+        query_embeddings,
+        division_filter=filters["division_filter"],
+        maturity_filter=filters["maturity_filter"],
+        include_foundational=filters["include_foundational"]
+    )
+
+
+def related_guides(guide_path: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    """
+    Guides most similar to the given one, answered from the stored vectors
+    (the precomputed table when present) without any embedding call.
+    
+    Args:
+        guide_path: The guide's index file or directory, e.g. "se/login" or "se/login/index.md"
+        top_k: Number of related guides to return
+        
+    Returns:
+        Related guides with similarity scores, best first
+        
+    Raises:
+        KeyError: If the guide is not in the index
+    """
+    index = get_index_snapshot().require_guide_index()
+    path = guide_path.strip("/")
+    candidates = [path] if path.endswith(".md") else [f"{path}/index.md", path]
+    for candidate in candidates:
+        try:
+            return index.related(candidate, top_k)
+        except KeyError:
+            continue
+    raise KeyError(f"No indexed guide at {guide_path}")
+
+
 def build_index_from_guides(guides_dir: Path) -> Dict[str, Any]:
     """
     Build the vector index from all guides in the directory.
@@ -192,7 +717,7 @@ def build_index_from_guides(guides_dir: Path) -> Dict[str, Any]:
     Returns:
         Dictionary with indexing statistics
     """
-    indexed_count = 0
+    documents = []
     error_count = 0
     
     try:
@@ -239,26 +764,25 @@ def build_index_from_guides(guides_dir: Path) -> Dict[str, Any]:
                     else:
                         markdown_content = content
                     
-                    # Create unique guide ID
-                    guide_id = f"{division}_{guide_dir.name}"
+                    # Same document ID as the content pipeline uses
                     file_path = str(index_file.relative_to(guides_dir))
-                    
-                    # Index the guide
-                    index_guide(
-                        guide_id=guide_id,
+                    documents.append(_guide_document(
+                        guide_id=guide_document_id(file_path),
                         title=title,
                         division=division,
                         content=markdown_content,
                         file_path=file_path,
                         maturity=maturity
-                    )
-                    
-                    indexed_count += 1
+                    ))
                     
                 except Exception as e:
                     logger.error(f"Error processing {index_file}: {e}")
                     error_count += 1
         
+        # Write every guide at once and reload once, not per guide mid-rewrite
+        indexed_count = get_vector_store().upsert(documents)
+        request_index_reload()
+        
         return {
             "success": True,
             "indexed_count": indexed_count,
@@ -275,15 +799,10 @@ def build_index_from_guides(guides_dir: Path) -> Dict[str, Any]:
 
 
 def clear_index() -> None:
-    """Clear all documents from the Firestore index."""
+    """Clear all documents from the vector store."""
     try:
-        db = firestore.Client(project=PROJECT_ID)
-        docs = db.collection(GUIDES_COLLECTION).stream()
-        
-        deleted_count = 0
-        for doc in docs:
-            doc.reference.delete()
-            deleted_count += 1
+        deleted_count = get_vector_store().delete_all()
+        request_index_reload()
         
         logger.info(f"Cleared {deleted_count} documents from index")
     except Exception as e:
@@ -0,0 +1,533 @@
+#!/usr/bin/env python3
+"""
+Pluggable storage for guide embedding documents.
+
+A vector store holds one document per guide: its metadata fields plus an
+"embedding" vector. Search only ever loads the compact part of a document
+(embedding, facets and a short preview); the full guide text is kept apart
+and fetched on demand. Three backends implement the same interface:
+
+- `firestore`: the shared Firestore collection the content pipeline writes
+- `sqlite`: a local SQLite file with each vector stored as a float32 BLOB
+- `mmap`: the on-disk VectorIndex artifact (`.npy` block plus JSON sidecar)
+
+`VECTOR_STORE` selects the store of record; `VECTOR_STORE_PATH` overrides the
+file or directory of the local backends.
+
+Firestore documents hold the embedding as one packed bytes field (see
+`pack_embedding`) rather than an array of doubles; documents written before
+the switch, with a float array, are still read.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from passages import read_guide_body
+from vector_index import METADATA_FILE, PREVIEW_CHARS, VECTORS_FILE, VectorIndex
+
+logger = logging.getLogger(__name__)
+
+FIRESTORE_STORE = "firestore"
+SQLITE_STORE = "sqlite"
+MMAP_STORE = "mmap"
+STORE_BACKENDS = (FIRESTORE_STORE, SQLITE_STORE, MMAP_STORE)
+
+# The one collection both the pipeline and the server read and write
+GUIDES_COLLECTION = os.getenv("FIRESTORE_COLLECTION", "implementation-guides")
+# Full guide text, one document per guide under the same id
+CONTENT_COLLECTION = os.getenv("FIRESTORE_CONTENT_COLLECTION", f"{GUIDES_COLLECTION}-content")
+# Store generation marker: one document, rewritten with every upsert and delete
+GENERATION_DOCUMENT = "generation"
+# Firestore allows 500 writes per batch; each guide is two
+FIRESTORE_BATCH_SIZE = 200
+# Per-call timeout for Firestore reads and commits, so a hung call cannot
+# pin an index load or a worker thread indefinitely
+FIRESTORE_TIMEOUT_SECONDS = float(os.getenv("FIRESTORE_TIMEOUT_SECONDS", "60"))
+
+# Packed embedding: magic, format version, dtype code, dimension, then the
+# little-endian values. The 8-byte header keeps the values aligned.
+EMBEDDING_MAGIC = b"EV"
+EMBEDDING_FORMAT_VERSION = 1
+EMBEDDING_HEADER = struct.Struct("<2sBcI")
+EMBEDDING_DTYPES = {b"f": np.dtype("<f4"), b"e": np.dtype("<f2")}
+EMBEDDING_STORAGE_DTYPE = os.getenv("EMBEDDING_STORAGE_DTYPE", "float32")
+
+SEMANTIC_INDEX_DIR = Path(os.getenv(
+    "SEMANTIC_INDEX_DIR",
+    str(Path(__file__).parent.parent / "guides" / "semantic_index")
+))
+SQLITE_FILE = "vectors.sqlite3"
+GUIDES_ROOT = Path(__file__).parent.parent / "guides"
+
+
+def guide_document_id(file_path: str) -> str:
+    """Stable document id for a guide, from its path relative to the guides root."""
+    return str(file_path).replace("/", "_").replace(".md", "")
+
+
+def pack_embedding(vector, dtype: str = EMBEDDING_STORAGE_DTYPE) -> bytes:
+    """
+    Pack a vector into a self-describing bytes value.
+
+    Args:
+        vector: Embedding list or array
+        dtype: "float32" or "float16" (half the size, about 3 significant digits)
+
+    Returns:
+        Header plus the little-endian values
+    """
+    values = np.asarray(vector, dtype=np.dtype(dtype).newbyteorder("<"))
+    codes = {v: k for k, v in EMBEDDING_DTYPES.items()}
+    if values.dtype not in codes:
+        raise ValueError(f"Unsupported embedding storage dtype {dtype!r}, expected float32 or float16")
+    header = EMBEDDING_HEADER.pack(EMBEDDING_MAGIC, EMBEDDING_FORMAT_VERSION, codes[values.dtype], len(values))
+    return header + values.tobytes()
+
+
+def unpack_embedding(value) -> np.ndarray:
+    """
+    Decode an embedding written by `pack_embedding` as a read-only view of
+    `value`, without copying. Plain float lists from older documents are
+    converted to a float32 array.
+    """
+    if not isinstance(value, (bytes, bytearray, memoryview)):
+        return np.asarray(value, dtype=np.float32)
+    if len(value) < EMBEDDING_HEADER.size:
+        raise ValueError(f"Packed embedding too short ({len(value)} bytes)")
+    magic, version, code, dimension = EMBEDDING_HEADER.unpack_from(value)
+    if magic != EMBEDDING_MAGIC or version != EMBEDDING_FORMAT_VERSION or code not in EMBEDDING_DTYPES:
+        raise ValueError(f"Not a packed embedding (header {bytes(value[:EMBEDDING_HEADER.size])!r})")
+    return np.frombuffer(value, dtype=EMBEDDING_DTYPES[code], count=dimension, offset=EMBEDDING_HEADER.size)
+
+
+def split_document(document: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    Split a guide document into its compact vector part and its full content.
+
+    The vector part keeps every field except "content", plus a
+    "content_preview" cut from it.
+    """
+    content = document.get("content")
+    vector_document = {k: v for k, v in document.items() if k != "content"}
+    if "content_preview" not in vector_document:
+        vector_document["content_preview"] = (content or "")[:PREVIEW_CHARS]
+    return vector_document, content
+
+
+class VectorStore:
+    """
+    Persistent collection of guide documents with embeddings.
+
+    Documents are upserted whole; reads return the compact vector part unless
+    content is asked for.
+    """
+
+    name = ""
+
+    def upsert(self, documents: List[Dict[str, Any]]) -> int:
+        """
+        Insert or replace documents, keyed on "id" (derived from "file_path" if absent).
+
+        Returns:
+            Number of documents written
+
+        Raises:
+            ValueError: A document has no embedding; nothing is written
+        """
+        raise NotImplementedError
+
+    def iter_documents(self, include_content: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Yield every stored document, with "id" and "embedding" set.
+
+        Args:
+            include_content: Also fetch each document's full "content"
+        """
+        raise NotImplementedError
+
+    def get_content(self, document_id: str) -> Optional[str]:
+        """Full content of one document, or None if it has none."""
+        raise NotImplementedError
+
+    def delete_all(self) -> int:
+        """Remove every document. Returns the number removed."""
+        raise NotImplementedError
+
+    def generation(self) -> Optional[float]:
+        """
+        When the store was last written (Unix time), or None if never.
+
+        Every upsert and delete_all moves it forward, so servers can tell that
+        their resident index, or an index artifact, is older than the store.
+        """
+        raise NotImplementedError
+
+    def load_index(self) -> VectorIndex:
+        """Load every stored vector into a VectorIndex."""
+        return VectorIndex.from_documents(self.iter_documents())
+
+    @staticmethod
+    def _document_id(document: Dict[str, Any]) -> str:
+        return document.get("id") or guide_document_id(document["file_path"])
+
+    @classmethod
+    def _check_embeddings(cls, documents: List[Dict[str, Any]]) -> None:
+        """Reject a batch before writing any of it if a document has no embedding."""
+        for document in documents:
+            embedding = document.get("embedding")
+            if embedding is None or len(embedding) == 0:
+                raise ValueError(f"Document {cls._document_id(document)!r} has no embedding")
+
+
+class FirestoreVectorStore(VectorStore):
+    """
+    Documents in a Firestore collection, written in batched commits with the
+    embedding packed into a single bytes field. Full content goes to a
+    parallel collection, so loading the index reads only compact documents.
+    """
+
+    name = FIRESTORE_STORE
+
+    def __init__(
+        self,
+        collection: str = GUIDES_COLLECTION,
+        dtype: str = EMBEDDING_STORAGE_DTYPE,
+        content_collection: Optional[str] = None
+    ):
+        self.collection = collection
+        self.dtype = dtype
+        if content_collection is None:
+            content_collection = CONTENT_COLLECTION if collection == GUIDES_COLLECTION else f"{collection}-content"
+        self.content_collection = content_collection
+        self.meta_collection = f"{collection}-meta"
+
+    def _mark_written(self) -> None:
+        self._collection(self.meta_collection).document(GENERATION_DOCUMENT).set(
+            {"written_at": time.time()}, timeout=FIRESTORE_TIMEOUT_SECONDS
+        )
+
+    def _collection(self, name: Optional[str] = None):
+        import gcp_clients
+        return gcp_clients.get_firestore_client().collection(name or self.collection)
+
+    def upsert(self, documents: List[Dict[str, Any]]) -> int:
+        from google.cloud import firestore
+        import gcp_clients
+
+        self._check_embeddings(documents)
+        db = gcp_clients.get_firestore_client()
+        collection = db.collection(self.collection)
+        contents = db.collection(self.content_collection)
+        written = 0
+        for start in range(0, len(documents), FIRESTORE_BATCH_SIZE):
+            batch = db.batch()
+            for document in documents[start:start + FIRESTORE_BATCH_SIZE]:
+                doc_id = self._document_id(document)
+                data, content = split_document({k: v for k, v in document.items() if k != "id"})
+                data["embedding"] = pack_embedding(data["embedding"], self.dtype)
+                data["indexed_at"] = firestore.SERVER_TIMESTAMP
+                batch.set(collection.document(doc_id), data)
+                if content is not None:
+                    batch.set(contents.document(doc_id), {"content": content})
+                written += 1
+            batch.commit(timeout=FIRESTORE_TIMEOUT_SECONDS)
+        if written:
+            self._mark_written()
+        return written
+
+    def iter_documents(self, include_content: bool = False) -> Iterator[Dict[str, Any]]:
+        contents = {}
+        if include_content:
+            content_docs = self._collection(self.content_collection).stream(
+                timeout=FIRESTORE_TIMEOUT_SECONDS
+            )
+            contents = {doc.id: doc.to_dict().get("content") for doc in content_docs}
+        for doc in self._collection().stream(timeout=FIRESTORE_TIMEOUT_SECONDS):
+            data = doc.to_dict()
+            data["id"] = doc.id
+            if data.get("embedding") is not None:
+                data["embedding"] = unpack_embedding(data["embedding"])
+            if include_content and contents.get(doc.id) is not None:
+                data["content"] = contents[doc.id]
+            yield data
+
+    def get_content(self, document_id: str) -> Optional[str]:
+        doc = self._collection(self.content_collection).document(document_id).get(
+            timeout=FIRESTORE_TIMEOUT_SECONDS
+        )
+        return doc.to_dict().get("content") if doc.exists else None
+
+    def delete_all(self) -> int:
+        import gcp_clients
+
+        db = gcp_clients.get_firestore_client()
+        deleted = 0
+        for name in (self.collection, self.content_collection):
+            batch, pending = db.batch(), 0
+            for doc in self._collection(name).stream(timeout=FIRESTORE_TIMEOUT_SECONDS):
+                batch.delete(doc.reference)
+                pending += 1
+                if name == self.collection:
+                    deleted += 1
+                if pending == FIRESTORE_BATCH_SIZE:
+                    batch.commit(timeout=FIRESTORE_TIMEOUT_SECONDS)
+                    batch, pending = db.batch(), 0
+            if pending:
+                batch.commit(timeout=FIRESTORE_TIMEOUT_SECONDS)
+        self._mark_written()
+        return deleted
+
+    def generation(self) -> Optional[float]:
+        doc = self._collection(self.meta_collection).document(GENERATION_DOCUMENT).get(
+            timeout=FIRESTORE_TIMEOUT_SECONDS
+        )
+        return doc.to_dict().get("written_at") if doc.exists else None
+
+
+class SQLiteVectorStore(VectorStore):
+    """
+    Documents in a local SQLite file: metadata as JSON, the vector as a
+    little-endian float32 BLOB decoded with `np.frombuffer`, and full content
+    in a separate table.
+    """
+
+    name = SQLITE_STORE
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path or SEMANTIC_INDEX_DIR / SQLITE_FILE)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=5.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS guides ("
+            "id TEXT PRIMARY KEY, metadata TEXT NOT NULL, dimension INTEGER NOT NULL, "
+            "embedding BLOB NOT NULL, indexed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS guide_content (id TEXT PRIMARY KEY, content TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _mark_written(self) -> None:
+        """Move the generation forward; call with the lock held, before committing."""
+        self._conn.execute(
+            "INSERT OR REPLACE INTO store_meta (key, value) VALUES (?, ?)",
+            (GENERATION_DOCUMENT, time.time())
+        )
+
+    def upsert(self, documents: List[Dict[str, Any]]) -> int:
+        self._check_embeddings(documents)
+        rows = []
+        contents = []
+        now = time.time()
+        for document in documents:
+            doc_id = self._document_id(document)
+            vector = np.asarray(document["embedding"], dtype="<f4")
+            metadata, content = split_document({
+                k: v for k, v in document.items()
+                if k not in ("id", "embedding", "indexed_at")
+            })
+            if content is not None:
+                contents.append((doc_id, content))
+            rows.append((
+                doc_id,
+                json.dumps(metadata, ensure_ascii=False, default=str),
+                len(vector),
+                vector.tobytes(),
+                now,
+            ))
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO guides (id, metadata, dimension, embedding, indexed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO guide_content (id, content) VALUES (?, ?)", contents
+            )
+            if rows:
+                self._mark_written()
+            self._conn.commit()
+        return len(rows)
+
+    def iter_documents(self, include_content: bool = False) -> Iterator[Dict[str, Any]]:
+        content_column = "c.content" if include_content else "NULL"
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT g.id, g.metadata, g.embedding, {content_column} FROM guides g "
+                "LEFT JOIN guide_content c ON c.id = g.id ORDER BY g.id"
+            ).fetchall()
+        for doc_id, metadata, embedding, content in rows:
+            document = json.loads(metadata)
+            document["id"] = doc_id
+            document["embedding"] = np.frombuffer(embedding, dtype="<f4")
+            if content is not None:
+                document["content"] = content
+            yield document
+
+    def get_content(self, document_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content FROM guide_content WHERE id = ?", (document_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def delete_all(self) -> int:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM guides")
+            self._conn.execute("DELETE FROM guide_content")
+            self._mark_written()
+            self._conn.commit()
+        return cursor.rowcount
+
+    def generation(self) -> Optional[float]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM store_meta WHERE key = ?", (GENERATION_DOCUMENT,)
+            ).fetchone()
+        return row[0] if row else None
+
+
+class MmapVectorStore(VectorStore):
+    """
+    The memory-mapped VectorIndex artifact used as a store.
+
+    The artifact is immutable, so an upsert merges with the current contents
+    and rewrites it. The artifact keeps only a preview; full content is read
+    from the guide files under `guides_root`.
+    """
+
+    name = MMAP_STORE
+
+    def __init__(self, index_dir: Optional[Path] = None, related: bool = True, guides_root: Path = GUIDES_ROOT):
+        self.index_dir = Path(index_dir or SEMANTIC_INDEX_DIR)
+        self.related = related
+        self.guides_root = Path(guides_root)
+
+    def _read_content(self, file_path: Optional[str]) -> Optional[str]:
+        if not file_path or not (self.guides_root / file_path).is_file():
+            return None
+        return read_guide_body(self.guides_root, file_path)
+
+    def write_index(self, index: VectorIndex, model: str = "") -> Dict[str, Any]:
+        """
+        Build the int8 scan copy, the IVF structure and (with `related`) the
+        nearest-guide table, then write the artifact.
+        """
+        if len(index):
+            index.quantize()
+            index.build_ann()
+            if self.related:
+                index.build_related()
+        return index.save(self.index_dir, model=model)
+
+    def upsert(self, documents: List[Dict[str, Any]]) -> int:
+        self._check_embeddings(documents)
+        merged = {}
+        model = ""
+        if VectorIndex.exists(self.index_dir):
+            model = VectorIndex.load(self.index_dir).model
+            merged = {doc["id"]: doc for doc in self.iter_documents()}
+        for document in documents:
+            merged[self._document_id(document)] = document
+        self.write_index(VectorIndex.from_documents(merged.values()), model=model)
+        return len(documents)
+
+    def iter_documents(self, include_content: bool = False) -> Iterator[Dict[str, Any]]:
+        if not VectorIndex.exists(self.index_dir):
+            return
+        index = VectorIndex.load(self.index_dir, mmap=False)
+        for row in range(len(index)):
+            document = {
+                "id": guide_document_id(index.file_paths[row]),
+                "title": index.titles[row],
+                "division": index.divisions[row],
+                "file_path": index.file_paths[row],
+                "maturity": index.maturities[row],
+                "content_preview": index.previews[row],
+                "embedding": index.vectors[row],
+            }
+            if include_content:
+                content = self._read_content(index.file_paths[row])
+                if content is not None:
+                    document["content"] = content
+            yield document
+
+    def get_content(self, document_id: str) -> Optional[str]:
+        if not VectorIndex.exists(self.index_dir):
+            return None
+        index = VectorIndex.load(self.index_dir)
+        for file_path in index.file_paths:
+            if file_path and guide_document_id(file_path) == document_id:
+                return self._read_content(file_path)
+        return None
+
+    def delete_all(self) -> int:
+        if not VectorIndex.exists(self.index_dir):
+            return 0
+        count = len(VectorIndex.load(self.index_dir))
+        # Metadata first, so readers stop seeing a complete artifact immediately
+        for name in (METADATA_FILE, VECTORS_FILE):
+            (self.index_dir / name).unlink()
+        return count
+
+    def generation(self) -> Optional[float]:
+        try:
+            return (self.index_dir / METADATA_FILE).stat().st_mtime
+        except OSError:
+            return None
+
+    def load_index(self) -> VectorIndex:
+        return VectorIndex.load(self.index_dir)
+
+
+_stores: Dict[Tuple[str, str], VectorStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_vector_store(name: Optional[str] = None, location: Optional[Path] = None) -> VectorStore:
+    """
+    The shared vector store called `name` (default: $VECTOR_STORE or "firestore").
+
+    One instance is kept per process for each store and location, so the
+    SQLite connection is opened once and reused.
+
+    Args:
+        name: "firestore", "sqlite" or "mmap"
+        location: Collection name for Firestore, or file/directory for the
+                  local backends (default: $VECTOR_STORE_PATH or a default
+                  under SEMANTIC_INDEX_DIR)
+
+    Returns:
+        The store instance
+    """
+    name = name or os.getenv("VECTOR_STORE", FIRESTORE_STORE)
+    location = location or os.getenv("VECTOR_STORE_PATH") or None
+    if name not in STORE_BACKENDS:
+        raise ValueError(f"Unknown vector store {name!r}, expected one of {STORE_BACKENDS}")
+    key = (name, str(location or ""))
+    store = _stores.get(key)
+    if store is not None:
+        return store
+    with _stores_lock:
+        if key not in _stores:
+            if name == FIRESTORE_STORE:
+                _stores[key] = FirestoreVectorStore(str(location) if location else GUIDES_COLLECTION)
+            elif name == SQLITE_STORE:
+                _stores[key] = SQLiteVectorStore(Path(location) if location else None)
+            else:
+                _stores[key] = MmapVectorStore(Path(location) if location else None)
+        return _stores[key]
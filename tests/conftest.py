@@ -0,0 +1,30 @@
+"""
+Shared setup for the offline pytest suite.
+
+Run from the repository root:
+  python -m pytest -q
+
+The suite needs no Google credentials: queries embed with the local backend
+and no index artifacts are read at import time.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT / "scripts"))
+sys.path.insert(0, str(ROOT / "mcp"))
+
+os.environ.setdefault("EMBEDDING_BACKEND", "local")
+os.environ.setdefault("WARM_UP_ON_BOOT", "false")
+
+# Manual scripts that talk to a running server or to Notion; run them directly
+collect_ignore = [
+    "test_guides_api.py",
+    "test_guides_mcp.py",
+    "test_mcp_server.py",
+    "test_notion_connection.py",
+    "test_semantic_search.py",
+    "test_simple_server.py",
+]
@@ -0,0 +1,133 @@
+"""Tests for the TTL cache, its SQLite tier, and single-flight deduplication."""
+
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import pytest
+
+from caching import SingleFlight, TTLCache
+
+
+def test_get_returns_what_was_set():
+    cache = TTLCache(max_entries=10, ttl_seconds=60)
+    cache.set("a", [1, 2])
+    assert cache.get("a") == [1, 2]
+    assert cache.get("missing") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_ttl():
+    cache = TTLCache(max_entries=10, ttl_seconds=0.05)
+    cache.set("a", 1)
+    assert "a" in cache
+    time.sleep(0.06)
+    assert "a" not in cache
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_contains_does_not_count_as_a_lookup():
+    cache = TTLCache(max_entries=10, ttl_seconds=60)
+    cache.set("a", 1)
+    assert "a" in cache
+    assert "b" not in cache
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (0, 0)
+
+
+def test_persistent_tier_survives_a_restart(tmp_path):
+    path = tmp_path / "cache.sqlite"
+    TTLCache(max_entries=10, ttl_seconds=60, persist_path=path, name="test-cache").set("a", {"v": 1})
+
+    restarted = TTLCache(max_entries=10, ttl_seconds=60, persist_path=path, name="test-cache")
+    assert "a" in restarted
+    assert restarted.get("a") == {"v": 1}
+    assert restarted.stats()["persistent_hits"] == 1
+
+
+def test_persistent_entries_expire(tmp_path):
+    path = tmp_path / "cache.sqlite"
+    TTLCache(max_entries=10, ttl_seconds=0.05, persist_path=path).set("a", 1)
+    time.sleep(0.06)
+    assert TTLCache(max_entries=10, ttl_seconds=0.05, persist_path=path).get("a") is None
+
+
+def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight("test")
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow(value):
+        calls.append(value)
+        started.set()
+        release.wait(5)
+        return value * 2
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flights.do("k", slow, 21)))
+    leader.start()
+    started.wait(5)
+    followers = [
+        threading.Thread(target=lambda: results.append(flights.do("k", slow, 21)))
+        for _ in range(3)
+    ]
+    for t in followers:
+        t.start()
+    while flights.stats()["saved_calls"] < 3:
+        time.sleep(0.001)
+    release.set()
+    for t in [leader] + followers:
+        t.join(5)
+
+    assert calls == [21]
+    assert results == [42] * 4
+    assert flights.stats() == {"name": "test", "calls": 1, "saved_calls": 3, "in_flight": 0}
+
+
+def test_errors_reach_every_waiter_and_are_not_remembered():
+    flights = SingleFlight("test")
+
+    def fail():
+        raise RuntimeError("down")
+
+    with pytest.raises(RuntimeError):
+        flights.do("k", fail)
+    assert flights.do("k", lambda: "up") == "up"
+
+
+def test_followers_stop_waiting_at_their_timeout():
+    flights = SingleFlight("test")
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return "done"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flights.do("k", slow)))
+    leader.start()
+    started.wait(5)
+    begun = time.monotonic()
+    with pytest.raises(FutureTimeoutError):
+        flights.do("k", slow, timeout=0.05)
+    assert time.monotonic() - begun < 1
+    release.set()
+    leader.join(5)
+    assert results == ["done"]
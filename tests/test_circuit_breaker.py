@@ -0,0 +1,115 @@
+"""Tests for the circuit breaker's closed, open and half-open states."""
+
+import threading
+import time
+
+import pytest
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+def fail():
+    raise RuntimeError("service down")
+
+
+def make_breaker(**kwargs):
+    options = {"failure_rate": 0.5, "min_calls": 2, "window_seconds": 60, "open_seconds": 0.05}
+    options.update(kwargs)
+    return CircuitBreaker("test", **options)
+
+
+def trip(breaker):
+    for _ in range(breaker.min_calls):
+        with pytest.raises(RuntimeError):
+            breaker.call(fail)
+    assert breaker.state == OPEN
+
+
+def test_stays_closed_below_min_calls():
+    breaker = make_breaker(min_calls=3)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            breaker.call(fail)
+    assert breaker.state == CLOSED
+    assert breaker.call(lambda: "ok") == "ok"
+
+
+def test_stays_closed_below_failure_rate():
+    breaker = make_breaker(min_calls=2)
+    breaker.call(lambda: "ok")
+    breaker.call(lambda: "ok")
+    with pytest.raises(RuntimeError):
+        breaker.call(fail)
+    assert breaker.state == CLOSED
+
+
+def test_open_breaker_fails_fast():
+    breaker = make_breaker(open_seconds=60)
+    trip(breaker)
+    calls = []
+    with pytest.raises(CircuitOpenError):
+        breaker.call(calls.append, 1)
+    assert calls == []
+    assert not breaker.allows_calls()
+    stats = breaker.stats()
+    assert stats["trips"] == 1
+    assert stats["rejected_calls"] == 1
+    assert stats["retry_in_seconds"] > 0
+
+
+def test_successful_probe_closes_the_breaker():
+    breaker = make_breaker()
+    trip(breaker)
+    time.sleep(0.06)
+    assert breaker.state == HALF_OPEN
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == CLOSED
+    assert breaker.stats()["window_calls"] == 0
+
+
+def test_failed_probe_reopens_the_breaker():
+    breaker = make_breaker()
+    trip(breaker)
+    time.sleep(0.06)
+    with pytest.raises(RuntimeError):
+        breaker.call(fail)
+    assert breaker.state == OPEN
+    assert breaker.stats()["trips"] == 2
+
+
+def test_only_one_probe_at_a_time():
+    breaker = make_breaker()
+    trip(breaker)
+    time.sleep(0.06)
+    release = threading.Event()
+    probe = threading.Thread(target=breaker.call, args=(release.wait, 5))
+    probe.start()
+    while breaker.allows_calls():
+        time.sleep(0.001)
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: "ok")
+    release.set()
+    probe.join(5)
+    assert breaker.state == CLOSED
+
+
+def test_hung_probe_times_out_and_frees_the_slot():
+    breaker = make_breaker(probe_timeout=0.05)
+    trip(breaker)
+    time.sleep(0.06)
+    release = threading.Event()
+    probe = threading.Thread(target=breaker.call, args=(release.wait, 5))
+    probe.start()
+    time.sleep(0.06)
+
+    # The hung probe counted as a failure and reopened the breaker
+    assert breaker.state == OPEN
+    assert breaker.stats()["trips"] == 2
+    time.sleep(0.06)
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == CLOSED
+
+    # Its late outcome is ignored
+    release.set()
+    probe.join(5)
+    assert breaker.state == CLOSED
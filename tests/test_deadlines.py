@@ -0,0 +1,93 @@
+"""Tests for request deadlines and the remote call pool."""
+
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import pytest
+
+from deadlines import Deadline, PoolExhaustedError, RemoteCallPool
+
+
+def test_budget_is_a_share_of_the_time_left_capped():
+    deadline = Deadline(10)
+    assert deadline.budget() == pytest.approx(10, abs=0.1)
+    assert deadline.budget(share=0.5) == pytest.approx(5, abs=0.1)
+    assert deadline.budget(share=0.5, cap=1) == 1
+    assert deadline.budget(cap=-1) == 0
+
+
+def test_expired_deadline_has_no_time_left():
+    deadline = Deadline(0.01)
+    time.sleep(0.02)
+    assert deadline.expired()
+    assert deadline.remaining() == 0
+    assert deadline.budget() == 0
+
+
+def test_wait_returns_a_result_in_time():
+    deadline = Deadline(1)
+    future = Future()
+    future.set_result("done")
+    assert deadline.wait(future, "embedding") == "done"
+    assert deadline.cut_short == []
+
+
+def test_wait_past_the_budget_cuts_the_stage():
+    deadline = Deadline(1)
+    started = time.monotonic()
+    with pytest.raises(FutureTimeoutError):
+        deadline.wait(Future(), "expansion", cap=0.02)
+    assert time.monotonic() - started < 0.5
+    assert deadline.cut_short == ["expansion"]
+
+
+def test_timeout_raised_by_a_finished_call_is_not_a_cut():
+    deadline = Deadline(1)
+    future = Future()
+    future.set_exception(FutureTimeoutError())
+    with pytest.raises(FutureTimeoutError):
+        deadline.wait(future, "embedding")
+    assert deadline.cut_short == []
+
+
+def test_stages_are_recorded_once_in_order():
+    deadline = Deadline(1)
+    for stage in ("search", "hybrid", "search"):
+        deadline.cut(stage)
+    deadline.fall_back("embedding")
+    deadline.fall_back("embedding")
+    assert deadline.cut_short == ["search", "hybrid"]
+    assert deadline.fallbacks == ["embedding"]
+
+
+def test_pool_refuses_calls_while_abandoned_calls_hold_every_worker():
+    pool = RemoteCallPool("test", max_workers=2)
+    release = threading.Event()
+    hung = [pool.submit(release.wait, 5) for _ in range(2)]
+    for future in hung:
+        pool.abandon(future)
+
+    refused = pool.submit(lambda: "ok")
+    assert refused.done()
+    with pytest.raises(PoolExhaustedError):
+        refused.result()
+    stats = pool.stats()
+    assert stats["exhausted"]
+    assert (stats["abandoned_in_flight"], stats["rejected_calls"]) == (2, 1)
+
+    release.set()
+    for future in hung:
+        future.result(5)
+    assert pool.stats()["abandoned_in_flight"] == 0
+    assert pool.submit(lambda: "ok").result(5) == "ok"
+
+
+def test_abandoning_a_finished_call_releases_it_at_once():
+    pool = RemoteCallPool("test", max_workers=1)
+    future = pool.submit(lambda: "ok")
+    future.result(5)
+    pool.abandon(future)
+    stats = pool.stats()
+    assert (stats["abandoned_in_flight"], stats["abandoned_total"]) == (0, 1)
@@ -0,0 +1,39 @@
+"""Tests for the in-memory BM25 index over guide files."""
+
+import pytest
+
+from lexical_index import BM25Index, guide_files
+
+
+def write_guide(root, path, title, body, maturity="growth-1"):
+    guide = root / path
+    guide.parent.mkdir(parents=True, exist_ok=True)
+    guide.write_text(f"---\ntitle: {title}\nmaturity: {maturity}\n---\n{body}\n", encoding="utf-8")
+
+
+@pytest.fixture
+def guides_root(tmp_path):
+    write_guide(tmp_path, "SE/login/index.md", "Login", "OAuth tokens and password login.")
+    write_guide(tmp_path, "se/sessions/index.md", "Sessions", "Session expiry and refresh tokens.")
+    write_guide(tmp_path, "pm/pricing/index.md", "Pricing", "Plans, tiers and billing.")
+    (tmp_path / "README.md").write_text("# Guides\n\nAll guides: se/login, pm/pricing.\n", encoding="utf-8")
+    return tmp_path
+
+
+def test_only_guide_index_files_are_indexed(guides_root):
+    paths = [str(p.relative_to(guides_root)) for p in guide_files(guides_root)]
+    assert paths == ["SE/login/index.md", "pm/pricing/index.md", "se/sessions/index.md"]
+    assert BM25Index.from_guides_dir(guides_root).search("guides") == []
+
+
+def test_search_ranks_by_bm25(guides_root):
+    results = BM25Index.from_guides_dir(guides_root).search("refresh tokens")
+    assert [r["title"] for r in results] == ["Sessions", "Login"]
+    assert results[0]["score"] == 1.0
+
+
+
+def test_division_filter_ignores_case(guides_root):
+    index = BM25Index.from_guides_dir(guides_root)
+    for division in ("se", "SE"):
+        assert {r["title"] for r in index.search("tokens", division_filter=division)} == {"Login", "Sessions"}
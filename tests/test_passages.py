@@ -0,0 +1,63 @@
+"""Tests for splitting guides into passages and reading them back by byte range."""
+
+from passages import read_passage, split_guide_file, split_into_passages
+
+GUIDE = """---
+title: Café Login
+division: se
+---
+# Overview
+
+Sign-in for the café app — résumé included.
+
+## Tokens
+
+Refresh tokens rotate.
+
+```bash
+# not a heading
+curl -X POST /token
+```
+
+## Storage
+
+Sessions live in Redis.
+"""
+
+
+def test_passages_split_at_headings_outside_code_fences():
+    headings = [p["heading"] for p in split_into_passages(GUIDE)]
+    assert headings == ["Overview", "Tokens", "Storage"]
+
+
+def test_byte_offsets_slice_the_encoded_file():
+    raw = GUIDE.encode("utf-8")
+    for passage in split_into_passages(GUIDE):
+        text = raw[passage["start"]:passage["end"]].decode("utf-8").strip()
+        assert text == passage["text"]
+
+
+def test_frontmatter_is_skipped():
+    first = split_into_passages(GUIDE)[0]
+    assert first["start"] == len("---\ntitle: Café Login\ndivision: se\n---\n".encode("utf-8"))
+    assert "title:" not in first["text"]
+
+
+def test_long_sections_split_without_gaps():
+    raw = "# Long\n\n" + "".join(f"line {i} with some words\n" for i in range(50))
+    passages = split_into_passages(raw, max_chars=200)
+    assert len(passages) > 1
+    assert all(p["heading"] == "Long" for p in passages)
+    for before, after in zip(passages, passages[1:]):
+        assert before["end"] == after["start"]
+    assert passages[-1]["end"] == len(raw.encode("utf-8"))
+
+
+def test_read_passage_returns_the_section_from_disk(tmp_path):
+    guide = tmp_path / "se" / "login" / "index.md"
+    guide.parent.mkdir(parents=True)
+    guide.write_bytes(GUIDE.encode("utf-8"))
+
+    for passage in split_guide_file(guide):
+        text = read_passage(tmp_path, "se/login/index.md", passage["start"], passage["end"])
+        assert text == passage["text"]
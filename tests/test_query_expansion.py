@@ -0,0 +1,36 @@
+"""Tests for corpus-mined local query expansion."""
+
+from query_expansion import LocalExpander
+
+
+def write_guide(root, path, title, body):
+    guide = root / path
+    guide.parent.mkdir(parents=True, exist_ok=True)
+    guide.write_text(f"---\ntitle: {title}\n---\n{body}\n", encoding="utf-8")
+
+
+def make_guides(root):
+    write_guide(root, "pm/dashboard/index.md", "Dashboard",
+                "# Widget Layout\n\nDashboard widgets show metrics. **Charts se/charts**\n\n"
+                "# Chart Rendering\n\nCharts load lazily.\n")
+    write_guide(root, "se/charts/index.md", "Chart Rendering",
+                "# Canvas Drawing\n\nDashboard charts render on canvas.\n")
+    write_guide(root, "se/login/index.md", "Login", "# Password Reset\n\nReset links expire.\n")
+    (root / "README.md").write_text(
+        "# Guides\n\n**pm/dashboard** and **se/charts** cover the dashboard.\n", encoding="utf-8"
+    )
+
+
+def test_expansion_adds_headings_and_linked_titles(tmp_path):
+    make_guides(tmp_path)
+    expander = LocalExpander.from_guides_dir(tmp_path)
+    assert expander.expand("widget") == ["widget", "widget layout", "dashboard"]
+    assert expander.expand("password", max_terms=1) == ["password", "password reset"]
+
+
+def test_link_paths_and_readmes_are_not_mined(tmp_path):
+    make_guides(tmp_path)
+    expander = LocalExpander.from_guides_dir(tmp_path)
+    assert not any("/" in display for display, _ in expander.phrases)
+    assert "guides" not in {display for display, _ in expander.phrases}
+    assert not any("/" in term for term in expander.expand("dashboard", max_terms=10))
@@ -0,0 +1,59 @@
+"""Tests for the HTTP server's search response cache."""
+
+import time
+
+import pytest
+
+import guides_mcp_http_server as srv
+from caching import TTLCache
+
+
+@pytest.fixture
+def computed(monkeypatch):
+    """Queries the server actually searched, behind an empty response cache."""
+    queries = []
+
+    def search_guides_uncached(query, top_k, expand, hybrid, division_filter, expansion="vertex",
+                               deadline=None, hedge=True):
+        queries.append((query, hedge))
+        terms = {"used": [query], "dropped": ["slow term"] if query == "slow" else []}
+        if query == "pending":
+            terms["expansion_pending"] = True
+        return {
+            "results": [{"title": query, "score": 0.5}],
+            "terms": terms,
+            "cut_short": [],
+            "fallback": ["embedding"] if query == "offline" else [],
+        }
+
+    monkeypatch.setattr(srv, "_search_guides_uncached", search_guides_uncached)
+    monkeypatch.setattr(srv, "_search_cache", TTLCache(name="test-search"))
+    monkeypatch.setattr(srv, "_search_cache_counters", dict.fromkeys(srv._search_cache_counters, 0))
+    return queries
+
+
+def test_repeated_searches_are_served_from_the_cache(computed):
+    first = srv.do_search_guides("login")
+    assert srv.do_search_guides("  LOGIN ") == first
+    assert computed == [("login", True)]
+
+
+def test_stale_responses_are_served_and_refreshed_in_the_background(computed, monkeypatch):
+    monkeypatch.setattr(srv, "SEARCH_CACHE_FRESH_SECONDS", 0)
+    srv.do_search_guides("login")
+    assert srv.do_search_guides("login") == [{"title": "login", "score": 0.5}]
+    give_up = time.monotonic() + 5
+    while srv._search_cache_counters["refreshes"] < 1 and time.monotonic() < give_up:
+        time.sleep(0.01)
+    assert srv._search_cache_counters == {"stale_hits": 1, "refreshes": 1, "refresh_failures": 0}
+    # The refresh has no caller waiting on it, so it does not hedge
+    assert computed == [("login", True), ("login", False)]
+
+
+def test_responses_missing_terms_are_not_cached(computed):
+    assert srv.do_search_guides_detailed("slow")["terms"]["dropped"] == ["slow term"]
+    assert srv.do_search_guides_detailed("pending")["terms"]["expansion_pending"]
+    assert srv.do_search_guides_detailed("offline")["fallback"] == ["embedding"]
+    for query in ("slow", "pending", "offline"):
+        srv.do_search_guides(query)
+    assert [query for query, _ in computed] == ["slow", "pending", "offline"] * 2
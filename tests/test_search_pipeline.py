@@ -0,0 +1,145 @@
+"""Tests for hedged query expansion, deadlines and caching in the HTTP server's search path."""
+
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import guides_mcp_http_server as srv
+from caching import TTLCache
+from circuit_breaker import CircuitBreaker
+from deadlines import RemoteCallPool
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """Server search path with fake Gemini, fake vector search and empty caches."""
+    fake = SimpleNamespace(
+        searched=[],
+        expansion="token rotation, session expiry",
+        expansion_delay=0.0,
+        expansion_error=None,
+        remote_free=True,
+        release=threading.Event(),
+    )
+
+    def generate_content(prompt):
+        if fake.expansion_delay:
+            fake.release.wait(fake.expansion_delay)
+        if fake.expansion_error:
+            raise fake.expansion_error
+        return SimpleNamespace(text=fake.expansion)
+
+    def search_many(terms, top_k=5, division_filter=None, deadline=None, feedback=False):
+        fake.searched.append(list(terms))
+        return [[{"title": term, "file_path": f"{term}.md", "score": 0.5}] for term in terms]
+
+    monkeypatch.setattr(srv, "_generate_content", generate_content)
+    monkeypatch.setattr(srv, "get_multi_search_function", lambda: search_many)
+    monkeypatch.setattr(srv, "get_remote_free_function", lambda: lambda terms: [fake.remote_free] * len(terms))
+    monkeypatch.setattr(srv, "_expand_query_locally", lambda query, max_terms=4: [query, "local term"])
+    monkeypatch.setattr(srv, "_expansion_breaker", CircuitBreaker("test-expansion"))
+    pool = RemoteCallPool("test-expansion", 2)
+    monkeypatch.setattr(srv, "_expansion_pool", pool)
+    monkeypatch.setattr(srv, "_expansion_cache", TTLCache(name="test-expansion"))
+    monkeypatch.setattr(srv, "_search_cache", TTLCache(name="test-search"))
+    monkeypatch.setattr(srv, "EXPANSION_BUDGET_SECONDS", 0.1)
+    monkeypatch.setattr(srv, "SEARCH_HEDGE_EXPANSION", True)
+    yield fake
+    # Let late expansions finish before the next test swaps the caches
+    fake.release.set()
+    while pool.stats()["abandoned_in_flight"]:
+        time.sleep(0.01)
+
+
+def search(query="login", **kwargs):
+    kwargs.setdefault("expand", True)
+    kwargs.setdefault("expansion", srv.VERTEX_EXPANSION)
+    return srv.do_search_guides_detailed(query, **kwargs)
+
+
+def test_hedged_search_merges_expansion_terms_in_time(pipeline):
+    response = search()
+    assert response["terms"] == {"used": ["login", "token rotation", "session expiry"], "dropped": []}
+    assert pipeline.searched == [["login"], ["token rotation", "session expiry"]]
+    assert response["cut_short"] == [] and response["fallback"] == []
+    # The original query's result is boosted ahead of the expansion terms'
+    assert response["results"][0]["title"] == "login"
+
+
+def test_complete_responses_are_cached(pipeline):
+    first = search()
+    second = search("  LOGIN ")
+    assert second == first
+    assert len(pipeline.searched) == 2
+
+
+def test_expansion_past_budget_answers_without_waiting(pipeline):
+    pipeline.expansion_delay = 5
+    started = time.monotonic()
+    response = search(timeout=5)
+    assert time.monotonic() - started < 1
+    assert response["terms"]["expansion_pending"]
+    assert response["cut_short"] == ["expansion"]
+    assert response["terms"]["used"] == ["login", "local term"]
+    assert len(srv._search_cache) == 0
+
+
+def test_budget_miss_skips_local_terms_that_need_a_remote_embedding(pipeline):
+    pipeline.expansion_delay = 5
+    pipeline.remote_free = False
+    response = search()
+    assert response["terms"]["used"] == ["login"]
+    assert pipeline.searched == [["login"]]
+
+
+def test_late_expansion_is_cached_for_the_next_search(pipeline):
+    pipeline.expansion_delay = 5
+    search()
+    pipeline.release.set()
+    while srv._expansion_pool.stats()["abandoned_in_flight"]:
+        time.sleep(0.01)
+
+    response = search()
+    assert response["terms"]["used"] == ["login", "token rotation", "session expiry"]
+    assert "expansion_pending" not in response["terms"]
+
+
+def test_failed_expansion_falls_back_and_is_not_cached(pipeline):
+    pipeline.expansion_error = RuntimeError("gemini down")
+    response = search()
+    assert response["fallback"] == ["expansion"]
+    assert response["cut_short"] == []
+    assert response["terms"]["used"] == ["login", "local term"]
+    assert len(srv._search_cache) == 0
+
+
+def test_unhedged_search_waits_for_expansion_within_its_share(pipeline, monkeypatch):
+    monkeypatch.setattr(srv, "SEARCH_HEDGE_EXPANSION", False)
+    pipeline.expansion_delay = 5
+    started = time.monotonic()
+    response = search(timeout=0.2)
+    assert time.monotonic() - started < 1
+    assert response["cut_short"] == ["expansion"]
+    assert response["terms"]["expansion_pending"]
+    assert pipeline.searched == [["login", "local term"]]
+
+
+def test_invalid_timeouts_are_rejected(pipeline):
+    for timeout in (0, -1, float("nan")):
+        with pytest.raises(ValueError):
+            search(timeout=timeout)
+
+
+@pytest.mark.parametrize("arguments", [{"timeout": "soon"}, {"expand": "maybe"}, {"expansion": "gpt"}])
+def test_mcp_search_rejects_invalid_arguments(pipeline, arguments):
+    client = srv.app.test_client()
+    response = client.post("/mcp", json={
+        "jsonrpc": "2.0",
+        "id": 1,
+        "method": "tools/call",
+        "params": {"name": "search_guides", "arguments": {"query": "login", **arguments}},
+    }, headers={"Authorization": f"Bearer {srv.API_KEY}"})
+    assert response.status_code == 400
+    assert response.get_json()["error"]["code"] == -32602
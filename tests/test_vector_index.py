@@ -0,0 +1,170 @@
+"""Tests for the resident vector index: scoring, filters and persistence."""
+
+import numpy as np
+import pytest
+
+from vector_index import FOUNDATIONAL_BOOST, VectorIndex
+
+
+def make_index(quantized=False):
+    vectors = np.array([
+        [1.0, 0.0, 0.0],
+        [0.9, 0.1, 0.0],
+        [0.0, 1.0, 0.0],
+        [0.0, 0.9, 0.1],
+        [0.0, 0.0, 1.0],
+    ], dtype=np.float32)
+    records = [
+        {"title": "Login", "division": "SE", "file_path": "se/login/index.md", "maturity": "growth-1"},
+        {"title": "Sessions", "division": "se", "file_path": "se/sessions/index.md", "maturity": "introduction-1"},
+        {"title": "Pricing", "division": "PM", "file_path": "pm/pricing/index.md", "maturity": "growth-1"},
+        {"title": "Roadmap", "division": "pm", "file_path": "pm/roadmap/index.md", "maturity": "unknown"},
+        {"title": "Principles", "division": "se", "file_path": "se/principles/index.md", "maturity": "foundational-1"},
+    ]
+    index = VectorIndex(vectors, records)
+    if quantized:
+        index.quantize()
+    return index
+
+
+def titles(results):
+    return [r["title"] for r in results]
+
+
+def test_search_returns_top_k_best_first():
+    results = make_index().search([1.0, 0.0, 0.0], top_k=2)
+    assert titles(results) == ["Login", "Sessions"]
+    assert results[0]["score"] == pytest.approx(1.0)
+    assert results[0]["score"] >= results[1]["score"]
+
+
+def test_search_many_scores_each_query():
+    first, second = make_index().search_many([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]], top_k=1)
+    assert titles(first) == ["Login"]
+    assert titles(second) == ["Pricing"]
+
+
+def test_division_filter_ignores_case():
+    index = make_index()
+    for division in ("SE", "se", "Se"):
+        results = index.search([0.0, 1.0, 0.0], top_k=5, division_filter=division)
+        assert set(titles(results)) == {"Login", "Sessions", "Principles"}
+
+
+def test_maturity_filter_keeps_unknown_and_foundational():
+    index = make_index()
+    results = index.search([0.0, 1.0, 0.0], top_k=5, maturity_filter="growth-1")
+    assert set(titles(results)) == {"Login", "Pricing", "Roadmap", "Principles"}
+
+    results = index.search(
+        [0.0, 1.0, 0.0], top_k=5, maturity_filter="growth-1", include_foundational=False
+    )
+    assert set(titles(results)) == {"Login", "Pricing", "Roadmap"}
+
+
+def test_unmatched_filter_returns_nothing():
+    assert make_index().search([1.0, 0.0, 0.0], division_filter="finance") == []
+
+
+def test_unmatched_filter_values_share_one_cached_mask():
+    index = make_index()
+    for i in range(50):
+        assert index.search([1.0, 0.0, 0.0], division_filter=f"team-{i}") == []
+        results = index.search([0.0, 1.0, 0.0], top_k=5, maturity_filter=f"level-{i}")
+        assert "Principles" in titles(results) and "Login" not in titles(results)
+    assert len(index._filter_masks) == 2
+
+
+def test_foundational_guides_are_boosted():
+    index = make_index()
+    boosted = index.search([0.0, 0.0, 1.0], top_k=1)[0]
+    plain = index.search([0.0, 0.0, 1.0], top_k=1, maturity_filter="foundational-1",
+                         include_foundational=False)[0]
+    assert boosted["title"] == plain["title"] == "Principles"
+    assert boosted["score"] == pytest.approx(min(1.0, plain["score"] * FOUNDATIONAL_BOOST))
+
+
+def test_feedback_moves_queries_towards_their_filtered_top_rows():
+    index = make_index()
+    refined = index.feedback_queries([[1.0, 0.0, 0.0]], feedback_rows=2)
+    np.testing.assert_allclose(np.linalg.norm(refined, axis=1), [1.0], rtol=1e-6)
+    assert refined[0, 1] > 0 and refined[0, 2] == 0
+
+    refined = index.feedback_queries([[1.0, 0.0, 0.0]], division_filter="pm", feedback_rows=2)
+    assert refined[0, 1] > 0 and refined[0, 2] > 0
+
+
+def test_int8_search_matches_full_precision():
+    exact = make_index()
+    quantized = make_index(quantized=True)
+    assert quantized.is_quantized
+    for query in ([1.0, 0.2, 0.0], [0.1, 1.0, 0.3], [0.0, 0.1, 1.0]):
+        expected = exact.search(query, top_k=3)
+        results = quantized.search(query, top_k=3)
+        assert titles(results) == titles(expected)
+        # Candidates are re-scored at full precision
+        assert [r["score"] for r in results] == pytest.approx([r["score"] for r in expected])
+
+
+def test_saved_index_loads_with_same_results(tmp_path):
+    index = make_index(quantized=True)
+    index.save(tmp_path, model="test-model")
+    loaded = VectorIndex.load(tmp_path)
+    assert loaded.model == "test-model"
+    assert loaded.is_quantized
+    query = [0.3, 0.9, 0.0]
+    assert titles(loaded.search(query, top_k=5)) == titles(index.search(query, top_k=5))
+
+
+def test_related_guides_match_with_or_without_the_precomputed_table(tmp_path):
+    index = make_index()
+    scanned = index.related("se/sessions/index.md", top_k=1)
+    assert titles(scanned) == ["Login"]
+    index.build_related(top_n=2)
+    assert index.related("se/sessions/index.md", top_k=1) == scanned
+    index.save(tmp_path)
+    assert VectorIndex.load(tmp_path).related("se/sessions/index.md", top_k=1) == scanned
+    with pytest.raises(KeyError):
+        index.related("se/missing/index.md")
+
+
+def make_passage_index():
+    vectors = np.array([
+        [1.0, 0.0],
+        [0.6, 0.8],
+        [0.8, 0.6],
+        [0.0, 1.0],
+    ], dtype=np.float32)
+    records = [
+        {"title": "Login", "division": "se", "file_path": "se/login/index.md",
+         "section": {"heading": "Setup", "start": 0, "end": 10}},
+        {"title": "Login", "division": "se", "file_path": "se/login/index.md",
+         "section": {"heading": "Tokens", "start": 10, "end": 20}},
+        {"title": "Sessions", "division": "se", "file_path": "se/sessions/index.md",
+         "section": {"heading": "Expiry", "start": 0, "end": 30}},
+        {"title": "Sessions", "division": "se", "file_path": "se/sessions/index.md",
+         "section": {"heading": "Storage", "start": 30, "end": 60}},
+    ]
+    return VectorIndex(vectors, records)
+
+
+def test_grouped_search_returns_one_result_per_guide():
+    results = make_passage_index().search_grouped([[1.0, 0.0]], top_k=5)[0]
+    assert titles(results) == ["Login", "Sessions"]
+    assert results[0]["section"]["heading"] == "Setup"
+    assert results[1]["section"]["heading"] == "Expiry"
+
+
+def test_grouped_sum_aggregate_favours_guides_with_several_matching_passages():
+    index = make_passage_index()
+    query = [[0.7, 0.7]]
+    by_max = index.search_grouped(query, top_k=2, aggregate="max")[0]
+    by_sum = index.search_grouped(query, top_k=2, aggregate="sum")[0]
+    login_max = next(r["score"] for r in by_max if r["title"] == "Login")
+    login_sum = next(r["score"] for r in by_sum if r["title"] == "Login")
+    assert login_sum > login_max
+
+
+def test_grouped_search_rejects_unknown_aggregate():
+    with pytest.raises(ValueError):
+        make_passage_index().search_grouped([[1.0, 0.0]], aggregate="mean")
@@ -0,0 +1,130 @@
+"""Tests for index snapshots and guide indexing in vector_search."""
+
+import os
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import vector_search as vs
+from caching import TTLCache
+from circuit_breaker import CircuitBreaker
+from vector_index import VectorIndex
+
+
+def make_index(rows=3):
+    vectors = np.eye(3, dtype=np.float32)[:rows]
+    records = [
+        {"title": name, "division": "se", "file_path": f"se/{name.lower()}/index.md"}
+        for name in ("Login", "Sessions", "Billing")[:rows]
+    ]
+    return VectorIndex(vectors, records)
+
+
+@pytest.fixture
+def artifact(tmp_path, monkeypatch):
+    """A baked guide artifact, served as if by the Vertex backend with a remote store."""
+    make_index().save(tmp_path, model="test-model")
+    monkeypatch.setattr(vs, "SEMANTIC_INDEX_DIR", tmp_path)
+    monkeypatch.setattr(vs, "PASSAGE_INDEX_DIR", tmp_path / "passages")
+    monkeypatch.setattr(vs, "LOCAL_INDEX_DIR", tmp_path / "local")
+    monkeypatch.setattr(vs, "EMBEDDING_BACKEND", "vertex")
+    monkeypatch.setattr(vs, "_snapshot", None)
+    monkeypatch.setattr(vs, "_reload_running", False)
+    monkeypatch.setattr(vs, "_reload_pending", False)
+    return tmp_path
+
+
+def wait_for_reload(snapshot):
+    give_up = time.monotonic() + 5
+    while (vs._snapshot is snapshot or vs._reload_running) and time.monotonic() < give_up:
+        time.sleep(0.01)
+    return vs._snapshot
+
+
+def test_cold_start_serves_the_artifact_without_reading_the_store(artifact, monkeypatch):
+    def unreachable():
+        raise AssertionError("the store was read on the request path")
+
+    monkeypatch.setattr(vs, "_store_generation", unreachable)
+    monkeypatch.setattr(vs, "_reload_if_changed", lambda: None)
+    snapshot = vs.get_index_snapshot()
+    assert snapshot.generation == 1
+    assert len(snapshot.guide_index) == 3
+    assert snapshot.guide_index.model == "test-model"
+
+
+def test_rebuilt_artifact_is_swapped_in(artifact, monkeypatch):
+    monkeypatch.setattr(vs, "_store_generation", lambda: None)
+    snapshot = vs.get_index_snapshot()
+    make_index(rows=2).save(artifact, model="test-model")
+    later = time.time() + 10
+    os.utime(artifact / "metadata.json", (later, later))
+
+    vs._reload_if_changed()
+    reloaded = wait_for_reload(snapshot)
+    assert reloaded.generation == 2
+    assert len(reloaded.guide_index) == 2
+
+
+def test_store_written_after_the_build_reloads_from_the_store(artifact, monkeypatch):
+    stored = make_index()
+    loads = []
+
+    class Store:
+        name = "sqlite"
+
+        def load_index(self):
+            loads.append(True)
+            return stored
+
+    monkeypatch.setattr(vs, "get_vector_store", lambda name=None: Store())
+    monkeypatch.setattr(vs, "_store_generation", lambda: time.time() + 60)
+    snapshot = vs.get_index_snapshot()
+    assert loads == []
+
+    # The first check finds the store newer than the artifact and reloads from it
+    vs._reload_if_changed()
+    reloaded = wait_for_reload(snapshot)
+    assert reloaded.generation == 2
+    assert reloaded.guide_index is stored
+    assert loads == [True]
+
+
+def test_store_writes_embed_with_vertex_under_the_local_backend(monkeypatch):
+    backends, written = [], []
+
+    class Store:
+        def upsert(self, documents):
+            written.extend(documents)
+            return len(documents)
+
+    def get_embeddings(texts, use_cache=True, backend=None):
+        backends.append(backend)
+        return [[1.0, 0.0] for _ in texts]
+
+    monkeypatch.setattr(vs, "EMBEDDING_BACKEND", "local")
+    monkeypatch.setattr(vs, "get_embeddings", get_embeddings)
+    monkeypatch.setattr(vs, "get_vector_store", lambda name=None: Store())
+    vs.index_guide("se_login_index", "Login", "se", "Body", "se/login/index.md", reload=False)
+    assert backends == ["vertex"]
+    assert written[0]["embedding"] == [1.0, 0.0]
+
+
+def test_only_cached_texts_embed_without_a_remote_call(monkeypatch):
+    monkeypatch.setattr(vs, "EMBEDDING_BACKEND", "vertex")
+    monkeypatch.setattr(vs, "_backends", {"vertex": SimpleNamespace(name="test-model")})
+    monkeypatch.setattr(vs, "_embedding_cache", TTLCache(name="test-embeddings"))
+    vs._embedding_cache.set(vs._embedding_cache_key("Login", "test-model"), [1.0, 0.0])
+    assert vs.embeds_without_remote_call(["  login ", "billing"]) == [True, False]
+
+    # While the breaker is open searches use the local index, so nothing is remote
+    breaker = CircuitBreaker("test-embeddings", min_calls=1, open_seconds=60)
+    with pytest.raises(ZeroDivisionError):
+        breaker.call(lambda: 1 / 0)
+    monkeypatch.setattr(vs, "_embedding_breaker", breaker)
+    assert vs.embeds_without_remote_call(["billing"]) == [True]
+
+    monkeypatch.setattr(vs, "EMBEDDING_BACKEND", "local")
+    assert vs.embeds_without_remote_call(["billing"]) == [True]
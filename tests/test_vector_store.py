@@ -0,0 +1,68 @@
+"""Tests for the pluggable vector stores."""
+
+import numpy as np
+import pytest
+
+import vector_store
+from vector_store import SQLITE_STORE, SQLiteVectorStore, get_vector_store, pack_embedding, unpack_embedding
+
+
+def document(name, embedding=(1.0, 0.0)):
+    doc = {"title": name, "division": "se", "file_path": f"se/{name.lower()}/index.md"}
+    if embedding is not None:
+        doc["embedding"] = list(embedding)
+    return doc
+
+
+def test_one_store_instance_per_name_and_location(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_store, "_stores", {})
+    store = get_vector_store(SQLITE_STORE, tmp_path / "a.sqlite")
+    assert get_vector_store(SQLITE_STORE, tmp_path / "a.sqlite") is store
+    assert get_vector_store(SQLITE_STORE, tmp_path / "b.sqlite") is not store
+    with pytest.raises(ValueError):
+        get_vector_store("redis")
+
+
+def test_upsert_rejects_a_document_without_an_embedding(tmp_path):
+    store = SQLiteVectorStore(tmp_path / "guides.sqlite")
+    with pytest.raises(ValueError, match="se_billing_index"):
+        store.upsert([document("Login"), document("Billing", embedding=None)])
+    assert list(store.iter_documents()) == []
+
+
+def test_upsert_round_trips_embeddings(tmp_path):
+    store = SQLiteVectorStore(tmp_path / "guides.sqlite")
+    assert store.generation() is None
+    assert store.upsert([document("Login", (0.6, 0.8))]) == 1
+    assert store.generation() is not None
+    [doc] = store.iter_documents()
+    assert doc["title"] == "Login"
+    np.testing.assert_allclose(doc["embedding"], [0.6, 0.8])
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_packed_embeddings_round_trip(dtype):
+    packed = pack_embedding([0.6, -0.8, 0.0], dtype)
+    assert len(packed) == 8 + 3 * np.dtype(dtype).itemsize
+    np.testing.assert_allclose(unpack_embedding(packed), [0.6, -0.8, 0.0], atol=1e-3)
+
+
+def test_unpack_reads_legacy_float_lists_and_rejects_other_bytes():
+    assert unpack_embedding([0.5, 0.5]).dtype == np.float32
+    with pytest.raises(ValueError):
+        unpack_embedding(b"not an embedding")
+
+
+def test_full_content_is_kept_out_of_vector_documents(tmp_path):
+    store = SQLiteVectorStore(tmp_path / "guides.sqlite")
+    body = "OAuth tokens. " * 40
+    store.upsert([dict(document("Login"), content=body)])
+    [doc] = store.iter_documents()
+    assert "content" not in doc
+    assert body.startswith(doc["content_preview"]) and len(doc["content_preview"]) < len(body)
+    assert store.get_content("se_login_index") == body
+    [doc] = store.iter_documents(include_content=True)
+    assert doc["content"] == body
+
+    store.delete_all()
+    assert store.get_content("se_login_index") is None